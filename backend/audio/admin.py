@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import AudioMemory
+from .models import (
+    AudioMemory, ProcessingJob, TranscriptSegment, UploadIdempotencyKey, UploadSession, AnalysisCacheEntry
+)
 # Register your models here.
 
-admin.site.register(AudioMemory)
\ No newline at end of file
+admin.site.register(AudioMemory)
+admin.site.register(ProcessingJob)
+admin.site.register(TranscriptSegment)
+admin.site.register(UploadIdempotencyKey)
+admin.site.register(UploadSession)
+admin.site.register(AnalysisCacheEntry)
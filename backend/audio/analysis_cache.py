@@ -0,0 +1,151 @@
+"""
+Cache of text analysis results, keyed by the normalized text.
+
+Identical transcripts come up all the time: the "[No speech detected]"
+placeholder, short phrases like "I took my pills" and reprocessed
+recordings. Their analysis (VADER, DistilBERT and the keyword detectors) is
+computed once and reused from
+
+- an in-process LRU of AUDIO_ANALYSIS_CACHE_SIZE results, then
+- the AnalysisCacheEntry table, shared by every process
+
+Entries are keyed by (analysis kind, SHA-256 of the normalized text,
+ANALYZER_VERSION). Bump ANALYZER_VERSION whenever the models, keyword lists
+or detectors change: older entries then stop matching and are deleted the
+first time a process stores a new result.
+
+The cache never fails an analysis: database errors only cost the reuse.
+Results go in and come out as deep copies, so a caller editing a returned
+result (its keyword lists, say) never changes what the next caller gets.
+"""
+import copy
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import wraps
+from django.conf import settings
+from backend.structured_log import get_logger
+
+log = get_logger('audio.analysis_cache')
+
+ANALYZER_VERSION = 2
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+def normalize_text(text):
+    """Unicode NFC with runs of whitespace collapsed; case is kept since VADER scores capitals."""
+    return " ".join(unicodedata.normalize('NFC', text).split())
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, version=ANALYZER_VERSION):
+        self.version = version
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._stale_purged = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'AUDIO_ANALYSIS_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+
+    @property
+    def persistent(self):
+        return getattr(settings, 'AUDIO_ANALYSIS_CACHE_PERSIST', True)
+
+    def get(self, kind, digest):
+        key = (kind, digest)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._lru[key])
+
+        result = self._load(kind, digest)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, result)
+        return copy.deepcopy(result)
+
+    def set(self, kind, digest, result):
+        self._remember((kind, digest), result)
+        self._store(kind, digest, result)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    def _remember(self, key, result):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._lru[key] = copy.deepcopy(result)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def _load(self, kind, digest):
+        if not self.persistent:
+            return None
+        from django.db.models import F
+        from .models import AnalysisCacheEntry
+
+        try:
+            entry = AnalysisCacheEntry.objects.filter(
+                kind=kind, text_hash=digest, analyzer_version=self.version
+            ).only('id', 'result').first()
+            if entry is None:
+                return None
+            AnalysisCacheEntry.objects.filter(id=entry.id).update(hits=F('hits') + 1)
+            return entry.result
+        except Exception as e:
+            log.warning('analysis_cache_read_failed', error=str(e))
+            return None
+
+    def _store(self, kind, digest, result):
+        if not self.persistent:
+            return
+        from .models import AnalysisCacheEntry
+
+        try:
+            if not self._stale_purged:
+                deleted, _ = AnalysisCacheEntry.objects.exclude(analyzer_version=self.version).delete()
+                self._stale_purged = True
+                if deleted:
+                    log.info('analysis_cache_purged', entries=deleted, analyzer_version=self.version)
+            # Another worker may have stored the same text meanwhile
+            AnalysisCacheEntry.objects.bulk_create([
+                AnalysisCacheEntry(kind=kind, text_hash=digest, analyzer_version=self.version, result=result)
+            ], ignore_conflicts=True)
+        except Exception as e:
+            log.warning('analysis_cache_write_failed', error=str(e))
+
+
+analysis_cache = AnalysisCache()
+
+
+def cached_analysis(kind):
+    """Decorator for an analysis function of one text argument returning a JSON-serializable dict."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(text):
+            digest = text_hash(text)
+            result = analysis_cache.get(kind, digest)
+            if result is not None:
+                log.info('analysis_cache_hit', kind=kind)
+                return result
+            result = func(text)
+            analysis_cache.set(kind, digest, result)
+            return result
+        return wrapper
+    return decorator
@@ -2,204 +2,362 @@ import os
 import re
 import nltk
 import time
-from functools import lru_cache
+from functools import lru_cache, partial
 from nltk.sentiment import SentimentIntensityAnalyzer
-from transformers import pipeline, AutoTokenizer, logging
+from transformers import logging
+from django.conf import settings
+from .inference import get_distilbert_broker
+from .analysis_cache import cached_analysis
+from .lexicon import Lexicon
+from .model_backends import load_pipeline, DISTILBERT_MODEL
+from .whisper_policy import TIERS, TIER_STANDARD, get_tier
+from backend.model_registry import registry
+from backend.structured_log import get_logger
+from .metrics import STAGE_SECONDS
+
+log = get_logger('audio.processing')
 
 # Suppress warnings
 logging.set_verbosity_error()
 
-# Global variables to store models
-_whisper_model = None
-_vader_analyzer = None
-_distilbert_analyzer = None
-_tokenizer = None
-
 # NLTK setup - only download data when needed
 def setup_nltk():
     try:
         nltk.download('vader_lexicon', quiet=True)
         nltk.download('punkt', quiet=True)
     except Exception as e:
-        print(f"Warning: Failed to download NLTK resources: {e}")
+        log.warning('nltk_download_failed', error=str(e))
 
-# Lazy loading functions for models
-def get_vader_analyzer():
-    global _vader_analyzer
-    if _vader_analyzer is None:
-        print("🔧 Initializing VADER sentiment analyzer...")
-        setup_nltk()
-        _vader_analyzer = SentimentIntensityAnalyzer()
-        print("✅ VADER analyzer initialized")
-    return _vader_analyzer
+# Model loaders, registered with the shared model registry below
+def load_vader_analyzer():
+    setup_nltk()
+    return SentimentIntensityAnalyzer()
 
-def get_distilbert():
-    global _distilbert_analyzer, _tokenizer
-    if _distilbert_analyzer is None:
-        print("🔧 Initializing DistilBERT model...")
-        start_time = time.time()
-        _distilbert_analyzer = pipeline(
-            "sentiment-analysis",
-            model="distilbert/distilbert-base-uncased-finetuned-sst-2-english"
-        )
-        _tokenizer = AutoTokenizer.from_pretrained("distilbert/distilbert-base-uncased-finetuned-sst-2-english")
-        load_time = time.time() - start_time
-        print(f"✅ DistilBERT model initialized in {load_time:.2f} seconds")
-    return _distilbert_analyzer, _tokenizer
-
-def get_whisper_model():
-    global _whisper_model
-    if _whisper_model is None:
-        print(f"🎤 Loading WhisperModel for transcription...")
-        start_loading = time.time()
-        
-        # Try both implementations with clear error handling
-        whisper_impl = None
-        error_messages = []
+def load_distilbert():
+    # torch, int8-quantized or ONNX Runtime depending on INFERENCE_BACKEND(S)
+    analyzer = load_pipeline("sentiment-analysis", DISTILBERT_MODEL)
+    return analyzer, analyzer.tokenizer
+
+def load_whisper_model(model_size="small"):
+    # Try both implementations with clear error handling
+    whisper_model = None
+    whisper_impl = None
+    error_messages = []
+    
+    # First try faster_whisper
+    try:
+        # Import here to avoid loading at startup
+        from faster_whisper import WhisperModel
+        whisper_impl = "faster_whisper"
+        whisper_model = WhisperModel(model_size, device="cpu", compute_type="int8")
+    except Exception as e:
+        error_messages.append(f"faster-whisper error: {str(e)}")
         
-        # First try faster_whisper
+    # If that failed, try regular whisper
+    if whisper_model is None:
         try:
-            # Import here to avoid loading at startup
-            from faster_whisper import WhisperModel
-            whisper_impl = "faster_whisper"
-            _whisper_model = WhisperModel("small", device="cpu", compute_type="int8")
-            load_time = time.time() - start_loading
-            print(f"✅ faster-whisper model loaded in {load_time:.2f} seconds")
+            import whisper
+            whisper_impl = "whisper"
+            whisper_model = whisper.load_model("base")
         except Exception as e:
-            error_messages.append(f"faster-whisper error: {str(e)}")
-            
-        # If that failed, try regular whisper
-        if _whisper_model is None:
-            try:
-                import whisper
-                whisper_impl = "whisper"
-                _whisper_model = whisper.load_model("base")
-                load_time = time.time() - start_loading
-                print(f"✅ Regular whisper model loaded in {load_time:.2f} seconds")
-            except Exception as e:
-                error_messages.append(f"regular whisper error: {str(e)}")
+            error_messages.append(f"regular whisper error: {str(e)}")
+    
+    # If both failed, raise an error with details
+    if whisper_model is None:
+        error_details = "\n".join(error_messages)
+        log.error('whisper_unavailable', errors=error_messages)
+        raise ImportError(f"No whisper implementation available:\n{error_details}")
         
-        # If both failed, raise an error with details
-        if _whisper_model is None:
-            error_details = "\n".join(error_messages)
-            print(f"❌ Failed to load any whisper implementation:\n{error_details}")
-            raise ImportError(f"No whisper implementation available:\n{error_details}")
-            
-        # Store the implementation type
-        if _whisper_model is not None:
-            _whisper_model._whisper_impl = whisper_impl
-            
-    return _whisper_model
+    # Store the implementation type
+    whisper_model._whisper_impl = whisper_impl
+    log.info('whisper_loaded', implementation=whisper_impl, model=model_size)
+    return whisper_model
+
+registry.register('vader', load_vader_analyzer)
+registry.register('distilbert', load_distilbert)
+registry.register('whisper', load_whisper_model)
+# The other model sizes of the transcription tiers (see audio/whisper_policy.py)
+for _tier in TIERS.values():
+    if _tier.model_size != "small":
+        registry.register(f'whisper_{_tier.model_size}', partial(load_whisper_model, _tier.model_size))
+
+# Lazy accessors: the registry loads each model once, even when several
+# workers ask for it at the same time, and unloads it again when idle
+def get_vader_analyzer():
+    return registry.get('vader')
+
+def get_distilbert():
+    return registry.get('distilbert')
+
+def get_whisper_model(model_size="small"):
+    return registry.get('whisper' if model_size == "small" else f'whisper_{model_size}')
 
 # Transcribe audio using Faster-Whisper or regular Whisper
-def transcribe_audio(file_path):
+def transcribe_audio(file_path, on_segment=None, resume_from=0.0, start_index=0, speech=None, tier=None):
+    """
+    Transcribe an audio file, handing each segment to `on_segment` as soon as
+    it is decoded.
+
+    Args:
+        file_path: Path of the audio file
+        on_segment: Optional callback(index, start, end, text) used to persist
+            segments while the rest of the file is still being decoded
+        resume_from: Offset in seconds to start decoding from, used to continue
+            an interrupted transcription after its last saved segment
+        start_index: Index given to the first segment produced by this call
+        speech: Optional SpeechRegions from the VAD pre-pass (see audio.vad);
+            only its voiced spans are decoded, from its already decoded samples
+        tier: Whisper model size and decoding settings (see audio.whisper_policy),
+            the standard tier by default
+
+    Returns:
+        Text of the segments decoded by this call
+    """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Audio file not found: {file_path}")
+    tier = tier or get_tier(TIER_STANDARD)
         
-    print(f"🎤 Starting transcription for: {os.path.basename(file_path)}")
-    print(f"🎤 File size: {os.path.getsize(file_path)/1024/1024:.2f} MB")
+    log.info(
+        'transcription_started',
+        file=os.path.basename(file_path),
+        size_mb=round(os.path.getsize(file_path) / 1024 / 1024, 2),
+        resume_from=round(resume_from, 2),
+        start_index=start_index,
+        tier=tier.name
+    )
     
     # Lazy load the model
-    model = get_whisper_model()
+    model = get_whisper_model(tier.model_size)
     
     transcribe_start = time.time()
     text = ""
+    # Whisper accepts "start" (or "start,end,...") to decode only part of the file
+    clip_timestamps = f"{resume_from:.2f}" if resume_from else "0"
+    source = file_path
+    if speech is not None:
+        clip_timestamps = speech.clip_timestamps(resume_from)
+        source = speech.audio
+        log.info(
+            'decoding_voiced_spans',
+            spans=len(clip_timestamps) // 2,
+            voiced_seconds=round(speech.speech_seconds_after(resume_from), 1),
+            duration=round(speech.duration, 1)
+        )
     
     try:
         # Determine which whisper implementation we're using by checking module name
         model_type = type(model).__module__
-        print(f"🎤 Using model type: {model_type}")
+        log.debug('whisper_model', model_type=model_type)
         
         if 'whisper' in model_type and 'faster_whisper' not in model_type:
-            # Regular whisper
-            print("🎤 Using regular whisper transcription")
-            result = model.transcribe(file_path)
-            text = result["text"]
+            # Regular whisper decodes the whole file before returning segments
+            result = model.transcribe(source, clip_timestamps=clip_timestamps, **tier.decode_options())
+            segments = [(seg["start"], seg["end"], seg["text"]) for seg in result["segments"]]
         else:
-            # Faster whisper
-            print("🎤 Using faster-whisper transcription")
-            segments, _ = model.transcribe(file_path, beam_size=5)
-            
-            print("🎤 Processing segments...")
-            text_segments = []
-            for i, seg in enumerate(segments):
-                text_segments.append(seg.text)
-                if i < 3:  # Print first few segments to show progress
-                    print(f"🎤 Segment {i+1}: {seg.text}")
+            # Faster whisper yields segments lazily while decoding
+            segments, _ = model.transcribe(source, clip_timestamps=clip_timestamps, **tier.decode_options())
+            segments = ((seg.start, seg.end, seg.text) for seg in segments)
+        
+        text_segments = []
+        for i, (seg_start, seg_end, seg_text) in enumerate(segments):
+            seg_text = seg_text.strip()
+            text_segments.append(seg_text)
+            if on_segment is not None:
+                on_segment(start_index + i, seg_start, seg_end, seg_text)
+            log.debug('segment_decoded', index=start_index + i, start=seg_start, end=seg_end)
             
-            if len(text_segments) > 3:
-                print(f"🎤 ... and {len(text_segments) - 3} more segments")
-                
-            text = " ".join(text_segments)
+        text = " ".join(text_segments)
         
-        transcribe_time = time.time() - transcribe_start
-        print(f"✅ Transcription completed in {transcribe_time:.2f} seconds")
-        print(f"✅ Total text length: {len(text)} characters")
+        log.info(
+            'transcription_finished',
+            seconds=round(time.time() - transcribe_start, 2),
+            segments=len(text_segments),
+            characters=len(text)
+        )
         
         return text.strip()
     
     except Exception as e:
-        transcribe_time = time.time() - transcribe_start
-        print(f"❌ Transcription failed after {transcribe_time:.2f} seconds: {str(e)}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
-        
-        # Import traceback here to avoid circular imports
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        log.exception('transcription_failed', seconds=round(time.time() - transcribe_start, 2), error=str(e))
         
-        # Return empty string to indicate failure
-        return ""
+        # Re-raise so the job is retried; segments saved so far are kept and
+        # the retry resumes after the last of them
+        raise
+
+# Transcribe 16 kHz mono samples already in memory (live streams)
+def transcribe_samples(samples, initial_prompt=None):
+    """
+    Transcribe a float32 16 kHz mono buffer in one pass.
+
+    Used for the rolling buffer of a live stream, so it favours latency:
+    greedy decoding, with the text already committed as prompt.
+
+    Returns:
+        List of (start, end, text) with times relative to the buffer start
+    """
+    model = get_whisper_model()
+    model_type = type(model).__module__
+
+    if 'whisper' in model_type and 'faster_whisper' not in model_type:
+        result = model.transcribe(samples, initial_prompt=initial_prompt, fp16=False)
+        return [(seg["start"], seg["end"], seg["text"].strip()) for seg in result["segments"]]
+
+    segments, _ = model.transcribe(samples, beam_size=1, initial_prompt=initial_prompt)
+    return [(seg.start, seg.end, seg.text.strip()) for seg in segments]
+
+# Sentence-level sentiment: the transcript is split into sentences (long
+# ones into windows of at most SENTIMENT_WINDOW_WORDS words, well under
+# DistilBERT's 512 tokens) so the whole recording is analyzed, not only
+# its first 512 tokens, and the windows go through DistilBERT as one batch
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+SENTIMENT_WINDOW_WORDS = 200
+
+
+def split_sentiment_windows(text, max_words=SENTIMENT_WINDOW_WORDS):
+    """Sentences of the text, with sentences over max_words split into word windows."""
+    windows = []
+    for sentence in SENTENCE_PATTERN.split(text.strip()):
+        words = sentence.split()
+        for i in range(0, len(words), max_words):
+            windows.append(" ".join(words[i:i + max_words]))
+    return windows
+
+
+def sentiment_series(text, use_distilbert=True):
+    """
+    Per-window sentiment of a transcript.
+
+    Returns:
+        List of {"index", "text", "words", "vader", "distilbert_positive"}
+        where vader is the VADER compound score and distilbert_positive the
+        DistilBERT probability of POSITIVE (None when DistilBERT is unavailable
+        or not requested)
+    """
+    return sentiment_series_batch([text], use_distilbert)[0]
+
+
+def sentiment_series_batch(texts, use_distilbert=True):
+    """sentiment_series of several transcripts, with the windows of all of them in one DistilBERT request."""
+    max_words = getattr(settings, 'AUDIO_SENTIMENT_WINDOW_WORDS', SENTIMENT_WINDOW_WORDS)
+    text_windows = [split_sentiment_windows(text, max_words) for text in texts]
+    windows = [window for per_text in text_windows for window in per_text]
+    if not windows:
+        return [[] for _ in texts]
+
+    vader_analyzer = get_vader_analyzer()
+    with STAGE_SECONDS.time(stage='sentiment'):
+        vader_scores = [vader_analyzer.polarity_scores(window)['compound'] for window in windows]
+
+        positives = [None] * len(windows)
+        if use_distilbert:
+            try:
+                # One request per window; the broker runs them as padded batches
+                results = get_distilbert_broker().predict_many(windows)
+                positives = [
+                    result['score'] if result['label'] == 'POSITIVE' else 1 - result['score']
+                    for result in results
+                ]
+            except Exception as e:
+                log.warning('distilbert_unavailable', error=str(e), windows=len(windows))
+
+    series = []
+    offset = 0
+    for per_text in text_windows:
+        series.append([
+            {
+                "index": index,
+                "text": window,
+                "words": len(window.split()),
+                "vader": vader,
+                "distilbert_positive": round(positive, 4) if positive is not None else None
+            }
+            for index, (window, vader, positive) in enumerate(zip(
+                per_text, vader_scores[offset:offset + len(per_text)], positives[offset:offset + len(per_text)]
+            ))
+        ])
+        offset += len(per_text)
+    return series
+
+
+def summarize_sentiment(series):
+    """Aggregates of a sentiment series: word-weighted means, extremes and the most negative passage."""
+    if not series:
+        return None
+    total_words = sum(window['words'] for window in series) or 1
+    most_negative = min(series, key=lambda window: window['vader'])
+    summary = {
+        "windows": len(series),
+        "mean": round(sum(window['vader'] * window['words'] for window in series) / total_words, 4),
+        "min": min(window['vader'] for window in series),
+        "max": max(window['vader'] for window in series),
+        "negative_share": round(
+            sum(1 for window in series if get_sentiment_label(window['vader']) == "Negative") / len(series), 4
+        ),
+        "distilbert_positive": None,
+        "most_negative": {
+            "index": most_negative['index'],
+            "text": most_negative['text'],
+            "score": most_negative['vader']
+        }
+    }
+    scored = [window for window in series if window['distilbert_positive'] is not None]
+    if scored:
+        scored_words = sum(window['words'] for window in scored) or 1
+        summary["distilbert_positive"] = round(
+            sum(window['distilbert_positive'] * window['words'] for window in scored) / scored_words, 4
+        )
+    return summary
+
+
+@cached_analysis('series')
+def analyze_sentiment_series(text):
+    """Sentence-level sentiment series and its summary, as stored on AudioMemory."""
+    series = sentiment_series(text)
+    return {"series": series, "summary": summarize_sentiment(series)}
+
 
 # Analyze individual phrase - returns dictionary with detailed sentiment analysis
+@cached_analysis('detailed')
 def analyze_phrase_detailed(phrase):
-    print(f"😀 Starting detailed sentiment analysis...")
-    print(f"😀 Text length: {len(phrase)} characters")
-    
-    # Lazy load models
-    vader_analyzer = get_vader_analyzer()
-    distilbert_analyzer, tokenizer = get_distilbert()
-    
-    # Truncate if needed
-    tokens = tokenizer.encode(phrase, truncation=False)
-    if len(tokens) > 512:
-        print(f"⚠️ Text too long ({len(tokens)} tokens), truncating to 512 tokens")
-        phrase = tokenizer.decode(tokens[:512], skip_special_tokens=True)
-    
-    print(f"😀 Running VADER sentiment analysis...")
-    vader_start = time.time()
-    vader_scores = vader_analyzer.polarity_scores(phrase)
-    vader_time = time.time() - vader_start
-    print(f"✅ VADER analysis completed in {vader_time:.2f} seconds")
-    
-    print(f"😀 Running DistilBERT sentiment analysis...")
-    distilbert_start = time.time()
-    distilbert_result = distilbert_analyzer(phrase, truncation=True)[0]
-    distilbert_time = time.time() - distilbert_start
-    print(f"✅ DistilBERT analysis completed in {distilbert_time:.2f} seconds")
+    start_time = time.time()
+    vader_compound = analyze_phrase(phrase)
+    series = sentiment_series(phrase)
+    summary = summarize_sentiment(series)
 
-    sentiment = get_sentiment_label(vader_scores['compound'])
-    
-    print(f"📊 Sentiment: {sentiment}")
-    print(f"📊 VADER compound score: {vader_scores['compound']:.4f}")
-    print(f"📊 DistilBERT: {distilbert_result['label']} ({distilbert_result['score']:.4f})")
+    # DistilBERT over the whole text: word-weighted mean of the window probabilities
+    distilbert_label = distilbert_score = None
+    if summary and summary['distilbert_positive'] is not None:
+        positive = summary['distilbert_positive']
+        distilbert_label = "POSITIVE" if positive >= 0.5 else "NEGATIVE"
+        distilbert_score = positive if positive >= 0.5 else round(1 - positive, 4)
+
+    sentiment = get_sentiment_label(vader_compound)
+    log.info(
+        'detailed_sentiment',
+        characters=len(phrase),
+        windows=len(series),
+        label=sentiment,
+        vader_compound=vader_compound,
+        distilbert_label=distilbert_label,
+        distilbert_score=distilbert_score,
+        seconds=round(time.time() - start_time, 3)
+    )
 
     return {
         "text": phrase,
         "vader_sentiment": sentiment,
-        "vader_compound": vader_scores['compound'],
-        "distilbert_label": distilbert_result['label'],
-        "distilbert_score": distilbert_result['score']
+        "vader_compound": vader_compound,
+        "distilbert_label": distilbert_label,
+        "distilbert_score": distilbert_score,
+        "series": series,
+        "summary": summary
     }
 
 # Simple version that returns just the compound score (for backward compatibility)
 def analyze_phrase(phrase):
-    print(f"😀 Starting sentiment analysis...")
     vader_analyzer = get_vader_analyzer()
     vader_scores = vader_analyzer.polarity_scores(phrase)
-    vader_compound = vader_scores['compound']
-    print(f"📊 Final sentiment score (VADER compound): {vader_compound:.4f}")
-    return vader_compound
+    return vader_scores['compound']
 
 def get_sentiment_label(score):
     """Convert numerical score to sentiment label"""
@@ -210,19 +368,97 @@ def get_sentiment_label(score):
     else:
         return "Neutral"
 
+# Keyword lists used by the detectors below; compiled once into ANALYSIS_LEXICON
+MEMORY_INDICATORS = [
+    "remember", "recall", "memory", "memories", "forget", "forgot", 
+    "forgotten", "reminded", "reminds", "reminiscent", "lost",
+    "missing", "missed", "gone", "passed away", "died", "death"
+]
+
+ROUTINE_INDICATORS = [
+    "breakfast", "lunch", "dinner", "meal", "eating", "sleeping", "sleep",
+    "waking up", "wake up", "shower", "bath", "medication", "medicine",
+    "exercise", "walk", "walking", "running", "jogging", "working",
+    "studying", "reading", "watching", "listening", "cook", "cooking",
+    "cleaning", "laundry", "shopping", "commute", "commuting", "driving",
+    "travel", "traveling", "routine", "habit", "schedule", "appointment"
+]
+
+TIME_INDICATORS = [
+    "today", "yesterday", "tomorrow", "now", "later", "soon", "earlier",
+    "morning", "afternoon", "evening", "night", "midnight", "noon",
+    "last night", "last week", "last month", "last year", "next week",
+    "next month", "next year", "day", "week", "month", "year",
+    "january", "february", "march", "april", "may", "june", "july",
+    "august", "september", "october", "november", "december",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "right now", "currently", "moment", "instant", "immediately"
+]
+
+LOCATION_INDICATORS = [
+    "home", "house", "apartment", "room", "bedroom", "bathroom", "kitchen",
+    "living room", "office", "work", "school", "college", "university",
+    "hospital", "clinic", "doctor", "store", "shop", "restaurant", "cafe",
+    "park", "garden", "street", "road", "avenue", "boulevard", "highway",
+    "city", "town", "village", "country", "state", "province", "region",
+    "continent", "world", "planet", "space", "universe", "here", "there",
+    # Major cities and countries to look for
+    "new york", "london", "paris", "tokyo", "berlin", "rome", "madrid",
+    "moscow", "beijing", "delhi", "mumbai", "sydney", "melbourne",
+    "usa", "uk", "france", "germany", "japan", "china", "india", "australia"
+]
+
+SEVERITY_INDICATORS = [
+    "very", "extremely", "incredibly", "really", "quite", "totally",
+    "absolutely", "completely", "utterly", "terribly", "awful", "horrible",
+    "severe", "serious", "critical", "emergency", "urgent", "desperate",
+    "hopeless", "helpless", "alone", "lonely", "isolated", "abandoned",
+    "scared", "frightened", "terrified", "panic", "anxiety", "depression",
+    "sad", "unhappy", "miserable", "suicidal", "die", "death", "kill",
+    "harm", "hurt", "pain", "suffering", "agony", "distress", "crisis"
+]
+
+# Severity indicators that also put the full text into the result as context
+CRITICAL_SEVERITY_INDICATORS = ["suicidal", "die", "death", "kill", "harm"]
+
+# Concern label -> keywords, checked in this order by identify_potential_concerns
+CONCERN_KEYWORDS = {
+    "Potential suicidal ideation": ["suicid", "kill myself", "end my life", "take my life"],
+    "Feelings of loneliness or isolation": ["lonely", "alone", "isolated", "no friends", "nobody cares"],
+    "Potential mental health concerns": ["depress", "anxiety", "anxious", "panic", "fear", "scared", "terrified"],
+    "Physical health concerns": ["hurt", "pain", "ache", "sick", "ill", "disease", "condition", "symptom"],
+    "Negative feelings about memory": ["lost", "died", "passed away", "death", "funeral"],
+    "Memory-related concerns": ["forgot", "forget", "don't remember", "can't recall", "memory problem"],
+    "Difficulties with eating or appetite": ["eat", "food", "appetite", "hungry", "meal"],
+    "Sleep issues": ["sleep", "insomnia", "tired", "exhausted", "fatigue"],
+}
+
+# Concerns that are only raised together with mildly negative sentiment
+SENTIMENT_GATED_CONCERNS = {"Difficulties with eating or appetite", "Sleep issues"}
+
+ANALYSIS_LEXICON = Lexicon({
+    "memory": MEMORY_INDICATORS,
+    "routine": ROUTINE_INDICATORS,
+    "time": TIME_INDICATORS,
+    "location": LOCATION_INDICATORS,
+    "severity": SEVERITY_INDICATORS,
+    **{f"concern:{label}": keywords for label, keywords in CONCERN_KEYWORDS.items()},
+})
+
+TIME_PATTERN = re.compile(r'\d{1,2}:\d{2}')
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4}')
+
+
+def scan_keywords(text):
+    """Run the shared lexicon over the text once; pass the result to the detectors."""
+    return ANALYSIS_LEXICON.scan(text)
+
 # Advanced analysis functions from the second file
-def find_memory_references(text):
+def find_memory_references(text, hits=None):
     """Identify potential memory references in text"""
-    memory_indicators = [
-        "remember", "recall", "memory", "memories", "forget", "forgot", 
-        "forgotten", "reminded", "reminds", "reminiscent", "lost",
-        "missing", "missed", "gone", "passed away", "died", "death"
-    ]
-    
-    found_indicators = []
-    for indicator in memory_indicators:
-        if re.search(r'\b' + re.escape(indicator) + r'\b', text.lower()):
-            found_indicators.append(indicator)
+    if hits is None:
+        hits = scan_keywords(text)
+    found_indicators = hits.ordered("memory")
     
     # If we found indicators, also include the full text as context
     if found_indicators:
@@ -230,106 +466,50 @@ def find_memory_references(text):
         
     return ", ".join(found_indicators) if found_indicators else None
 
-def find_routine_references(text):
+def find_routine_references(text, hits=None):
     """Identify potential routine references in text"""
-    routine_indicators = [
-        "breakfast", "lunch", "dinner", "meal", "eating", "sleeping", "sleep",
-        "waking up", "wake up", "shower", "bath", "medication", "medicine",
-        "exercise", "walk", "walking", "running", "jogging", "working",
-        "studying", "reading", "watching", "listening", "cook", "cooking",
-        "cleaning", "laundry", "shopping", "commute", "commuting", "driving",
-        "travel", "traveling", "routine", "habit", "schedule", "appointment"
-    ]
-    
-    found_indicators = []
-    for indicator in routine_indicators:
-        if re.search(r'\b' + re.escape(indicator) + r'\b', text.lower()):
-            found_indicators.append(indicator)
+    if hits is None:
+        hits = scan_keywords(text)
+    found_indicators = hits.ordered("routine")
             
     return ", ".join(found_indicators) if found_indicators else None
 
-def find_time_indicators(text):
+def find_time_indicators(text, hits=None):
     """Identify time references in text"""
-    time_indicators = [
-        "today", "yesterday", "tomorrow", "now", "later", "soon", "earlier",
-        "morning", "afternoon", "evening", "night", "midnight", "noon",
-        "last night", "last week", "last month", "last year", "next week",
-        "next month", "next year", "day", "week", "month", "year",
-        "january", "february", "march", "april", "may", "june", "july",
-        "august", "september", "october", "november", "december",
-        "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
-        "right now", "currently", "moment", "instant", "immediately"
-    ]
-    
-    found_indicators = []
-    for indicator in time_indicators:
-        if re.search(r'\b' + re.escape(indicator) + r'\b', text.lower()):
-            found_indicators.append(indicator)
+    if hits is None:
+        hits = scan_keywords(text)
+    found_indicators = hits.ordered("time")
             
     # Also try to find specific times like "3:00" or dates like "2023-04-27"
-    time_pattern = r'\d{1,2}:\d{2}'
-    date_pattern = r'\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4}'
-    
-    time_matches = re.findall(time_pattern, text)
-    date_matches = re.findall(date_pattern, text)
-    
-    found_indicators.extend(time_matches)
-    found_indicators.extend(date_matches)
+    found_indicators.extend(TIME_PATTERN.findall(text))
+    found_indicators.extend(DATE_PATTERN.findall(text))
             
     return ", ".join(found_indicators) if found_indicators else None
 
-def find_location_indicators(text):
+def find_location_indicators(text, hits=None):
     """Identify location references in text"""
-    location_indicators = [
-        "home", "house", "apartment", "room", "bedroom", "bathroom", "kitchen",
-        "living room", "office", "work", "school", "college", "university",
-        "hospital", "clinic", "doctor", "store", "shop", "restaurant", "cafe",
-        "park", "garden", "street", "road", "avenue", "boulevard", "highway",
-        "city", "town", "village", "country", "state", "province", "region",
-        "continent", "world", "planet", "space", "universe", "here", "there"
-    ]
-    
-    # Major cities and countries to look for
-    cities_countries = [
-        "new york", "london", "paris", "tokyo", "berlin", "rome", "madrid",
-        "moscow", "beijing", "delhi", "mumbai", "sydney", "melbourne",
-        "usa", "uk", "france", "germany", "japan", "china", "india", "australia"
-    ]
-    
-    location_indicators.extend(cities_countries)
-    
-    found_indicators = []
-    for indicator in location_indicators:
-        if re.search(r'\b' + re.escape(indicator) + r'\b', text.lower()):
-            found_indicators.append(indicator)
+    if hits is None:
+        hits = scan_keywords(text)
+    found_indicators = hits.ordered("location")
             
     return ", ".join(found_indicators) if found_indicators else None
 
-def find_severity_indicators(text):
+def find_severity_indicators(text, hits=None):
     """Identify intensity/severity indicators in text"""
-    severity_indicators = [
-        "very", "extremely", "incredibly", "really", "quite", "totally",
-        "absolutely", "completely", "utterly", "terribly", "awful", "horrible",
-        "severe", "serious", "critical", "emergency", "urgent", "desperate",
-        "hopeless", "helpless", "alone", "lonely", "isolated", "abandoned",
-        "scared", "frightened", "terrified", "panic", "anxiety", "depression",
-        "sad", "unhappy", "miserable", "suicidal", "die", "death", "kill",
-        "harm", "hurt", "pain", "suffering", "agony", "distress", "crisis"
-    ]
-    
-    found_indicators = []
-    for indicator in severity_indicators:
-        if re.search(r'\b' + re.escape(indicator) + r'\b', text.lower()):
-            found_indicators.append(indicator)
+    if hits is None:
+        hits = scan_keywords(text)
+    found_indicators = hits.ordered("severity")
     
     # If we found severe indicators, also include the full text as context
-    if any(indicator in ["suicidal", "die", "death", "kill", "harm"] for indicator in found_indicators):
+    if any(indicator in CRITICAL_SEVERITY_INDICATORS for indicator in found_indicators):
         found_indicators.append(text)
             
     return ", ".join(found_indicators) if found_indicators else None
 
-def identify_potential_concerns(text, sentiment_score):
+def identify_potential_concerns(text, sentiment_score, hits=None):
     """Identify potential concerns based on content and sentiment"""
+    if hits is None:
+        hits = scan_keywords(text)
     concerns = []
     
     # Check for extreme negative sentiment
@@ -337,49 +517,62 @@ def identify_potential_concerns(text, sentiment_score):
         concerns.append("Highly negative emotional state")
     
     # Check for specific keywords indicating various concerns
-    if re.search(r'\b(suicid|kill myself|end my life|take my life)\b', text.lower()):
-        concerns.append("Potential suicidal ideation")
-    
-    if re.search(r'\b(lonely|alone|isolated|no friends|nobody cares)\b', text.lower()):
-        concerns.append("Feelings of loneliness or isolation")
-    
-    if re.search(r'\b(depress|anxiety|anxious|panic|fear|scared|terrified)\b', text.lower()):
-        concerns.append("Potential mental health concerns")
-    
-    if re.search(r'\b(hurt|pain|ache|sick|ill|disease|condition|symptom)\b', text.lower()):
-        concerns.append("Physical health concerns")
-    
-    if re.search(r'\b(lost|died|passed away|death|funeral)\b', text.lower()):
-        concerns.append("Negative feelings about memory")
-        
-    if re.search(r'\b(forgot|forget|don\'t remember|can\'t recall|memory problem)\b', text.lower()):
-        concerns.append("Memory-related concerns")
-    
-    if re.search(r'\b(eat|food|appetite|hungry|meal)\b', text.lower()) and sentiment_score < -0.1:
-        concerns.append("Difficulties with eating or appetite")
-    
-    if re.search(r'\b(sleep|insomnia|tired|exhausted|fatigue)\b', text.lower()) and sentiment_score < -0.1:
-        concerns.append("Sleep issues")
+    for label in CONCERN_KEYWORDS:
+        if not hits.found(f"concern:{label}"):
+            continue
+        if label in SENTIMENT_GATED_CONCERNS and sentiment_score >= -0.1:
+            continue
+        concerns.append(label)
     
     return ", ".join(concerns) if concerns else None
 
+@cached_analysis('comprehensive')
 def analyze_text_comprehensive(text):
     """
     Perform comprehensive text analysis returning all metrics
     """
     # Get sentiment score (VADER compound)
-    sentiment_score = analyze_phrase(text)
-    
+    with STAGE_SECONDS.time(stage='sentiment'):
+        sentiment_score = analyze_phrase(text)
+    return _analyze_keywords(text, sentiment_score)
+
+
+def analyze_texts_batch(texts, with_series=False):
+    """
+    Uncached comprehensive analysis of several texts, for bulk re-analysis.
+
+    The sentiment model is fetched once and run over the whole batch before
+    the keyword scans, instead of once per analyze_text_comprehensive call.
+    With `with_series`, the sentiment series of all texts are computed too,
+    their windows going to DistilBERT as one request (see sentiment_series_batch).
+
+    Returns:
+        One analyze_text_comprehensive result per text, with an
+        analyze_sentiment_series result under 'series' if requested
+    """
+    vader_analyzer = get_vader_analyzer()
+    with STAGE_SECONDS.time(stage='sentiment'):
+        scores = [vader_analyzer.polarity_scores(text)['compound'] for text in texts]
+    results = [_analyze_keywords(text, score) for text, score in zip(texts, scores)]
+    if with_series:
+        for result, series in zip(results, sentiment_series_batch(texts)):
+            result['series'] = {"series": series, "summary": summarize_sentiment(series)}
+    return results
+
+
+def _analyze_keywords(text, sentiment_score):
     # Get sentiment label
     sentiment_label = get_sentiment_label(sentiment_score)
     
-    # Get additional analysis
-    memory_references = find_memory_references(text)
-    routine_references = find_routine_references(text)
-    time_indicators = find_time_indicators(text)
-    location_indicators = find_location_indicators(text)
-    severity_indicators = find_severity_indicators(text)
-    potential_concerns = identify_potential_concerns(text, sentiment_score)
+    # Get additional analysis from a single lexicon pass
+    with STAGE_SECONDS.time(stage='keywords'):
+        hits = scan_keywords(text)
+        memory_references = find_memory_references(text, hits)
+        routine_references = find_routine_references(text, hits)
+        time_indicators = find_time_indicators(text, hits)
+        location_indicators = find_location_indicators(text, hits)
+        severity_indicators = find_severity_indicators(text, hits)
+        potential_concerns = identify_potential_concerns(text, sentiment_score, hits)
     
     result = {
         'sentiment_score': sentiment_score,
@@ -392,12 +585,8 @@ def analyze_text_comprehensive(text):
         'potential_concerns': potential_concerns
     }
     
-    print("📊 Comprehensive analysis results:")
-    for key, value in result.items():
-        if value is not None:
-            print(f"📊 {key}: {value}")
-    
+    log.info('text_analyzed', characters=len(text), **result)
     return result
 
-# Print a startup message without loading any models
-print("🚀 Enhanced audio and text analysis module loaded (models will be loaded on demand)")
\ No newline at end of file
+# Models are loaded on demand by the registry
+log.debug('processing_module_loaded')
\ No newline at end of file
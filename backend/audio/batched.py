@@ -0,0 +1,189 @@
+"""
+Batched transcription of several short recordings in one Whisper call.
+
+Decoding a 10-30 second voice note on its own spends much of its time on
+per-call overhead. When short clips are waiting in the queue, a worker
+claims up to AUDIO_WHISPER_BATCH_SIZE of them (see JobQueue._claim_batch),
+and their decoded samples are laid end to end and given to faster-whisper's
+BatchedInferencePipeline as one recording, with one clip timestamp per
+voiced chunk of at most 30 seconds. Every chunk lies inside a single clip
+and is decoded on its own, so the segments are split back per recording by
+their start time.
+
+Only recordings that pass a cheap check of their file size and header
+duration (may_batch) are claimed into a batch, so long recordings are never
+decoded or held by a batching worker.
+
+Settings (all optional):
+    AUDIO_WHISPER_BATCH_SIZE         clips decoded together, 1 disables batching
+    AUDIO_WHISPER_BATCH_MAX_SECONDS  longest recording that is batched
+"""
+import bisect
+import os
+import wave
+from functools import lru_cache
+import numpy as np
+from django.conf import settings
+from .audio_processing import get_whisper_model
+
+SAMPLING_RATE = 16000
+CHUNK_SECONDS = 30  # Whisper's input window
+
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_MAX_SECONDS = 60
+
+# Bytes per second of 48 kHz 16-bit stereo PCM: no batchable file is larger
+# than this times AUDIO_WHISPER_BATCH_MAX_SECONDS
+MAX_BYTES_PER_SECOND = 48000 * 2 * 2
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def batch_size():
+    return max(1, int(_setting('AUDIO_WHISPER_BATCH_SIZE', DEFAULT_BATCH_SIZE)))
+
+
+def is_batchable(speech):
+    """True for a recording short enough to share a batch, with speech in it."""
+    return speech is not None and speech.has_speech and speech.duration <= max_seconds()
+
+
+def max_seconds():
+    return _setting('AUDIO_WHISPER_BATCH_MAX_SECONDS', DEFAULT_MAX_SECONDS)
+
+
+@lru_cache(maxsize=1024)
+def probe_duration(path, size):
+    """
+    Duration in seconds from the file header, without decoding the audio.
+
+    `size` is part of the cache key, so a replaced file is probed again.
+
+    Returns:
+        Seconds, or None when the header does not tell
+    """
+    try:
+        with wave.open(path, 'rb') as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError, OSError):
+        pass
+    try:
+        import av  # Installed with faster-whisper
+        with av.open(path, metadata_errors='ignore') as container:
+            if container.duration is not None:
+                return container.duration / av.time_base
+            stream = container.streams.audio[0]
+            if stream.duration is not None:
+                return float(stream.duration * stream.time_base)
+    except Exception:
+        pass
+    return None
+
+
+def may_batch(path):
+    """
+    Cheap check, before a recording is claimed into a batch or decoded, that
+    it can be short enough: its file size and, where the header tells, its
+    duration are within AUDIO_WHISPER_BATCH_MAX_SECONDS. is_batchable makes
+    the final decision on the decoded recording.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    if size > max_seconds() * MAX_BYTES_PER_SECOND:
+        return False
+    duration = probe_duration(path, size)
+    return duration is None or duration <= max_seconds()
+
+
+def plan_chunks(spans, max_seconds=CHUNK_SECONDS):
+    """
+    Group voiced spans into chunks of at most `max_seconds`, splitting longer spans.
+
+    Returns:
+        List of (start, end) in seconds
+    """
+    chunks = []
+    for start, end in spans:
+        while end - start > max_seconds:
+            chunks.append((start, start + max_seconds))
+            start += max_seconds
+        if chunks and end - chunks[-1][0] <= max_seconds and start >= chunks[-1][1]:
+            chunks[-1] = (chunks[-1][0], end)
+        else:
+            chunks.append((start, end))
+    return chunks
+
+
+def pack_clips(speeches):
+    """
+    Lay the samples of several recordings end to end.
+
+    Returns:
+        (audio, offsets, clip_timestamps): the packed samples, the start of
+        every recording in them in seconds, and the voiced chunks as the
+        {"start", "end"} sample dicts of BatchedInferencePipeline
+    """
+    offsets = []
+    clip_timestamps = []
+    position = 0
+    for speech in speeches:
+        offset = position / SAMPLING_RATE
+        offsets.append(offset)
+        for start, end in plan_chunks(speech.spans):
+            clip_timestamps.append({
+                'start': position + int(start * SAMPLING_RATE),
+                'end': position + min(int(end * SAMPLING_RATE), len(speech.audio)),
+            })
+        position += len(speech.audio)
+    audio = np.concatenate([speech.audio for speech in speeches]).astype(np.float32)
+    return audio, offsets, clip_timestamps
+
+
+def split_segments(segments, offsets):
+    """
+    Hand segments of the packed recording back to the recordings they came from.
+
+    Args:
+        segments: (start, end, text) in seconds of the packed recording
+        offsets: Start of every recording, from pack_clips
+
+    Returns:
+        One list of (start, end, text) per recording, in its own time
+    """
+    results = [[] for _ in offsets]
+    for start, end, text in segments:
+        text = text.strip()
+        if not text:
+            continue
+        clip = bisect.bisect_right(offsets, start + 1e-3) - 1
+        results[clip].append((start - offsets[clip], end - offsets[clip], text))
+    return results
+
+
+def transcribe_clips(speeches, tier, size=None):
+    """
+    Transcribe short recordings in batched Whisper calls.
+
+    Args:
+        speeches: SpeechRegions of the recordings (see audio.vad), with their samples
+        tier: Whisper model and decoding settings (see audio.whisper_policy)
+        size: Chunks decoded per model call, AUDIO_WHISPER_BATCH_SIZE by default
+
+    Returns:
+        One list of (start, end, text) segments per recording
+    """
+    from faster_whisper import BatchedInferencePipeline
+
+    audio, offsets, clip_timestamps = pack_clips(speeches)
+    pipeline = BatchedInferencePipeline(model=get_whisper_model(tier.model_size))
+    segments, _ = pipeline.transcribe(
+        audio,
+        clip_timestamps=clip_timestamps,
+        batch_size=size or batch_size(),
+        **tier.decode_options()
+    )
+    return split_segments([(seg.start, seg.end, seg.text) for seg in segments], offsets)
@@ -0,0 +1,263 @@
+"""
+Parallel chunked transcription for long recordings.
+
+A single faster-whisper decode runs on one core. For recordings with more
+voiced audio than AUDIO_CHUNKED_MIN_SECONDS, the decoded PCM is split into
+windows which are transcribed by a pool of worker processes, each holding its
+own Whisper model, and the segments are stitched back together in order.
+
+Windows are cut in the silences found by the VAD pre-pass whenever possible.
+A voiced span longer than a window is split into overlapping windows instead;
+in the overlap, words are taken from the earlier window up to the middle of
+the overlap and from the later window after it, and a word repeated across
+the cut is dropped.
+
+Each model size of the transcription tiers (see audio.whisper_policy) has its
+own pool, loaded by the model registry on first use, so a window is decoded by
+the model and with the decoding settings of the recording's tier.
+
+Settings (all optional):
+    AUDIO_CHUNKED_MIN_SECONDS  voiced seconds from which the chunked path is used (0 disables it)
+    AUDIO_CHUNK_SECONDS        target window length
+    AUDIO_CHUNK_OVERLAP        overlap of windows that split a voiced span
+    AUDIO_CHUNK_PROCESSES      worker processes, defaults to half the cores
+"""
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from django.conf import settings
+from backend.model_registry import registry
+from backend.structured_log import get_logger
+from .whisper_policy import TIERS, TIER_STANDARD, get_tier
+
+log = get_logger('audio.chunked')
+
+SAMPLING_RATE = 16000
+
+# Same model as audio_processing.load_whisper_model
+WHISPER_MODEL_SIZE = "small"
+WHISPER_COMPUTE_TYPE = "int8"
+
+DEFAULT_MIN_SECONDS = 600
+DEFAULT_CHUNK_SECONDS = 120
+DEFAULT_OVERLAP = 5
+BOUNDARY_TOLERANCE = 0.3  # Seconds within which a word on both sides of a cut is the same word
+
+# Whisper model of the current worker process
+_worker_model = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _pool_size():
+    processes = _setting('AUDIO_CHUNK_PROCESSES', None)
+    return max(1, processes or (os.cpu_count() or 2) // 2)
+
+
+def _init_worker(model_size, cpu_threads):
+    global _worker_model
+    from faster_whisper import WhisperModel
+    _worker_model = WhisperModel(
+        model_size,
+        device="cpu",
+        compute_type=WHISPER_COMPUTE_TYPE,
+        cpu_threads=cpu_threads
+    )
+
+
+def _transcribe_window(samples, offset, clips, decode_options):
+    """
+    Transcribe one window in a worker process, with the beam size, best_of
+    and temperatures of `decode_options`.
+
+    Returns:
+        List of (start, end, text, words) with times in seconds from the start
+        of the recording; words are (start, end, word) tuples
+    """
+    segments, _ = _worker_model.transcribe(
+        samples,
+        word_timestamps=True,
+        clip_timestamps=[round(value - offset, 2) for clip in clips for value in clip],
+        **decode_options
+    )
+    results = []
+    for segment in segments:
+        words = [(word.start + offset, word.end + offset, word.word) for word in segment.words or []]
+        results.append((segment.start + offset, segment.end + offset, segment.text, words))
+    return results
+
+
+def load_transcription_pool(model_size=WHISPER_MODEL_SIZE):
+    processes = _pool_size()
+    cpu_threads = max(1, (os.cpu_count() or processes) // processes)
+    log.info('transcription_pool_starting', processes=processes, cpu_threads=cpu_threads, model=model_size)
+    # Spawn rather than fork: the server process is multi-threaded
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(model_size, cpu_threads)
+    )
+
+
+def unload_transcription_pool(pool):
+    # Let windows already submitted finish
+    pool.shutdown(wait=True)
+
+
+def pool_name(model_size):
+    """Registry name of the worker pool holding a Whisper model size."""
+    return 'whisper_pool' if model_size == WHISPER_MODEL_SIZE else f'whisper_pool_{model_size}'
+
+
+registry.register('whisper_pool', load_transcription_pool, unloader=unload_transcription_pool)
+# The other model sizes of the transcription tiers
+for _tier in TIERS.values():
+    if _tier.model_size != WHISPER_MODEL_SIZE:
+        registry.register(
+            pool_name(_tier.model_size), partial(load_transcription_pool, _tier.model_size),
+            unloader=unload_transcription_pool
+        )
+
+
+class Window:
+    """A stretch of audio transcribed by one worker, and the part of it that is kept."""
+
+    def __init__(self, clips):
+        self.clips = clips  # Voiced (start, end) spans inside the window
+        self.start = clips[0][0]
+        self.end = clips[-1][1]
+        self.keep_from = self.start
+        self.keep_until = self.end
+
+
+def plan_windows(spans, window_seconds, overlap_seconds):
+    """
+    Group voiced spans into windows of at most `window_seconds`.
+
+    Windows are cut between spans, in silence. A span longer than a window
+    is split into windows overlapping by `overlap_seconds`; the words of the
+    overlap are split at its middle (see Window.keep_from/keep_until).
+    """
+    step = max(window_seconds - overlap_seconds, 1.0)
+    pieces = []
+    for start, end in spans:
+        while end - start > window_seconds:
+            pieces.append((start, start + window_seconds))
+            start += step
+        pieces.append((start, end))
+
+    groups = []
+    for piece in pieces:
+        if groups and piece[0] >= groups[-1][-1][1] and piece[1] - groups[-1][0][0] <= window_seconds:
+            groups[-1].append(piece)
+        else:
+            groups.append([piece])
+
+    windows = [Window(group) for group in groups]
+    for previous, following in zip(windows, windows[1:]):
+        if following.start < previous.end:
+            cut = (following.start + previous.end) / 2
+        else:
+            cut = following.start
+        previous.keep_until = cut
+        following.keep_from = cut
+    return windows
+
+
+def _normalize(word):
+    return word.strip().strip('.,!?;:"\'').lower()
+
+
+def stitch_window(window, segments, previous_word=None):
+    """
+    Keep the words of a window's segments that fall inside its kept range.
+
+    Args:
+        window: The Window the segments were decoded from
+        segments: Result of _transcribe_window
+        previous_word: Last (start, end, word) kept from the previous window,
+            used to drop a word decoded on both sides of the cut
+
+    Returns:
+        (segments, last_word) where segments are (start, end, text) tuples
+    """
+    stitched = []
+    for seg_start, seg_end, seg_text, words in segments:
+        if not words:
+            # No word timestamps: keep or drop the segment as a whole
+            if window.keep_from <= seg_start < window.keep_until:
+                stitched.append((seg_start, seg_end, seg_text.strip()))
+            continue
+
+        kept = [word for word in words if window.keep_from <= word[0] < window.keep_until]
+        if kept and previous_word is not None and _normalize(kept[0][2]) == _normalize(previous_word[2]) \
+                and kept[0][0] - previous_word[1] < BOUNDARY_TOLERANCE:
+            kept = kept[1:]
+        if not kept:
+            continue
+        previous_word = kept[-1]
+        text = "".join(word[2] for word in kept).strip()
+        if text:
+            stitched.append((kept[0][0], kept[-1][1], text))
+    return stitched, previous_word
+
+
+def should_use_chunked(speech, resume_from=0.0):
+    """True if the voiced audio left to decode is long enough to split across processes."""
+    min_seconds = _setting('AUDIO_CHUNKED_MIN_SECONDS', DEFAULT_MIN_SECONDS)
+    if speech is None or not min_seconds:
+        return False
+    return speech.speech_seconds_after(resume_from) >= min_seconds
+
+
+def transcribe_chunked(speech, on_segment=None, resume_from=0.0, start_index=0, tier=None):
+    """
+    Transcribe the voiced spans of a recording across the worker processes.
+
+    Takes the same callback, resume offset, start index and tier as
+    audio_processing.transcribe_audio; segments are handed to `on_segment`
+    in recording order as soon as their window and every earlier one is done.
+
+    Returns:
+        Text of the segments decoded by this call
+    """
+    windows = plan_windows(
+        speech.after(resume_from),
+        _setting('AUDIO_CHUNK_SECONDS', DEFAULT_CHUNK_SECONDS),
+        _setting('AUDIO_CHUNK_OVERLAP', DEFAULT_OVERLAP)
+    )
+    tier = tier or get_tier(TIER_STANDARD)
+    decode_options = tier.decode_options()
+    pool = registry.get(pool_name(tier.model_size))
+    log.info('chunked_transcription_started', windows=len(windows), processes=_pool_size(), model=tier.model_size)
+
+    futures = []
+    for window in windows:
+        samples = speech.audio[int(window.start * SAMPLING_RATE):int(window.end * SAMPLING_RATE)]
+        futures.append(pool.submit(_transcribe_window, samples, window.start, window.clips, decode_options))
+    pool = None  # Don't keep the pool alive past the registry's eviction
+
+    text_segments = []
+    previous_word = None
+    index = start_index
+    try:
+        for i, (window, future) in enumerate(zip(windows, futures)):
+            segments, previous_word = stitch_window(window, future.result(), previous_word)
+            for seg_start, seg_end, seg_text in segments:
+                text_segments.append(seg_text)
+                if on_segment is not None:
+                    on_segment(index, seg_start, seg_end, seg_text)
+                index += 1
+            log.debug('window_transcribed', window=i + 1, windows=len(windows),
+                      start=round(window.start, 1), end=round(window.end, 1))
+    except Exception:
+        # Windows after the failure would not be saved in order; don't decode them
+        for future in futures:
+            future.cancel()
+        raise
+
+    return " ".join(text_segments).strip()
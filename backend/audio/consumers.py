@@ -0,0 +1,235 @@
+import json
+import asyncio
+from urllib.parse import parse_qs
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from django.apps import apps
+from .audio_processing import transcribe_samples
+from .streaming import (
+    StreamingTranscriber, RecordingWriter, make_decoder, decode_executor, save_stream_recording,
+    DEFAULT_DECODE_INTERVAL
+)
+from .events import user_group, current_stage, STAGE_PROGRESS
+from django.conf import settings
+from backend.structured_log import get_logger
+
+log = get_logger('audio.consumers')
+
+
+@database_sync_to_async
+def get_user(firebase_uid):
+    try:
+        UserProfile = apps.get_model('users', 'UserProfile')
+        return UserProfile.objects.filter(firebase_uid=firebase_uid).first()
+    except Exception as e:
+        log.exception('stream_user_lookup_failed', error=str(e))
+        return None
+
+
+async def authenticate(consumer, params):
+    """Resolve the ?token= query parameter to a user, closing the socket if it can't."""
+    firebase_uid = params.get('token', [None])[0]
+    if not firebase_uid:
+        log.warning('stream_rejected', reason='no token')
+        await consumer.close(code=4001)
+        return None
+
+    user = await get_user(firebase_uid)
+    if not user:
+        log.warning('stream_rejected', reason='unknown user')
+        await consumer.close(code=4002)
+    return user
+
+
+class AudioStatusConsumer(AsyncWebsocketConsumer):
+    """
+    Processing status of the user's audio memories.
+
+    Connect to ws/audio-status/?token=<firebase uid>. The server first sends
+    a {"type": "status_snapshot"} with every memory still being processed,
+    then one {"type": "audio_status"} message per stage change (queued,
+    transcribing, analyzing, done, error) with the overall percent progress.
+    """
+
+    async def connect(self):
+        self.group = None
+        self.user = await authenticate(self, parse_qs(self.scope['query_string'].decode()))
+        if not self.user:
+            return
+
+        self.group = user_group(self.user.id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+        await self.send(text_data=json.dumps({
+            'type': 'status_snapshot',
+            'memories': await self.get_unfinished(self.user)
+        }))
+
+    async def disconnect(self, close_code):
+        if self.group is not None:
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    @database_sync_to_async
+    def get_unfinished(self, user):
+        AudioMemory = apps.get_model('audio', 'AudioMemory')
+        unfinished = AudioMemory.objects.filter(user=user, processing_complete=False).only(
+            'id', 'transcription', 'transcription_complete', 'processing_complete'
+        )
+        memories = []
+        for audio_memory in unfinished:
+            stage = current_stage(audio_memory)
+            memories.append({'id': audio_memory.id, 'stage': stage, 'progress': STAGE_PROGRESS.get(stage)})
+        return memories
+
+    async def audio_status(self, event):
+        """Forward a status event published by audio.events."""
+        await self.send(text_data=json.dumps({
+            **{key: value for key, value in event.items() if key != 'type'},
+            'type': 'audio_status'
+        }))
+
+
+class AudioStreamConsumer(AsyncWebsocketConsumer):
+    """
+    Live transcription of audio streamed from the app.
+
+    Connect to ws/audio-stream/?token=<firebase uid>&format=pcm16|opus&sample_rate=<hz>
+    and send audio frames as binary messages. The server sends
+    {"type": "partial"} messages with the text still being decoded and
+    {"type": "final"} messages for committed segments. Send {"type": "stop"}
+    to end the recording; the server then sends {"type": "saved"} with the
+    id of the AudioMemory holding the recording and its transcription.
+    """
+
+    async def connect(self):
+        self.recording = None
+        self.finished = False
+        self.connected = False
+        self.decode_task = None
+
+        params = parse_qs(self.scope['query_string'].decode())
+        self.user = await authenticate(self, params)
+        if not self.user:
+            return
+
+        audio_format = params.get('format', ['pcm16'])[0]
+        try:
+            sample_rate = int(params['sample_rate'][0]) if 'sample_rate' in params else None
+            self.decoder = make_decoder(audio_format, sample_rate)
+        except ValueError as e:
+            log.warning('stream_rejected', reason='bad format', error=str(e))
+            await self.close(code=4003)
+            return
+
+        self.transcriber = StreamingTranscriber()
+        self.recording = RecordingWriter()
+        self.decode_interval = getattr(settings, 'AUDIO_STREAM_DECODE_INTERVAL', DEFAULT_DECODE_INTERVAL)
+
+        await self.accept()
+        self.connected = True
+        log.info('stream_connected', user_id=self.user.id, format=audio_format)
+        await self.send(text_data=json.dumps({
+            'type': 'connection_established',
+            'message': f'Connected as {self.user.name}'
+        }))
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if self.finished:
+            return
+
+        if bytes_data:
+            try:
+                samples = self.decoder.decode(bytes_data)
+            except Exception as e:
+                await self.send_json({'type': 'error', 'message': f'Could not decode audio frame: {str(e)}'})
+                return
+            self.recording.write(samples)
+            self.transcriber.add(samples)
+
+            # One decode at a time per stream; audio arriving meanwhile waits for the next one
+            if self.transcriber.undecoded_seconds >= self.decode_interval and self.decode_task is None:
+                self.decode_task = asyncio.ensure_future(self.decode())
+            return
+
+        try:
+            message = json.loads(text_data or '{}')
+        except json.JSONDecodeError:
+            await self.send_json({'type': 'error', 'message': 'Invalid JSON'})
+            return
+        if message.get('type') == 'stop':
+            await self.finish()
+
+    async def disconnect(self, close_code):
+        self.connected = False
+        # Keep what was recorded when the connection drops before "stop"
+        if self.recording is not None and not self.finished:
+            await self.finish(notify=False)
+
+    async def send_json(self, content):
+        if self.connected:
+            await self.send(text_data=json.dumps(content))
+
+    async def decode(self, final=False, notify=True):
+        try:
+            samples, prompt = self.transcriber.snapshot()
+            if len(samples):
+                loop = asyncio.get_running_loop()
+                segments = await loop.run_in_executor(decode_executor(), transcribe_samples, samples, prompt)
+            else:
+                segments = []
+            committed, partial = self.transcriber.commit(segments, len(samples), final=final)
+
+            if notify:
+                first_index = len(self.transcriber.segments) - len(committed)
+                for offset, (start, end, text) in enumerate(committed):
+                    await self.send_json({
+                        'type': 'final',
+                        'index': first_index + offset,
+                        'start': round(start, 2),
+                        'end': round(end, 2),
+                        'text': text
+                    })
+                if partial and not final:
+                    await self.send_json({'type': 'partial', 'text': partial})
+        except Exception as e:
+            log.exception('live_decode_failed', user_id=self.user.id, error=str(e))
+            if notify:
+                await self.send_json({'type': 'error', 'message': f'Transcription failed: {str(e)}'})
+        finally:
+            if not final:
+                self.decode_task = None
+
+    async def finish(self, notify=True):
+        self.finished = True
+        if self.decode_task is not None:
+            await self.decode_task
+        # Decode what is left in the buffer; after a dropped connection there is no one to tell
+        await self.decode(final=True, notify=notify)
+
+        if self.recording.samples == 0:
+            self.recording.discard()
+            if notify:
+                await self.send_json({'type': 'error', 'message': 'No audio received'})
+                await self.close()
+            return
+
+        try:
+            audio_memory = await database_sync_to_async(save_stream_recording)(
+                self.user, self.recording, self.transcriber
+            )
+        except Exception as e:
+            log.exception('stream_recording_not_saved', user_id=self.user.id, error=str(e))
+            self.recording.discard()
+            if notify:
+                await self.send_json({'type': 'error', 'message': f'Could not save recording: {str(e)}'})
+                await self.close()
+            return
+
+        log.info('stream_recording_saved', audio_id=audio_memory.id, seconds=round(self.recording.duration, 1))
+        if notify:
+            await self.send_json({
+                'type': 'saved',
+                'id': audio_memory.id,
+                'transcription': audio_memory.transcription
+            })
+            await self.close()
@@ -0,0 +1,79 @@
+"""
+Processing status events pushed to clients over Channels.
+
+The job queue and the processing pipeline publish one event per stage change
+(and progress updates while transcribing) to the `audio_status_<user id>`
+group; AudioStatusConsumer (ws/audio-status/) forwards them to the user's
+sockets, so the app no longer has to poll the detail endpoint.
+
+Publishing never raises: a missing or unreachable channel layer only costs
+the notification, not the processing.
+"""
+import time
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+STAGE_QUEUED = 'queued'
+STAGE_TRANSCRIBING = 'transcribing'
+STAGE_ANALYZING = 'analyzing'
+STAGE_DONE = 'done'
+STAGE_ERROR = 'error'
+
+# Overall progress reported when a stage starts; transcription fills the
+# range up to the analysis stage as segments are decoded
+STAGE_PROGRESS = {
+    STAGE_QUEUED: 0,
+    STAGE_TRANSCRIBING: 5,
+    STAGE_ANALYZING: 90,
+    STAGE_DONE: 100,
+}
+
+
+def user_group(user_id):
+    return f"audio_status_{user_id}"
+
+
+def publish_status(user_id, audio_memory_id, stage, progress=None, **details):
+    """
+    Send a status event for an AudioMemory to its owner's sockets.
+
+    Args:
+        user_id: Owner of the AudioMemory
+        audio_memory_id: The AudioMemory the event is about
+        stage: One of the STAGE_* constants
+        progress: Overall percent done; defaults to the start of the stage
+        details: Extra JSON-serializable fields for the client
+    """
+    if progress is None:
+        progress = STAGE_PROGRESS.get(stage)
+    try:
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(user_group(user_id), {
+            'type': 'audio.status',
+            'id': audio_memory_id,
+            'stage': stage,
+            'progress': progress,
+            'timestamp': time.time(),
+            **details
+        })
+    except Exception as e:
+        print(f"⚠️ Could not publish status '{stage}' for audio #{audio_memory_id}: {str(e)}")
+
+
+def transcription_progress(end, duration):
+    """Overall percent done once the audio up to `end` seconds is transcribed."""
+    start, stop = STAGE_PROGRESS[STAGE_TRANSCRIBING], STAGE_PROGRESS[STAGE_ANALYZING]
+    return min(stop, int(start + (stop - start) * end / duration))
+
+
+def current_stage(audio_memory):
+    """Stage of an AudioMemory from its stored fields, for clients that just connected."""
+    if audio_memory.processing_complete:
+        return STAGE_DONE
+    if audio_memory.transcription_complete:
+        return STAGE_ANALYZING
+    if audio_memory.transcription:
+        return STAGE_TRANSCRIBING
+    return STAGE_QUEUED
@@ -0,0 +1,179 @@
+"""
+Streaming export of audio memories.
+
+Rows are read with `.values_list(...).iterator()` in chunks of
+AUDIO_EXPORT_CHUNK_SIZE and encoded as they are sent, so memory use does not
+grow with the number of rows. Supported formats:
+
+    csv      same columns as the original export, plus the row id
+    jsonl    one JSON object per line
+    parquet  one row group per chunk (needs pyarrow)
+    arrow    Arrow IPC stream, one record batch per chunk (needs pyarrow)
+
+Exports are ordered by id. The id of the last row included is sent in the
+X-Export-Cursor header; passing it back as `since` exports only newer rows.
+Memories still processing are not exported, and neither is anything after
+the first of them, so the cursor never skips a memory before it is finished.
+"""
+import csv
+import json
+from django.conf import settings
+
+DEFAULT_CHUNK_SIZE = 500
+
+# (output column, model field)
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('timestamp', 'timestamp'),
+    ('input_text', 'transcription'),
+    ('sentiment_score', 'score'),
+    ('sentiment_label', 'sentiment_label'),
+    ('memory_references', 'memory_references'),
+    ('routine_references', 'routine_references'),
+    ('time_indicators', 'time_indicators'),
+    ('location_indicators', 'location_indicators'),
+    ('severity_indicators', 'severity_indicators'),
+    ('potential_concerns', 'potential_concerns'),
+]
+COLUMN_NAMES = [column for column, _ in EXPORT_COLUMNS]
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+}
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+
+def chunk_size():
+    return getattr(settings, 'AUDIO_EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def export_rows(queryset):
+    """Tuples in EXPORT_COLUMNS order, fetched chunk by chunk."""
+    return queryset.order_by('id').values_list(
+        *[field for _, field in EXPORT_COLUMNS]
+    ).iterator(chunk_size=chunk_size())
+
+
+def _format_timestamp(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else ''
+
+
+class _Echo:
+    """File-like object whose write() returns the data, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, stats):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMN_NAMES)
+    for row in rows:
+        stats['rows'] += 1
+        yield writer.writerow([
+            row[0],
+            _format_timestamp(row[1]),
+            *['' if value is None else value for value in row[2:]]
+        ])
+
+
+def stream_jsonl(rows, stats):
+    for row in rows:
+        stats['rows'] += 1
+        record = dict(zip(COLUMN_NAMES, row))
+        record['timestamp'] = row[1].isoformat() if row[1] else None
+        yield json.dumps(record) + "\n"
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _DrainableSink:
+    """Write-only file object whose buffered bytes are handed out after each batch."""
+
+    def __init__(self):
+        self._parts = []
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.int64()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+        ('input_text', pa.string()),
+        ('sentiment_score', pa.float64()),
+        *[(column, pa.string()) for column in COLUMN_NAMES[4:]],
+    ])
+
+
+def stream_columnar(rows, stats, export_format):
+    """Encode each chunk of rows as one Parquet row group or Arrow record batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    sink = _DrainableSink()
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+        write = writer.write_table
+        to_batch = pa.Table.from_pydict
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+        to_batch = pa.RecordBatch.from_pydict
+
+    for chunk in _chunks(rows, chunk_size()):
+        stats['rows'] += len(chunk)
+        columns = {name: list(values) for name, values in zip(COLUMN_NAMES, zip(*chunk))}
+        write(to_batch(columns, schema=schema))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+def columnar_available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_export(queryset, export_format, stats):
+    """Generator of encoded chunks for a StreamingHttpResponse; counts rows in stats['rows']."""
+    rows = export_rows(queryset)
+    if export_format == 'csv':
+        return stream_csv(rows, stats)
+    if export_format == 'jsonl':
+        return stream_jsonl(rows, stats)
+    return stream_columnar(rows, stats, export_format)
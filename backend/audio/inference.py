@@ -0,0 +1,175 @@
+"""
+Micro-batching broker for DistilBERT sentiment inference.
+
+Worker threads call `predict()` with a single text. A dispatcher thread
+collects requests for up to DISTILBERT_BATCH_WINDOW_MS milliseconds (or until
+DISTILBERT_MAX_BATCH requests are waiting), runs them through the pipeline as
+one padded batch and hands each caller its own result.
+"""
+import queue
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from backend.structured_log import get_logger
+
+log = get_logger('audio.inference')
+
+DEFAULT_BATCH_WINDOW_MS = 10
+DEFAULT_MAX_BATCH = 16
+
+
+class _Request:
+    __slots__ = ('text', 'enqueued_at', 'done', 'result', 'error')
+
+    def __init__(self, text):
+        self.text = text
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceBroker:
+    """
+    Collects concurrent single-text requests into batched pipeline calls.
+
+    Args:
+        load_pipeline: Callable returning the HF pipeline, called for every
+            batch so a model evicted by the registry is not kept alive here
+        window_ms: How long to wait for more requests after the first one
+        max_batch: Largest batch sent to the model
+    """
+
+    def __init__(self, load_pipeline, window_ms=DEFAULT_BATCH_WINDOW_MS, max_batch=DEFAULT_MAX_BATCH):
+        self._load_pipeline = load_pipeline
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._requests = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._dispatcher = None
+        self._reset_stats()
+
+    def predict(self, text):
+        """Classify one text, blocking until its batch has run."""
+        return self.predict_many([text])[0]
+
+    def predict_many(self, texts):
+        """Classify several texts; they may share batches with other callers."""
+        self._ensure_dispatcher()
+        pending = [_Request(text) for text in texts]
+        for request in pending:
+            self._requests.put(request)
+
+        results = []
+        for request in pending:
+            request.done.wait()
+            if request.error is not None:
+                raise request.error
+            results.append(request.result)
+        return results
+
+    def stats(self):
+        """Batch-size and queue-wait metrics, for tuning the batching window."""
+        with self._stats_lock:
+            batches = self._batches or 1
+            requests = self._requests_served or 1
+            return {
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'batches': self._batches,
+                'requests': self._requests_served,
+                'queue_depth': self._requests.qsize(),
+                'mean_batch_size': round(self._requests_served / batches, 2),
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'mean_queue_wait_ms': round(self._queue_wait_total / requests * 1000, 2),
+                'max_queue_wait_ms': round(self._queue_wait_max * 1000, 2),
+                'mean_batch_latency_ms': round(self._batch_time_total / batches * 1000, 2),
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._reset_stats()
+
+    def _reset_stats(self):
+        self._batches = 0
+        self._requests_served = 0
+        self._batch_sizes = Counter()
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._batch_time_total = 0.0
+
+    def _ensure_dispatcher(self):
+        with self._start_lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch_loop,
+                    name="distilbert-broker",
+                    daemon=True
+                )
+                self._dispatcher.start()
+
+    def _collect_batch(self):
+        batch = [self._requests.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._collect_batch()
+            batch_start = time.perf_counter()
+            try:
+                analyzer = self._load_pipeline()
+                outputs = analyzer(
+                    [request.text for request in batch],
+                    batch_size=len(batch),
+                    truncation=True
+                )
+                for request, output in zip(batch, outputs):
+                    request.result = output
+            except Exception as e:
+                log.error('distilbert_batch_failed', batch_size=len(batch), error=str(e))
+                for request in batch:
+                    request.error = e
+            analyzer = None  # Don't hold the model between batches
+            batch_end = time.perf_counter()
+
+            with self._stats_lock:
+                self._batches += 1
+                self._requests_served += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._batch_time_total += batch_end - batch_start
+                for request in batch:
+                    wait = batch_start - request.enqueued_at
+                    self._queue_wait_total += wait
+                    self._queue_wait_max = max(self._queue_wait_max, wait)
+
+            for request in batch:
+                request.done.set()
+
+
+_distilbert_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_distilbert_broker():
+    """Return the process-wide DistilBERT broker, creating it on first use."""
+    global _distilbert_broker
+    with _broker_lock:
+        if _distilbert_broker is None:
+            from .audio_processing import get_distilbert
+            _distilbert_broker = InferenceBroker(
+                lambda: get_distilbert()[0],
+                window_ms=getattr(settings, 'DISTILBERT_BATCH_WINDOW_MS', DEFAULT_BATCH_WINDOW_MS),
+                max_batch=getattr(settings, 'DISTILBERT_MAX_BATCH', DEFAULT_MAX_BATCH)
+            )
+    return _distilbert_broker
@@ -0,0 +1,424 @@
+"""
+Durable job queue for audio processing.
+
+Every upload is persisted as a ProcessingJob row and picked up by a fixed-size
+pool of worker threads, instead of starting one thread per upload. Claiming a
+job is a conditional UPDATE, so workers never run the same job twice, and jobs
+left behind by a restart are requeued when the pool starts.
+
+Settings (all optional):
+    AUDIO_JOB_WORKERS        number of concurrent worker threads
+    AUDIO_JOB_MAX_ATTEMPTS   attempts before a job is marked failed
+    AUDIO_JOB_RETRY_BACKOFF  base retry delay in seconds, doubled per attempt
+    AUDIO_JOB_MAX_BACKLOG    queued + running jobs before uploads get HTTP 429
+    AUDIO_JOB_POLL_INTERVAL  seconds an idle worker waits before polling again
+    AUDIO_WHISPER_UPGRADE    re-transcribe cheap-tier transcripts while the queue is idle
+    AUDIO_WHISPER_UPGRADE_INTERVAL  seconds between two checks for a transcript to upgrade
+    AUDIO_WHISPER_BATCH_SIZE jobs claimed together so their short clips share a Whisper call
+"""
+import math
+import threading
+import time
+import traceback
+import datetime
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from backend.structured_log import get_logger
+from .events import publish_status, STAGE_QUEUED, STAGE_ERROR
+from .metrics import JOBS, JOB_SECONDS
+
+log = get_logger('audio.jobs')
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_BACKOFF = 30
+DEFAULT_MAX_BACKLOG = 50
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_UPGRADE_INTERVAL = 60
+BATCH_SCAN_LIMIT = 64  # Queued jobs looked at for a batch; long recordings are skipped over
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class QueueFull(Exception):
+    """Raised when the backlog is over AUDIO_JOB_MAX_BACKLOG."""
+
+    def __init__(self, backlog, retry_after):
+        super().__init__(f"Audio processing backlog is full ({backlog} jobs)")
+        self.backlog = backlog
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """
+    Fixed-size worker pool backed by the ProcessingJob table.
+
+    The pool assumes a single server process owns the queue (the SQLite
+    development setup); on start it treats every job still marked running as
+    interrupted and puts it back in the queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._workers = []
+        self._started = False
+        self._next_upgrade_check = 0.0
+
+    @property
+    def concurrency(self):
+        return max(1, int(_setting('AUDIO_JOB_WORKERS', DEFAULT_WORKERS)))
+
+    def start(self):
+        """Recover unfinished work and start the worker threads (idempotent)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        try:
+            self.recover()
+        except Exception as e:
+            log.exception('jobs_not_recovered', error=str(e))
+
+        for i in range(self.concurrency):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"audio-job-worker-{i + 1}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        log.info('job_queue_started', workers=self.concurrency)
+
+    def recover(self):
+        """Requeue interrupted jobs and create jobs for orphaned unfinished rows."""
+        from .models import AudioMemory, ProcessingJob
+
+        now = timezone.now()
+        requeued = ProcessingJob.objects.filter(
+            status=ProcessingJob.STATUS_RUNNING
+        ).update(status=ProcessingJob.STATUS_QUEUED, available_at=now)
+
+        orphans = AudioMemory.objects.filter(processing_complete=False).exclude(
+            jobs__status__in=[ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING]
+        ).values_list('id', flat=True)
+        created = ProcessingJob.objects.bulk_create([
+            ProcessingJob(audio_memory_id=audio_memory_id, available_at=now)
+            for audio_memory_id in orphans
+        ])
+
+        if requeued or created:
+            log.info('jobs_recovered', requeued=requeued, created=len(created))
+
+    def backlog(self):
+        """Queued and running processing jobs; idle-time upgrade jobs don't count."""
+        from .models import ProcessingJob
+        return ProcessingJob.objects.filter(
+            kind=ProcessingJob.KIND_PROCESS,
+            status__in=[ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING]
+        ).count()
+
+    def check_admission(self):
+        """Raise QueueFull if a new upload should be rejected."""
+        max_backlog = _setting('AUDIO_JOB_MAX_BACKLOG', DEFAULT_MAX_BACKLOG)
+        backlog = self.backlog()
+        if backlog >= max_backlog:
+            raise QueueFull(backlog, self._estimate_retry_after(backlog - max_backlog + 1))
+
+    def enqueue(self, audio_memory):
+        """Persist a job for the AudioMemory and wake an idle worker."""
+        from .models import ProcessingJob
+
+        job = ProcessingJob.objects.create(audio_memory=audio_memory, available_at=timezone.now())
+        publish_status(audio_memory.user_id, audio_memory.id, STAGE_QUEUED, job=job.id)
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job
+
+    def _estimate_retry_after(self, excess_jobs):
+        """Seconds until `excess_jobs` jobs have drained, from recent job durations."""
+        from .models import ProcessingJob
+
+        recent = ProcessingJob.objects.filter(
+            status=ProcessingJob.STATUS_DONE,
+            started_at__isnull=False,
+            finished_at__isnull=False
+        ).order_by('-finished_at').values_list('started_at', 'finished_at')[:20]
+        durations = [(finished - started).total_seconds() for started, finished in recent]
+        average = sum(durations) / len(durations) if durations else _setting(
+            'AUDIO_JOB_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF
+        )
+        return max(1, math.ceil(average * excess_jobs / self.concurrency))
+
+    def _worker_loop(self):
+        poll_interval = _setting('AUDIO_JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        while True:
+            try:
+                job = self._claim_next()
+            except Exception as e:
+                log.exception('job_claim_failed', error=str(e))
+                job = None
+            finally:
+                close_old_connections()
+
+            if job is None:
+                try:
+                    self._schedule_upgrade()
+                except Exception as e:
+                    log.warning('upgrade_not_scheduled', error=str(e))
+                finally:
+                    close_old_connections()
+                with self._wakeup:
+                    self._wakeup.wait(timeout=poll_interval)
+                continue
+
+            batch = self._claim_batch(job)
+            if len(batch) > 1:
+                self._run_batch(batch)
+            else:
+                self._run(job)
+
+    def _claim_next(self):
+        claimed = self._claim(1)
+        return claimed[0] if claimed else None
+
+    def _claim_batch(self, job):
+        """
+        The claimed job and up to AUDIO_WHISPER_BATCH_SIZE - 1 more queued
+        processing jobs, when its recording and theirs may be short enough to
+        batch (see batched.may_batch); long recordings are left to other workers.
+        """
+        from .models import AudioMemory, ProcessingJob
+        from .batched import batch_size, may_batch
+
+        if job.kind != ProcessingJob.KIND_PROCESS or batch_size() <= 1:
+            return [job]
+        storage = AudioMemory._meta.get_field('audio_file').storage
+
+        def batchable(audio_file):
+            return bool(audio_file) and may_batch(storage.path(audio_file))
+
+        try:
+            if not batchable(AudioMemory.objects.filter(id=job.audio_memory_id).values_list('audio_file', flat=True).first()):
+                return [job]
+            return [job] + self._claim(batch_size() - 1, kind=ProcessingJob.KIND_PROCESS, accept=batchable)
+        except Exception as e:
+            log.warning('batch_claim_failed', error=str(e))
+            return [job]
+        finally:
+            close_old_connections()
+
+    def _claim(self, limit, kind=None, accept=None):
+        """
+        Claim up to `limit` queued jobs that are due, oldest first; with
+        `accept`, only jobs for whose stored audio file name it returns True.
+        """
+        from .models import ProcessingJob
+
+        now = timezone.now()
+        due = ProcessingJob.objects.filter(
+            status=ProcessingJob.STATUS_QUEUED,
+            available_at__lte=now
+        )
+        if kind is not None:
+            due = due.filter(kind=kind)
+        candidates = due.order_by('available_at', 'id').values_list(
+            'id', 'audio_memory__audio_file'
+        )[:limit + self.concurrency if accept is None else BATCH_SCAN_LIMIT]
+
+        claimed = []
+        for job_id, audio_file in candidates:
+            if accept is not None and not accept(audio_file):
+                continue
+            # Conditional update: only one worker can move a job out of "queued"
+            updated = ProcessingJob.objects.filter(
+                id=job_id,
+                status=ProcessingJob.STATUS_QUEUED
+            ).update(
+                status=ProcessingJob.STATUS_RUNNING,
+                attempts=F('attempts') + 1,
+                started_at=now
+            )
+            if updated:
+                claimed.append(ProcessingJob.objects.get(id=job_id))
+                if len(claimed) == limit:
+                    break
+        return claimed
+
+    def _schedule_upgrade(self):
+        """
+        Queue one upgrade job when nothing else is queued or running.
+
+        Picks the most recent finished AudioMemory transcribed below the
+        maximum Whisper tier (see audio.whisper_policy) whose upgrade has not
+        failed before. Checked at most every AUDIO_WHISPER_UPGRADE_INTERVAL.
+        """
+        from .models import AudioMemory, ProcessingJob
+        from .whisper_policy import upgradable_tiers
+
+        if not _setting('AUDIO_WHISPER_UPGRADE', True):
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_upgrade_check:
+                return
+            self._next_upgrade_check = now + _setting('AUDIO_WHISPER_UPGRADE_INTERVAL', DEFAULT_UPGRADE_INTERVAL)
+
+            if ProcessingJob.objects.filter(
+                status__in=[ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING]
+            ).exists():
+                return
+
+            failed_upgrades = ProcessingJob.objects.filter(
+                kind=ProcessingJob.KIND_UPGRADE,
+                status=ProcessingJob.STATUS_FAILED
+            ).values('audio_memory_id')
+            audio_memory_id = AudioMemory.objects.filter(
+                processing_complete=True,
+                transcription_complete=True,
+                transcription_tier__in=upgradable_tiers()
+            ).exclude(id__in=failed_upgrades).order_by('-id').values_list('id', flat=True).first()
+            if audio_memory_id is None:
+                return
+
+            job = ProcessingJob.objects.create(
+                audio_memory_id=audio_memory_id,
+                kind=ProcessingJob.KIND_UPGRADE,
+                available_at=timezone.now()
+            )
+        log.info('upgrade_scheduled', job_id=job.id, audio_id=audio_memory_id)
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _run_batch(self, jobs):
+        """
+        Transcribe the short clips of several jobs together, then finish each
+        batched job on its own. Extra jobs whose recording did not fit the
+        batch go back to the queue for the other workers.
+        """
+        from .models import ProcessingJob
+        from .tasks import transcribe_batch
+
+        try:
+            batched = set(transcribe_batch(jobs))
+        except Exception as e:
+            # Each job transcribes its own recording instead
+            log.warning('batch_transcription_failed', jobs=[job.id for job in jobs], error=str(e))
+            batched = set()
+        finally:
+            close_old_connections()
+
+        released = [job.id for job in jobs[1:] if job.audio_memory_id not in batched]
+        if released:
+            ProcessingJob.objects.filter(id__in=released).update(
+                status=ProcessingJob.STATUS_QUEUED,
+                attempts=F('attempts') - 1
+            )
+            with self._wakeup:
+                self._wakeup.notify_all()
+        for job in jobs:
+            if job.id not in released:
+                self._run(job)
+
+    def _run(self, job):
+        from .models import ProcessingJob
+        from .tasks import process_audio_in_background, upgrade_transcription
+
+        log.info(
+            'job_started',
+            job_id=job.id,
+            kind=job.kind,
+            audio_id=job.audio_memory_id,
+            attempt=job.attempts,
+            worker=threading.current_thread().name
+        )
+        start_time = time.perf_counter()
+        try:
+            if job.kind == ProcessingJob.KIND_UPGRADE:
+                upgrade_transcription(job.audio_memory_id, job_id=job.id)
+            else:
+                process_audio_in_background(job.audio_memory_id, job_id=job.id)
+        except Exception as e:
+            try:
+                self._handle_failure(job, e)
+            except Exception as db_error:
+                log.error('job_failure_not_recorded', job_id=job.id, error=str(db_error))
+        else:
+            ProcessingJob.objects.filter(id=job.id).update(
+                status=ProcessingJob.STATUS_DONE,
+                finished_at=timezone.now(),
+                last_error=None
+            )
+            JOBS.inc(result='done')
+        finally:
+            JOB_SECONDS.observe(time.perf_counter() - start_time)
+            close_old_connections()
+
+    def _handle_failure(self, job, error):
+        from .models import AudioMemory, ProcessingJob
+
+        error_msg = f"{type(error).__name__}: {str(error)}"
+        user_id = AudioMemory.objects.filter(id=job.audio_memory_id).values_list('user_id', flat=True).first()
+        max_attempts = _setting('AUDIO_JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+        now = timezone.now()
+
+        if job.kind == ProcessingJob.KIND_UPGRADE:
+            # The memory keeps its earlier transcript; the upgrade is not retried
+            ProcessingJob.objects.filter(id=job.id).update(
+                status=ProcessingJob.STATUS_FAILED,
+                finished_at=now,
+                last_error=error_msg
+            )
+            JOBS.inc(result='failed')
+            log.warning('upgrade_failed', job_id=job.id, audio_id=job.audio_memory_id, error=error_msg)
+            return
+
+        if job.attempts < max_attempts:
+            delay = _setting('AUDIO_JOB_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF) * 2 ** (job.attempts - 1)
+            ProcessingJob.objects.filter(id=job.id).update(
+                status=ProcessingJob.STATUS_QUEUED,
+                available_at=now + datetime.timedelta(seconds=delay),
+                last_error=error_msg
+            )
+            publish_status(user_id, job.audio_memory_id, STAGE_QUEUED, job=job.id, retry_in=delay, error=error_msg)
+            JOBS.inc(result='retried')
+            log.warning('job_retry_scheduled', job_id=job.id, error=error_msg, retry_in=delay)
+            return
+
+        ProcessingJob.objects.filter(id=job.id).update(
+            status=ProcessingJob.STATUS_FAILED,
+            finished_at=now,
+            last_error=error_msg
+        )
+        # Out of attempts: mark the upload complete so clients stop waiting
+        AudioMemory.objects.filter(id=job.audio_memory_id).update(
+            processing_complete=True,
+            processing_error=error_msg,
+            updated_at=now
+        )
+        publish_status(user_id, job.audio_memory_id, STAGE_ERROR, progress=100, job=job.id, error=error_msg)
+        JOBS.inc(result='failed')
+        log.error(
+            'job_failed',
+            job_id=job.id,
+            attempts=job.attempts,
+            error=error_msg,
+            traceback=''.join(traceback.format_exception(error))
+        )
+
+
+job_queue = JobQueue()
+
+
+def start_workers():
+    job_queue.start()
+
+
+def enqueue_audio_memory(audio_memory):
+    return job_queue.enqueue(audio_memory)
@@ -0,0 +1,119 @@
+"""
+Compiled keyword lexicon shared by all keyword detectors.
+
+The keyword detectors used to run one `re.search` (or substring test) per
+keyword over a freshly lowercased copy of the text. A Lexicon compiles every
+keyword of every category into one trie-shaped regular expression, so a
+single pass over the lowercased text reports all hits of all categories.
+
+Two matching modes are supported:
+    whole_words=True   same result as re.search(r'\\b' + re.escape(kw) + r'\\b', text)
+    whole_words=False  same result as `kw in text` (plain substring test)
+
+Overlapping keywords are all reported: a hit on "last night" also reports
+"night", and a hit on "kill myself" also reports "kill".
+
+This module has no Django dependency so the scripts in
+sentiment_analysis_project can import it as well.
+"""
+import re
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def _trie_pattern(keywords):
+    """Build a regex alternation shaped like a trie, so matching is linear in keyword length."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A keyword ends here: the rest is optional, greedy so the longest keyword wins
+        return '(?:' + body + ')?' if '' in node else body
+
+    return build(trie) if keywords else '(?!)'
+
+
+class LexiconHits:
+    """Keywords found in one text, queryable per category."""
+
+    def __init__(self, lexicon, keywords):
+        self._lexicon = lexicon
+        self.keywords = keywords
+
+    def __contains__(self, keyword):
+        return keyword in self.keywords
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def found(self, category):
+        """True if any keyword of the category occurs in the text."""
+        return any(keyword in self.keywords for keyword in self._lexicon.categories[category])
+
+    def ordered(self, category):
+        """Keywords of the category found in the text, in declaration order."""
+        return [keyword for keyword in self._lexicon.categories[category] if keyword in self.keywords]
+
+    def count(self, category):
+        """Number of category entries found, like sum(1 for kw in keywords if kw in text)."""
+        return len(self.ordered(category))
+
+
+class Lexicon:
+    """
+    Keyword categories compiled into a single matcher.
+
+    Args:
+        categories: Mapping of category name to a list of keywords. A keyword
+            may appear in several categories. Text is lowercased before
+            matching, keywords are used as given.
+        whole_words: Match keywords on word boundaries (regex `\\b`) instead of
+            as plain substrings
+    """
+
+    def __init__(self, categories, whole_words=True):
+        self.categories = {name: list(keywords) for name, keywords in categories.items()}
+        self.whole_words = whole_words
+
+        keywords = sorted({keyword for keywords in self.categories.values() for keyword in keywords})
+        body = _trie_pattern(keywords)
+        if whole_words:
+            self._pattern = re.compile(r'\b(?=(' + body + r')\b)')
+        else:
+            self._pattern = re.compile('(?=(' + body + '))')
+
+        # The regex reports the longest keyword starting at a position; these
+        # are the shorter keywords that also match at that position
+        keyword_set = set(keywords)
+        self._implied = {}
+        for keyword in keywords:
+            implied = []
+            for end in range(1, len(keyword)):
+                prefix = keyword[:end]
+                if prefix not in keyword_set:
+                    continue
+                if whole_words and _is_word_char(prefix[-1]) == _is_word_char(keyword[end]):
+                    continue  # No word boundary after the prefix
+                implied.append(prefix)
+            if implied:
+                self._implied[keyword] = implied
+
+    def scan(self, text):
+        """Find every keyword of every category in one pass over the text."""
+        found = set()
+        for match in self._pattern.finditer(text.lower()):
+            keyword = match.group(1)
+            if keyword not in found:
+                found.add(keyword)
+                found.update(self._implied.get(keyword, ()))
+        return LexiconHits(self, found)
@@ -0,0 +1,147 @@
+"""
+Lightweight listing of audio memories.
+
+The list endpoint reads rows with `.values()` restricted to the requested
+fields and formats them with the serializer's own field objects, so the
+output matches AudioMemorySerializer without building model instances or
+loading transcriptions the client did not ask for.
+
+The per-sentence sentiment series repeats the whole transcript, so it is left
+out of listings unless `fields` asks for it; the detail view always has it.
+
+Pages are ordered newest first on (timestamp, id) and continue from an
+opaque cursor (keyset pagination), which stays fast however deep the client
+scrolls, unlike OFFSET.
+
+The ETag comes from one aggregate query (row count, highest id, latest
+updated_at) and the request parameters, so a 304 is answered before any row
+is read or serialized.
+"""
+import base64
+import hashlib
+import json
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.relations import PKOnlyObject, RelatedField
+from .serializers import AudioMemorySerializer
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Returned only when requested with `fields`
+OPT_IN_FIELDS = ('sentiment_series', 'sentiment_summary')
+
+
+class InvalidListingParameter(Exception):
+    """Raised for unknown fields, bad cursors or bad page sizes."""
+
+
+def serializer_fields(context=None):
+    return AudioMemorySerializer(context=context or {}).fields
+
+
+def parse_fields(value):
+    """Requested field names from `fields=a,b,c`; the serializer fields except OPT_IN_FIELDS when empty."""
+    available = serializer_fields()
+    if not value:
+        return [name for name in available if name not in OPT_IN_FIELDS]
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise InvalidListingParameter(
+            f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}"
+        )
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def parse_limit(value):
+    if value is None:
+        return getattr(settings, 'AUDIO_LIST_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidListingParameter("limit must be a number")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidListingParameter(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        timestamp = parse_datetime(timestamp)
+        if timestamp is None:
+            raise ValueError(timestamp)
+        return timestamp, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidListingParameter("Invalid cursor")
+
+
+def ordered(queryset):
+    # Matches the (user, -timestamp, -id) index on AudioMemory
+    return queryset.order_by('-timestamp', '-id')
+
+
+def page(queryset, fields, limit, cursor=None):
+    """
+    One page of rows, newest first.
+
+    Returns:
+        (rows, next_cursor) where rows are dicts of the requested fields and
+        next_cursor is None on the last page
+    """
+    queryset = ordered(queryset)
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+
+    # The cursor needs the timestamp even when the client didn't ask for it
+    columns = list(dict.fromkeys(fields + ['timestamp']))
+    rows = list(queryset.values(*columns)[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def represent(rows, fields, context=None):
+    """Format rows from .values() exactly as AudioMemorySerializer would."""
+    available = serializer_fields(context)
+    file_field = AudioMemorySerializer.Meta.model._meta.get_field('audio_file')
+
+    results = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            value = row[name]
+            if name == 'audio_file' and value:
+                value = file_field.attr_class(None, file_field, value)
+            elif isinstance(available[name], RelatedField) and value is not None:
+                value = PKOnlyObject(pk=value)  # .values() gives the foreign key itself
+            item[name] = None if value is None else available[name].to_representation(value)
+        results.append(item)
+    return results
+
+
+def etag(queryset, fields, limit=None, cursor=None):
+    """
+    Strong ETag of a listing of `queryset`, without reading its rows.
+
+    An insert or delete changes the count or the highest id and any save
+    changes the latest updated_at, so the tag changes with the response.
+    """
+    state = queryset.aggregate(count=Count('id'), last_id=Max('id'), updated_at=Max('updated_at'))
+    key = [state['count'], state['last_id'], state['updated_at'], fields, limit, cursor]
+    body = json.dumps(key, separators=(',', ':'), default=str)
+    return '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
@@ -0,0 +1,74 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from audio.batched import SAMPLING_RATE, is_batchable, transcribe_clips
+from audio.vad import SpeechRegions, detect_speech
+from audio.whisper_policy import TIERS, TIER_ORDER
+
+
+def load_clip(path):
+    """SpeechRegions of a recording; the whole file counts as voiced when the VAD is off."""
+    speech = detect_speech(path)
+    if speech is None:
+        from faster_whisper import decode_audio
+        audio = decode_audio(path, sampling_rate=SAMPLING_RATE)
+        duration = len(audio) / SAMPLING_RATE
+        speech = SpeechRegions(audio, duration, [(0.0, duration)])
+    return speech
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure batched Whisper throughput (clips/s) on short recordings at several batch sizes; "
+        "batch size 1 is one Whisper call per clip"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='Audio files to transcribe')
+        parser.add_argument('--from-db', type=int, default=0, metavar='N',
+                            help='Also use the N most recent stored recordings')
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+        parser.add_argument('--tier', choices=TIER_ORDER, default='standard',
+                            help='Whisper model and decoding settings (see audio/whisper_policy.py)')
+
+    def handle(self, *args, **options):
+        paths = list(options['files']) + self._stored_paths(options['from_db'])
+        clips = []
+        for path in paths:
+            try:
+                speech = load_clip(path)
+            except Exception as e:
+                self.stderr.write(f"⚠️ Skipping {path}: {str(e)}")
+                continue
+            if not is_batchable(speech):
+                self.stderr.write(f"⚠️ Skipping {path}: no speech or longer than AUDIO_WHISPER_BATCH_MAX_SECONDS")
+                continue
+            clips.append(speech)
+        if not clips:
+            raise CommandError("No clips to transcribe, pass audio files or --from-db")
+
+        tier = TIERS[options['tier']]
+        audio_seconds = sum(speech.duration for speech in clips)
+        self.stdout.write(f"⚙️ {len(clips)} clips, {audio_seconds:.0f}s of audio, {tier.name} tier ({tier.model_size})")
+        transcribe_clips(clips[:1], tier, size=1)  # Warm-up: loads the model
+
+        self.stdout.write(f"{'batch':>6} {'seconds':>8} {'clips/s':>8} {'audio s/s':>10} {'speedup':>8}")
+        baseline = None
+        for size in options['batch_sizes']:
+            start = time.perf_counter()
+            for first in range(0, len(clips), size):
+                transcribe_clips(clips[first:first + size], tier, size=size)
+            elapsed = time.perf_counter() - start
+            clips_per_second = len(clips) / elapsed
+            baseline = baseline or clips_per_second
+            self.stdout.write(
+                f"{size:>6} {elapsed:>8.2f} {clips_per_second:>8.2f} {audio_seconds / elapsed:>10.1f} "
+                f"{clips_per_second / baseline:>7.2f}x"
+            )
+
+    def _stored_paths(self, limit):
+        if not limit:
+            return []
+        from audio.models import AudioMemory
+
+        memories = AudioMemory.objects.exclude(audio_file='').order_by('-id')[:limit]
+        return [audio_memory.audio_file.path for audio_memory in memories]
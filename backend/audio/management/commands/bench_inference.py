@@ -0,0 +1,164 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from audio.model_backends import BACKENDS, DISTILBERT_MODEL, NER_MODEL
+
+MODELS = {
+    'distilbert': ('sentiment-analysis', DISTILBERT_MODEL, {}),
+    'ner': ('ner', NER_MODEL, {'aggregation_strategy': 'simple'}),
+}
+
+SAMPLE_TEXTS = [
+    "I took my pills this morning after breakfast.",
+    "We went to the park in Boston with my daughter and it was lovely.",
+    "I can't remember where I put my keys again, it makes me so frustrated.",
+    "The doctor at Mercy Hospital said my blood pressure is fine.",
+    "I feel lonely since John moved to Chicago.",
+    "Yesterday I forgot my granddaughter's name and I was scared.",
+    "Lunch with Mary at the diner on Main Street was wonderful.",
+    "I didn't sleep well, I kept waking up at night.",
+    "My son called from London and we talked about the old house.",
+    "I don't want to eat anything today, nothing tastes right.",
+    "The nurse helped me with my walk around the garden.",
+    "I am happy that the whole family is coming for Christmas.",
+]
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_backend(model, backend, texts, repeat, batch_size):
+    """
+    Load one backend and time it, in a fresh process so its RSS is its own.
+
+    Returns:
+        Dict with load time, RSS cost, per-text latencies, batch throughput
+        and the outputs for the parity comparison
+    """
+    from backend.model_registry import current_rss
+    from audio.model_backends import load_pipeline
+
+    task, model_name, pipeline_kwargs = MODELS[model]
+    rss_before = current_rss()
+    start = time.perf_counter()
+    analyzer = load_pipeline(task, model_name, backend=backend, **pipeline_kwargs)
+    load_seconds = time.perf_counter() - start
+    rss_after = current_rss()
+
+    analyzer(texts[0])  # Warm-up
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            analyzer(text)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    outputs = analyzer(texts, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        'load_seconds': load_seconds,
+        'rss_mb': (rss_after - rss_before) / 1024 / 1024 if rss_before and rss_after else None,
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'texts_per_second': len(texts) / batch_seconds,
+        'outputs': [
+            [{key: (float(value) if key == 'score' else value) for key, value in item.items()} for item in output]
+            if isinstance(output, list) else [output]
+            for output in outputs
+        ],
+    }
+
+
+def parity(model, reference, candidate):
+    """(agreement, mean score delta, max score delta) of candidate outputs against the reference."""
+    agreements = 0
+    deltas = []
+    for expected, actual in zip(reference, candidate):
+        if model == 'ner':
+            expected = {(entity['entity_group'], entity['word']): entity['score'] for entity in expected}
+            actual = {(entity['entity_group'], entity['word']): entity['score'] for entity in actual}
+            agreements += expected.keys() == actual.keys()
+            deltas.extend(abs(expected[key] - actual[key]) for key in expected.keys() & actual.keys())
+        else:
+            agreements += expected[0]['label'] == actual[0]['label']
+            deltas.append(abs(expected[0]['score'] - actual[0]['score']))
+    return (
+        agreements / len(reference),
+        sum(deltas) / len(deltas) if deltas else 0.0,
+        max(deltas) if deltas else 0.0,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the torch, int8-quantized and ONNX Runtime inference backends of a model: "
+        "parity with the first backend (label agreement, score delta), load time, RSS and latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(MODELS), default='distilbert')
+        parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS),
+                            help='Backends to compare; parity is measured against the first one')
+        parser.add_argument('--from-db', type=int, default=0, metavar='N',
+                            help='Also use sentences of the N most recent stored transcripts')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed passes over the texts')
+        parser.add_argument('--batch-size', type=int, default=16)
+        parser.add_argument('--min-agreement', type=float, default=None,
+                            help='Exit with an error if a backend agrees on fewer texts than this (0-1)')
+
+    def handle(self, *args, **options):
+        model = options['model']
+        texts = SAMPLE_TEXTS + self._stored_texts(options['from_db'])
+
+        results = {}
+        for backend in options['backends']:
+            self.stdout.write(f"⚙️ Benchmarking {model} on {backend}...")
+            # One process per backend: RSS and load time are not skewed by the others
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                try:
+                    results[backend] = pool.submit(
+                        run_backend, model, backend, texts, options['repeat'], options['batch_size']
+                    ).result()
+                except Exception as e:
+                    self.stderr.write(f"❌ {backend} failed: {str(e)}")
+
+        if not results:
+            raise CommandError("No backend could be benchmarked")
+
+        reference_backend = next(iter(results))
+        reference = results[reference_backend]['outputs']
+        self.stdout.write(f"\n{len(texts)} texts, parity against {reference_backend}")
+        self.stdout.write(
+            f"{'backend':>10} {'load s':>8} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'texts/s':>8} {'agree':>7} {'mean Δ':>8} {'max Δ':>8}"
+        )
+        failed_parity = []
+        for backend, result in results.items():
+            agreement, mean_delta, max_delta = parity(model, reference, result['outputs'])
+            rss = f"{result['rss_mb']:.0f}" if result['rss_mb'] is not None else '?'
+            self.stdout.write(
+                f"{backend:>10} {result['load_seconds']:>8.2f} {rss:>8} {result['p50_ms']:>8.1f} "
+                f"{result['p95_ms']:>8.1f} {result['texts_per_second']:>8.1f} {agreement:>7.1%} "
+                f"{mean_delta:>8.4f} {max_delta:>8.4f}"
+            )
+            if options['min_agreement'] is not None and agreement < options['min_agreement']:
+                failed_parity.append(backend)
+
+        if failed_parity:
+            raise CommandError(f"Below {options['min_agreement']:.0%} agreement: {', '.join(failed_parity)}")
+
+    def _stored_texts(self, limit):
+        if not limit:
+            return []
+        from audio.audio_processing import split_sentiment_windows
+        from audio.models import AudioMemory
+
+        transcripts = AudioMemory.objects.filter(transcription__isnull=False).exclude(
+            transcription="[No speech detected]"
+        ).order_by('-id').values_list('transcription', flat=True)[:limit]
+        return [window for transcript in transcripts for window in split_sentiment_windows(transcript)]
@@ -0,0 +1,84 @@
+import random
+import re
+import time
+from django.core.management.base import BaseCommand
+from audio import audio_processing
+
+FILLER_WORDS = [
+    "i", "the", "and", "was", "we", "went", "to", "my", "with", "a", "it",
+    "then", "she", "he", "they", "said", "that", "of", "so", "had", "just",
+    "after", "before", "because", "little", "big", "old", "new", "again",
+]
+
+CATEGORIES = {
+    "memory": audio_processing.MEMORY_INDICATORS,
+    "routine": audio_processing.ROUTINE_INDICATORS,
+    "time": audio_processing.TIME_INDICATORS,
+    "location": audio_processing.LOCATION_INDICATORS,
+    "severity": audio_processing.SEVERITY_INDICATORS,
+    **{f"concern:{label}": keywords for label, keywords in audio_processing.CONCERN_KEYWORDS.items()},
+}
+
+
+def legacy_scan(text):
+    """The previous implementation: one re.search per keyword over a fresh text.lower()."""
+    hits = {}
+    for category, keywords in CATEGORIES.items():
+        hits[category] = [
+            keyword for keyword in keywords
+            if re.search(r'\b' + re.escape(keyword) + r'\b', text.lower())
+        ]
+    return hits
+
+
+def lexicon_scan(text):
+    hits = audio_processing.scan_keywords(text)
+    return {category: hits.ordered(category) for category in CATEGORIES}
+
+
+def make_transcript(word_count, density, rng):
+    keywords = [keyword for keywords in CATEGORIES.values() for keyword in keywords]
+    words = []
+    for i in range(word_count):
+        words.append(rng.choice(keywords) if rng.random() < density else rng.choice(FILLER_WORDS))
+        if i % 15 == 14:
+            words[-1] += rng.choice([".", ",", "?", "!"])
+    return " ".join(words)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the compiled keyword lexicon against per-keyword regex scans on long transcripts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--words', type=int, nargs='+', default=[1000, 10000, 50000],
+                            help='Transcript lengths to benchmark, in words')
+        parser.add_argument('--density', type=float, default=0.03,
+                            help='Fraction of transcript words drawn from the keyword lists')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per transcript length')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'words':>8} {'legacy ms':>12} {'lexicon ms':>12} {'speedup':>9}  parity")
+        for word_count in options['words']:
+            text = make_transcript(word_count, options['density'], rng)
+
+            legacy_time = self._best_of(legacy_scan, text, repeat)
+            lexicon_time = self._best_of(lexicon_scan, text, repeat)
+            parity = "ok" if legacy_scan(text) == lexicon_scan(text) else "MISMATCH"
+
+            self.stdout.write(
+                f"{word_count:>8} {legacy_time * 1000:>12.2f} {lexicon_time * 1000:>12.2f} "
+                f"{legacy_time / lexicon_time:>8.1f}x  {parity}"
+            )
+
+    @staticmethod
+    def _best_of(scan, text, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            scan(text)
+            best = min(best, time.perf_counter() - start)
+        return best
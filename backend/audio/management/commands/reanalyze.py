@@ -0,0 +1,190 @@
+import json
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from audio.models import AudioMemory, ProcessingJob, TranscriptSegment
+from audio.reanalysis import analyze_texts, init_worker
+from audio.tasks import ANALYSIS_FIELDS, SERIES_FIELDS, apply_analysis, transcribe_with_checkpoints
+
+DEFAULT_CHECKPOINT = os.path.join(tempfile.gettempdir(), 'reanalyze-checkpoint.json')
+
+# Rows the job worker is about to write, or writing
+UNFINISHED_JOB_STATUSES = (ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the sentiment, sentiment series and indicator columns of stored audio memories, e.g. after "
+        "changing a keyword list or sentiment model. Resumes from its checkpoint when interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows read and written at a time')
+        parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                            help='Analysis processes, 0 analyzes in this process')
+        parser.add_argument('--user', help='Only the memories of this Firebase UID')
+        parser.add_argument('--retranscribe', action='store_true',
+                            help='Run Whisper again on the stored audio files before analyzing')
+        parser.add_argument('--checkpoint',
+                            help='File recording the last row done, removed once the run completes '
+                                 '(default: AUDIO_REANALYZE_CHECKPOINT)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--skip-series', action='store_true',
+                            help='Keep the stored sentence-level sentiment series (no DistilBERT)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+        options['checkpoint'] = options['checkpoint'] or getattr(
+            settings, 'AUDIO_REANALYZE_CHECKPOINT', None
+        ) or DEFAULT_CHECKPOINT
+
+        # Memories still queued or being processed are left to the job worker
+        queryset = AudioMemory.objects.exclude(jobs__status__in=UNFINISHED_JOB_STATUSES).order_by('id')
+        if options['user']:
+            queryset = queryset.filter(user__firebase_uid=options['user'])
+        if not options['retranscribe']:
+            queryset = queryset.filter(transcription__isnull=False)
+
+        checkpoint = self._read_checkpoint(options)
+        last_id = checkpoint['last_id']
+        if last_id:
+            self.stdout.write(f"⏩ Resuming after audio #{last_id} ({checkpoint['processed']} rows already done)")
+
+        with_series = getattr(settings, 'AUDIO_SENTIMENT_SERIES', True) and not options['skip_series']
+        fields = [field for field, _ in ANALYSIS_FIELDS] + (SERIES_FIELDS if with_series else []) + ['updated_at']
+
+        total = queryset.filter(id__gt=last_id).count()
+        self.stdout.write(f"🔁 Re-analyzing {total} audio memories with {options['workers']} worker(s)")
+
+        pool = None
+        if options['workers'] > 0:
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker
+            )
+
+        processed = failed = 0
+        start_time = time.time()
+        try:
+            while True:
+                # Keyset batches on id, so each query stays cheap however far the run is
+                batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+
+                batch_last_id = batch[-1].id
+                batch_failed = 0
+                if options['retranscribe']:
+                    transcribed = [audio_memory for audio_memory in batch if self._retranscribe(audio_memory)]
+                    batch_failed = len(batch) - len(transcribed)
+                    batch = transcribed
+
+                updated, analysis_failed = self._analyze_batch(batch, pool, options['workers'], with_series)
+                if updated:
+                    AudioMemory.objects.bulk_update(updated, fields)
+
+                processed += len(updated)
+                failed += batch_failed + analysis_failed
+                last_id = batch_last_id
+                self._write_checkpoint(options, last_id, checkpoint['processed'] + processed)
+
+                elapsed = time.time() - start_time
+                self.stdout.write(
+                    f"📊 {processed}/{total} rows, {failed} failed, "
+                    f"{processed / elapsed if elapsed else 0:.1f} rows/sec"
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.time() - start_time
+        if os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Re-analyzed {processed} rows in {elapsed:.1f} seconds "
+            f"({processed / elapsed if elapsed else 0:.1f} rows/sec), {failed} failed"
+        ))
+
+    def _analyze_batch(self, batch, pool, workers, with_series):
+        # Identical transcripts (placeholders, short phrases) are analyzed once
+        texts = list(dict.fromkeys(audio_memory.transcription for audio_memory in batch))
+        if not texts:
+            return [], 0
+        if pool is None:
+            results = analyze_texts(texts, with_series)
+        else:
+            size = math.ceil(len(texts) / workers)
+            chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+            results = [result for chunk in pool.map(analyze_texts, chunks, repeat(with_series)) for result in chunk]
+        by_text = dict(zip(texts, results))
+
+        updated = []
+        failed = 0
+        for audio_memory in batch:
+            result = by_text[audio_memory.transcription]
+            if isinstance(result, str):
+                self.stderr.write(f"❌ Analysis of audio #{audio_memory.id} failed: {result}")
+                failed += 1
+                continue
+            apply_analysis(audio_memory, result)
+            audio_memory.updated_at = timezone.now()  # bulk_update() skips auto_now
+            if with_series:
+                audio_memory.sentiment_series = result['series']['series']
+                audio_memory.sentiment_summary = result['series']['summary']
+            updated.append(audio_memory)
+        return updated, failed
+
+    def _retranscribe(self, audio_memory):
+        """Transcribe an AudioMemory again from its file; False if that failed."""
+        try:
+            if not audio_memory.audio_file or not os.path.exists(audio_memory.audio_file.path):
+                raise FileNotFoundError("audio file is missing")
+            # A job queued since the batch was read would transcribe into the same segments
+            if audio_memory.jobs.filter(status__in=UNFINISHED_JOB_STATUSES).exists():
+                raise RuntimeError("a processing job is queued or running")
+
+            TranscriptSegment.objects.filter(audio_memory=audio_memory).delete()
+            text = transcribe_with_checkpoints(audio_memory)
+            audio_memory.transcription = text.strip() or "[No speech detected]"
+            audio_memory.transcription_complete = True
+            audio_memory.save(update_fields=['transcription', 'transcription_complete', 'updated_at'])
+            return True
+        except Exception as e:
+            self.stderr.write(f"❌ Transcription of audio #{audio_memory.id} failed: {str(e)}")
+            return False
+
+    def _read_checkpoint(self, options):
+        path = options['checkpoint']
+        if options['restart'] or not os.path.exists(path):
+            return {'last_id': 0, 'processed': 0}
+        try:
+            with open(path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Unreadable checkpoint {path} ({str(e)}), run with --restart")
+        if checkpoint.get('retranscribe') != options['retranscribe'] or checkpoint.get('user') != options['user']:
+            raise CommandError(
+                f"Checkpoint {path} was written with different --user/--retranscribe options, run with --restart"
+            )
+        return checkpoint
+
+    def _write_checkpoint(self, options, last_id, processed):
+        path = options['checkpoint']
+        with open(path + '.tmp', 'w') as checkpoint_file:
+            json.dump({
+                'last_id': last_id,
+                'processed': processed,
+                'user': options['user'],
+                'retranscribe': options['retranscribe'],
+            }, checkpoint_file)
+        os.replace(path + '.tmp', path)  # Never leave a half-written checkpoint
@@ -0,0 +1,57 @@
+"""
+Metrics of the audio pipeline (see backend/metrics.py for the /metrics endpoint).
+
+STAGE_SECONDS has one series per stage:
+
+    upload     receiving and storing an upload, up to the 202 response
+    decode     decoding the file to 16 kHz samples for the VAD
+    vad        finding the voiced regions
+    transcribe Whisper, over all windows and segments
+    sentiment  VADER (and DistilBERT for detailed analysis)
+    keywords   the keyword lexicon scan and indicator detectors
+    db_save    writing the final results of a job
+"""
+from backend.metrics import metrics
+
+STAGE_SECONDS = metrics.histogram(
+    'audio_stage_seconds', 'Duration of audio pipeline stages', ['stage']
+)
+UPLOADS = metrics.counter(
+    'audio_uploads_total', 'Upload requests by outcome', ['result']
+)
+JOBS = metrics.counter(
+    'audio_jobs_total', 'Processing job attempts by outcome (done, retried, failed)', ['result']
+)
+JOB_SECONDS = metrics.histogram(
+    'audio_job_seconds', 'Duration of a processing job attempt, from claim to finish'
+)
+TRANSCRIPTIONS = metrics.counter(
+    'audio_transcriptions_total', 'Whisper transcriptions by tier (see audio/whisper_policy.py)', ['tier']
+)
+QUEUE_DEPTH = metrics.gauge(
+    'audio_job_queue_depth', 'Queued and running processing jobs', ['status']
+)
+
+
+def upload_result(response):
+    """Outcome label of an upload response."""
+    if response.status_code == 429:
+        return 'rejected'
+    if response.status_code >= 400:
+        return 'error'
+    if response.data and response.data.get('duplicate'):
+        return 'duplicate'
+    return 'accepted'
+
+
+@metrics.collector
+def collect_queue_depth():
+    from django.db.models import Count
+    from .models import ProcessingJob
+
+    pending = [ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING]
+    counts = dict(
+        ProcessingJob.objects.filter(status__in=pending).values_list('status').annotate(total=Count('id')).order_by()
+    )
+    for job_status in pending:
+        QUEUE_DEPTH.set(counts.get(job_status, 0), status=job_status)
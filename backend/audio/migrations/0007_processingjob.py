@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-17 22:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0006_alter_audiomemory_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField()),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('audio_memory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='audio.audiomemory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='audio_proce_status_074349_idx')],
+            },
+        ),
+    ]
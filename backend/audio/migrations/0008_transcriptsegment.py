@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2026-10-17 22:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def mark_processed_transcriptions_complete(apps, schema_editor):
+    # Rows processed before segments existed already hold their full transcript
+    AudioMemory = apps.get_model('audio', 'AudioMemory')
+    AudioMemory.objects.filter(processing_complete=True).update(transcription_complete=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0007_processingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiomemory',
+            name='transcription_complete',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='TranscriptSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('start', models.FloatField()),
+                ('end', models.FloatField()),
+                ('text', models.TextField()),
+                ('audio_memory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='audio.audiomemory')),
+            ],
+            options={
+                'ordering': ['index'],
+                'unique_together': {('audio_memory', 'index')},
+            },
+        ),
+        migrations.RunPython(mark_processed_transcriptions_complete, migrations.RunPython.noop),
+    ]
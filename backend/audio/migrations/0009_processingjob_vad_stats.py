@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-17 22:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0008_transcriptsegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='audio_duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='speech_ratio',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='speech_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='time_saved',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
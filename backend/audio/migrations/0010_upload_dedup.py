@@ -0,0 +1,64 @@
+# Generated by Django 4.2.20 on 2026-10-17 22:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import hashlib
+
+
+def hash_existing_uploads(apps, schema_editor):
+    # Hash files uploaded before content_sha256 existed so they are deduplicated too
+    AudioMemory = apps.get_model('audio', 'AudioMemory')
+    for audio_memory in AudioMemory.objects.filter(content_sha256__isnull=True).exclude(audio_file=''):
+        digest = hashlib.sha256()
+        try:
+            with audio_memory.audio_file.open('rb') as audio_file:
+                for chunk in audio_file.chunks():
+                    digest.update(chunk)
+        except (OSError, ValueError):
+            continue  # File missing from storage, nothing to deduplicate against
+        AudioMemory.objects.filter(id=audio_memory.id).update(content_sha256=digest.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('audio', '0009_processingjob_vad_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadIdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('response_body', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='audiomemory',
+            name='content_sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(hash_existing_uploads, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='audiomemory',
+            index=models.Index(fields=['user', 'content_sha256'], name='audio_audio_user_id_a568bf_idx'),
+        ),
+        migrations.AddField(
+            model_name='uploadidempotencykey',
+            name='audio_memory',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='audio.audiomemory'),
+        ),
+        migrations.AddField(
+            model_name='uploadidempotencykey',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.userprofile'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='uploadidempotencykey',
+            unique_together={('user', 'key')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-17 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0011_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audiomemory',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='audio_audio_user_id_b380e2_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-17 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0013_analysiscacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiomemory',
+            name='sentiment_series',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audiomemory',
+            name='sentiment_summary',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-17 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0014_audiomemory_sentiment_series'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiomemory',
+            name='transcription_tier',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='kind',
+            field=models.CharField(choices=[('process', 'Process'), ('upgrade', 'Upgrade')], default='process', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0015_transcription_tier_and_job_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiomemory',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
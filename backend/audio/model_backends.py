@@ -0,0 +1,118 @@
+"""
+Pluggable CPU inference backends for the Hugging Face models.
+
+`load_pipeline(task, model_name)` returns a transformers pipeline with the
+usual output contract ([{"label", "score"}] for sentiment, entity dicts for
+NER) whatever runs underneath:
+
+    torch      the model as published, float32 PyTorch
+    quantized  PyTorch with int8 dynamic quantization of the Linear layers
+    onnx       ONNX Runtime (needs `pip install optimum[onnxruntime]`); the
+               exported model is cached in INFERENCE_ONNX_CACHE_DIR
+
+The backend comes from the `backend` argument, else the per-model
+INFERENCE_BACKENDS setting, else INFERENCE_BACKEND, else the
+INFERENCE_BACKEND environment variable (for the scripts in
+sentiment_analysis_project, which run without Django settings), else torch.
+
+Use `manage.py bench_inference` to check parity and compare latency and
+memory before switching a deployment to another backend.
+
+This module must stay importable without configured Django settings.
+"""
+import os
+
+try:
+    from django.conf import settings
+except ImportError:  # Standalone scripts without Django installed
+    settings = None
+
+BACKENDS = ('torch', 'quantized', 'onnx')
+
+DISTILBERT_MODEL = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+NER_MODEL = "dbmdz/bert-large-cased-finetuned-conll03-english"
+
+DEFAULT_ONNX_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'amie', 'onnx')
+
+
+def _setting(name, default):
+    # Settings are read lazily: configured, or about to be through DJANGO_SETTINGS_MODULE
+    if settings is not None and (settings.configured or os.environ.get('DJANGO_SETTINGS_MODULE')):
+        return getattr(settings, name, default)
+    return default
+
+
+def backend_for(model_name):
+    """Backend configured for a model."""
+    backend = _setting('INFERENCE_BACKENDS', {}).get(model_name) or _setting(
+        'INFERENCE_BACKEND', os.environ.get('INFERENCE_BACKEND', 'torch')
+    )
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', use one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def _model_class(task):
+    if task in ('ner', 'token-classification'):
+        return 'TokenClassification'
+    if task in ('sentiment-analysis', 'text-classification'):
+        return 'SequenceClassification'
+    raise ValueError(f"No inference backend support for task '{task}'")
+
+
+def _load_torch(task, model_name, quantize):
+    import transformers
+
+    model_class = getattr(transformers, f"AutoModelFor{_model_class(task)}")
+    model = model_class.from_pretrained(model_name)
+    model.eval()
+    if quantize:
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def _load_onnx(task, model_name):
+    try:
+        import optimum.onnxruntime as ort
+    except ImportError:
+        raise ImportError("The onnx inference backend needs optimum[onnxruntime]")
+
+    model_class = getattr(ort, f"ORTModelFor{_model_class(task)}")
+    cache_dir = os.path.join(
+        _setting('INFERENCE_ONNX_CACHE_DIR', DEFAULT_ONNX_CACHE_DIR),
+        model_name.replace('/', '--')
+    )
+    if os.path.exists(os.path.join(cache_dir, 'model.onnx')):
+        return model_class.from_pretrained(cache_dir)
+
+    # First use: export from the PyTorch checkpoint once and keep the result
+    print(f"🔧 Exporting {model_name} to ONNX in {cache_dir}...")
+    model = model_class.from_pretrained(model_name, export=True)
+    model.save_pretrained(cache_dir)
+    return model
+
+
+def load_pipeline(task, model_name, backend=None, **pipeline_kwargs):
+    """
+    A transformers pipeline for `task` running `model_name` on the chosen backend.
+
+    Args:
+        task: Pipeline task, 'sentiment-analysis' or 'ner'
+        model_name: Hugging Face model id
+        backend: One of BACKENDS; defaults to backend_for(model_name)
+        pipeline_kwargs: Passed on to transformers.pipeline, e.g. aggregation_strategy
+    """
+    from transformers import AutoTokenizer, pipeline
+
+    backend = backend or backend_for(model_name)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', use one of {', '.join(BACKENDS)}")
+
+    if backend == 'onnx':
+        model = _load_onnx(task, model_name)
+    else:
+        model = _load_torch(task, model_name, quantize=backend == 'quantized')
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return pipeline(task, model=model, tokenizer=tokenizer, **pipeline_kwargs)
@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.conf import settings
 from users.models import UserProfile
@@ -21,10 +22,145 @@ class AudioMemory(models.Model):
     location_indicators = models.TextField(blank=True, null=True)
     severity_indicators = models.TextField(blank=True, null=True)  
     potential_concerns = models.TextField(blank=True, null=True)
+
+    # Sentence-level sentiment (see analyze_sentiment_series): one entry per
+    # sentence or window, and its aggregates including the most negative passage
+    sentiment_series = models.JSONField(blank=True, null=True)
+    sentiment_summary = models.JSONField(blank=True, null=True)
    
     # Processing status
     processing_complete = models.BooleanField(default=False)
     processing_error = models.TextField(blank=True, null=True)
+    transcription_complete = models.BooleanField(default=False)  # False while segments are still arriving
+    transcription_tier = models.CharField(max_length=20, blank=True, null=True)  # Whisper tier, see audio/whisper_policy.py
+
+    # SHA-256 of the uploaded bytes, used to detect repeated uploads
+    content_sha256 = models.CharField(max_length=64, blank=True, null=True)
+
+    # Bumped on every write (QuerySet.update() callers set it themselves), for the list ETag
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'content_sha256']),
+            models.Index(fields=['user', '-timestamp', '-id']),  # Keyset pagination of the list endpoint
+        ]
+
+    def __str__(self):
+        return f"Audio Memory {self.id} - {self.timestamp.strftime('%Y-%m-%d %H:%M')} - {self.user.username}"
+
+
+class UploadIdempotencyKey(models.Model):
+    """Response of an upload request, replayed when the client retries with the same Idempotency-Key."""
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    audio_memory = models.ForeignKey(AudioMemory, on_delete=models.CASCADE, null=True, blank=True)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)  # None while the request is in flight
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"Idempotency key {self.key} - {self.user_id} - {self.response_status or 'in flight'}"
+
+
+class TranscriptSegment(models.Model):
+    """A transcribed segment, saved as soon as Whisper emits it."""
+    audio_memory = models.ForeignKey(AudioMemory, on_delete=models.CASCADE, related_name='segments')
+    index = models.PositiveIntegerField()  # Position of the segment in the recording
+    start = models.FloatField()  # Seconds from the start of the recording
+    end = models.FloatField()
+    text = models.TextField()
+
+    class Meta:
+        unique_together = ('audio_memory', 'index')
+        ordering = ['index']
+
+    def __str__(self):
+        return f"Segment {self.index} of Audio Memory {self.audio_memory_id} ({self.start:.2f}-{self.end:.2f}s)"
+
+
+class ProcessingJob(models.Model):
+    """Persisted unit of work for the audio processing worker pool."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    KIND_PROCESS = 'process'
+    KIND_UPGRADE = 'upgrade'  # Re-transcription at a better Whisper tier while the queue is idle
+    KIND_CHOICES = [
+        (KIND_PROCESS, 'Process'),
+        (KIND_UPGRADE, 'Upgrade'),
+    ]
+
+    audio_memory = models.ForeignKey(AudioMemory, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_PROCESS)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField()  # Not picked up before this time (retry backoff)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    # Voice activity detection pre-pass (see audio/vad.py)
+    audio_duration = models.FloatField(null=True, blank=True)  # Seconds
+    speech_seconds = models.FloatField(null=True, blank=True)
+    speech_ratio = models.FloatField(null=True, blank=True)  # Voiced share of the recording, 0-1
+    time_saved = models.FloatField(null=True, blank=True)  # Estimated Whisper seconds saved by skipping silence
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} - Audio Memory {self.audio_memory_id} - {self.status}"
+
+
+class UploadSession(models.Model):
+    """Resumable upload: the file is sent in byte ranges, then finalized into an AudioMemory."""
+    STATUS_UPLOADING = 'uploading'
+    STATUS_COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (STATUS_UPLOADING, 'Uploading'),
+        (STATUS_COMPLETE, 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField(null=True, blank=True)  # Announced by the client, if known
+    received_bytes = models.BigIntegerField(default=0)
+    detected_format = models.CharField(max_length=10, blank=True, null=True)  # Sniffed from the first bytes
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_UPLOADING)
+    audio_memory = models.ForeignKey(AudioMemory, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} - {self.filename} - {self.received_bytes} bytes - {self.status}"
+
+
+class AnalysisCacheEntry(models.Model):
+    """Stored text analysis result, reused for identical transcripts (see audio/analysis_cache.py)."""
+    kind = models.CharField(max_length=32)  # Which analysis: 'comprehensive' or 'detailed'
+    text_hash = models.CharField(max_length=64)  # SHA-256 of the normalized text
+    analyzer_version = models.PositiveIntegerField()
+    result = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)  # Times the stored result was reused
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('kind', 'text_hash', 'analyzer_version')
 
     def __str__(self):
-        return f"Audio Memory {self.id} - {self.timestamp.strftime('%Y-%m-%d %H:%M')} - {self.user.username}"
\ No newline at end of file
+        return f"Analysis cache {self.kind} {self.text_hash[:12]} v{self.analyzer_version} - {self.hits} hits"
@@ -0,0 +1,39 @@
+"""
+Worker side of `manage.py reanalyze`.
+
+The command's process pool uses the spawn start method: every worker imports
+this module to unpickle its initializer and task before Django is set up. So
+nothing from Django or the audio app is imported at module level here.
+"""
+import os
+
+
+def init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+def analyze_texts(texts, with_series=True):
+    """
+    Analyze a batch of texts in a worker process.
+
+    Runs the uncached analysis: a re-analysis happens because the analyzers
+    changed, so stored results must not be reused. The whole batch goes
+    through the models together, DistilBERT included when the sentiment
+    series are recomputed (see audio_processing.analyze_texts_batch);
+    if that fails, the texts are analyzed one by one so a single bad text
+    only fails itself.
+
+    Returns:
+        One result dict per text, or an error message string where it failed
+    """
+    from audio.audio_processing import analyze_texts_batch
+
+    try:
+        return analyze_texts_batch(texts, with_series)
+    except Exception as e:
+        if len(texts) == 1:
+            return [f"{type(e).__name__}: {str(e)}"]
+
+    return [result for text in texts for result in analyze_texts([text], with_series)]
@@ -0,0 +1,246 @@
+"""
+Resumable chunked uploads.
+
+Large recordings are uploaded in byte ranges instead of one multipart
+request: the client creates an UploadSession, PUTs consecutive ranges (each
+appended to a temporary file, streamed from the request body in small
+pieces), and finalizes the session, which turns the file into an AudioMemory
+and queues it for processing. After a dropped connection the client asks for
+the session's offset and continues from there.
+
+The SHA-256 of the upload is computed while the ranges arrive and the format
+is sniffed from the first bytes, so a file in an unsupported format is
+rejected before the rest of it is sent. Finalizing refuses an upload whose
+format was never detected (one shorter than the sniffed header).
+
+Settings (all optional):
+    AUDIO_UPLOAD_MAX_BYTES     largest accepted upload
+    AUDIO_UPLOAD_CHUNK_BYTES   range size suggested to clients
+    AUDIO_UPLOAD_SESSION_TTL   seconds an unfinished session is kept after its last range
+"""
+import os
+import datetime
+import hashlib
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from backend.structured_log import get_logger
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_CHUNK_BYTES = 5 * 1024 * 1024
+DEFAULT_SESSION_TTL = 24 * 60 * 60
+
+READ_SIZE = 64 * 1024  # Bytes read from the request body at a time
+SNIFF_BYTES = 12
+SESSION_DIR = 'upload_sessions'
+
+log = get_logger('audio.uploads')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class UploadRangeError(Exception):
+    """Raised when a range does not continue the upload where it stopped."""
+
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UnsupportedAudioFormat(Exception):
+    """Raised when the first bytes of an upload match no supported audio format."""
+
+
+def sniff_format(head):
+    """Audio container of a file from its first SNIFF_BYTES bytes, or None."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[:4] == b'fLaC':
+        return 'flac'
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'webm'
+    if head[4:8] == b'ftyp':
+        return 'm4a'
+    if head[:3] == b'ID3' or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return None
+
+
+def parse_content_range(header):
+    """
+    Parse "bytes <first>-<last>/<total or *>".
+
+    Returns:
+        (first, last, total) with total None for "*", or None if malformed
+    """
+    try:
+        unit, spec = header.strip().split(' ', 1)
+        byte_range, total = spec.split('/', 1)
+        first, last = (int(value) for value in byte_range.split('-', 1))
+        total = None if total == '*' else int(total)
+    except (AttributeError, ValueError):
+        return None
+    if unit != 'bytes' or first < 0 or last < first or (total is not None and last >= total):
+        return None
+    return first, last, total
+
+
+def part_path(session):
+    return default_storage.path(os.path.join(SESSION_DIR, f"{session.id}.part"))
+
+
+# Per-session locks and running hashes; a hash lost to a restart is rebuilt from the file
+_locks = defaultdict(threading.Lock)
+_locks_guard = threading.Lock()
+_hashers = {}
+
+
+def session_lock(session):
+    with _locks_guard:
+        return _locks[session.id]
+
+
+def _hasher(session):
+    hasher, offset = _hashers.get(session.id, (None, None))
+    if hasher is None or offset != session.received_bytes:
+        hasher = hashlib.sha256()
+        path = part_path(session)
+        if session.received_bytes and os.path.exists(path):
+            with open(path, 'rb') as part:
+                remaining = session.received_bytes
+                while remaining:
+                    block = part.read(min(READ_SIZE, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+    return hasher
+
+
+def _forget(session):
+    _hashers.pop(session.id, None)
+    with _locks_guard:
+        _locks.pop(session.id, None)
+
+
+def append_range(session, stream, first, length):
+    """
+    Append `length` bytes read from `stream` at offset `first`.
+
+    Bytes received before a dropped connection are kept, so the client can
+    resume from the returned offset. Call with session_lock(session) held.
+
+    Returns:
+        The new offset (bytes received so far)
+    """
+    from .models import UploadSession
+
+    if first != session.received_bytes:
+        raise UploadRangeError(
+            f"Range starts at byte {first} but the upload continues at byte {session.received_bytes}",
+            session.received_bytes
+        )
+    max_bytes = session.total_size or _setting('AUDIO_UPLOAD_MAX_BYTES', DEFAULT_MAX_BYTES)
+    if first + length > max_bytes:
+        raise UploadRangeError(f"Upload would exceed {max_bytes} bytes", session.received_bytes)
+
+    path = part_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hasher = _hasher(session)
+    detected_format = session.detected_format
+    written = 0
+
+    # The first SNIFF_BYTES bytes may arrive over several short ranges
+    prefix = b''
+    if detected_format is None and first and first < SNIFF_BYTES:
+        with open(path, 'rb') as part:
+            prefix = part.read(first)
+
+    with open(path, 'ab') as part:
+        # Drop bytes of an interrupted range that were written but never recorded
+        part.truncate(session.received_bytes)
+        try:
+            if detected_format is None and first < SNIFF_BYTES:
+                head = stream.read(min(SNIFF_BYTES - first, length))
+                if len(prefix + head) == SNIFF_BYTES:
+                    detected_format = sniff_format(prefix + head)
+                    if detected_format is None:
+                        raise UnsupportedAudioFormat("File is not a supported audio format")
+                part.write(head)
+                hasher.update(head)
+                written += len(head)
+
+            while written < length:
+                block = stream.read(min(READ_SIZE, length - written))
+                if not block:
+                    break  # Client went away; keep what arrived
+                part.write(block)
+                hasher.update(block)
+                written += len(block)
+        finally:
+            part.flush()
+            offset = session.received_bytes + written
+            _hashers[session.id] = (hasher, offset)
+            session.received_bytes = offset
+            session.detected_format = detected_format
+            UploadSession.objects.filter(id=session.id).update(
+                received_bytes=offset,
+                detected_format=detected_format,
+                updated_at=timezone.now()
+            )
+
+    return session.received_bytes
+
+
+def upload_digest(session):
+    """SHA-256 of everything received so far."""
+    return _hasher(session).hexdigest()
+
+
+def move_into_storage(path, filename, audio_memory):
+    """Move a finished file to the AudioMemory's storage path without copying it."""
+    field = audio_memory._meta.get_field('audio_file')
+    name = default_storage.get_available_name(
+        field.generate_filename(audio_memory, filename),
+        max_length=field.max_length
+    )
+    target = default_storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    audio_memory.audio_file.name = name
+
+
+def finish_session(session, audio_memory):
+    """Move the assembled upload into the AudioMemory's storage path."""
+    move_into_storage(part_path(session), session.filename, audio_memory)
+    _forget(session)
+
+
+def discard(session):
+    """Delete the temporary file of a session."""
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    _forget(session)
+
+
+def purge_expired_sessions():
+    """Delete unfinished sessions that received nothing for AUDIO_UPLOAD_SESSION_TTL seconds."""
+    from .models import UploadSession
+
+    cutoff = timezone.now() - datetime.timedelta(
+        seconds=_setting('AUDIO_UPLOAD_SESSION_TTL', DEFAULT_SESSION_TTL)
+    )
+    expired = UploadSession.objects.filter(status=UploadSession.STATUS_UPLOADING, updated_at__lt=cutoff)
+    for session in expired:
+        discard(session)
+    count, _ = expired.delete()
+    if count:
+        log.info('upload_sessions_expired', sessions=count)
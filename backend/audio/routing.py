@@ -0,0 +1,7 @@
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/audio-status/', consumers.AudioStatusConsumer.as_asgi()),
+    path('ws/audio-stream/', consumers.AudioStreamConsumer.as_asgi()),
+]
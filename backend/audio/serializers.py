@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import AudioMemory
+from .models import AudioMemory, TranscriptSegment
 
 class AudioMemorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,12 +8,20 @@ class AudioMemorySerializer(serializers.ModelSerializer):
             'id', 'user', 'audio_file', 'timestamp', 'transcription', 'score', 
             'sentiment_label', 'memory_references', 'routine_references',
             'time_indicators', 'location_indicators', 'severity_indicators',
-            'potential_concerns', 'processing_complete', 'processing_error'
+            'potential_concerns', 'processing_complete', 'processing_error',
+            'transcription_complete', 'content_sha256', 'sentiment_series', 'sentiment_summary',
+            'transcription_tier'
         ]
         read_only_fields = [
             'id', 'timestamp', 'transcription', 'score', 
             'sentiment_label', 'memory_references', 'routine_references',
             'time_indicators', 'location_indicators', 'severity_indicators',
             'potential_concerns', 'processing_complete', 'processing_error',
-            'user'
+            'transcription_complete', 'content_sha256', 'sentiment_series', 'sentiment_summary', 'transcription_tier', 'user'
         ]
+
+
+class TranscriptSegmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TranscriptSegment
+        fields = ['index', 'start', 'end', 'text']
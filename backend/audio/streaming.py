@@ -0,0 +1,262 @@
+"""
+Incremental transcription of live audio streams (see audio/consumers.py).
+
+The app sends PCM16 or Opus frames over a WebSocket. Frames are decoded to
+16 kHz mono float32 samples, appended to a recording on disk and to a
+rolling buffer. Whisper runs on the rolling buffer every
+AUDIO_STREAM_DECODE_INTERVAL seconds of new audio; segments that end well
+before the end of the buffer are final (Whisper will not revise them once
+more audio arrives), are sent to the client and trimmed from the buffer,
+and the rest is sent as a partial transcript.
+
+Settings (all optional):
+    AUDIO_STREAM_DECODE_INTERVAL  seconds of new audio between two decodes
+    AUDIO_STREAM_STABLE_MARGIN    segments ending this close to the buffer end stay partial
+    AUDIO_STREAM_MAX_BUFFER       seconds after which everything but the last segment is committed
+    AUDIO_STREAM_DECODE_WORKERS   concurrent Whisper decodes across all streams
+"""
+import os
+import uuid
+import wave
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+SAMPLING_RATE = 16000
+
+DEFAULT_DECODE_INTERVAL = 1.0
+DEFAULT_STABLE_MARGIN = 1.0
+DEFAULT_MAX_BUFFER = 30.0
+DEFAULT_DECODE_WORKERS = 2
+
+SUPPORTED_FORMATS = ('pcm16', 'opus')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+_executor = None
+
+
+def decode_executor():
+    """Thread pool shared by all streams, so live decoding has a bounded cost."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=_setting('AUDIO_STREAM_DECODE_WORKERS', DEFAULT_DECODE_WORKERS),
+            thread_name_prefix="audio-stream-decode"
+        )
+    return _executor
+
+
+def _resample(samples, sample_rate):
+    if sample_rate == SAMPLING_RATE or not len(samples):
+        return samples
+    # Linear interpolation is enough for speech recognition input
+    duration = len(samples) / sample_rate
+    target = np.linspace(0, duration, int(duration * SAMPLING_RATE), endpoint=False)
+    source = np.arange(len(samples)) / sample_rate
+    return np.interp(target, source, samples).astype(np.float32)
+
+
+class Pcm16Decoder:
+    """Little-endian signed 16-bit mono PCM, at any sample rate."""
+
+    def __init__(self, sample_rate=SAMPLING_RATE):
+        self.sample_rate = sample_rate
+        self._remainder = b''
+
+    def decode(self, data):
+        data = self._remainder + data
+        usable = len(data) - len(data) % 2  # Frames may split a sample
+        self._remainder = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype='<i2').astype(np.float32) / 32768.0
+        return _resample(samples, self.sample_rate)
+
+
+class OpusDecoder:
+    """Raw Opus packets, one per message, decoded with PyAV."""
+
+    def __init__(self, sample_rate=48000):
+        try:
+            import av
+        except ImportError:
+            raise ValueError("Opus streams need PyAV (pip install av)")
+        self._av = av
+        self._codec = av.CodecContext.create('opus', 'r')
+        self._codec.sample_rate = sample_rate
+        self._resampler = av.AudioResampler(format='flt', layout='mono', rate=SAMPLING_RATE)
+
+    def decode(self, data):
+        chunks = []
+        for frame in self._codec.decode(self._av.Packet(data)):
+            for resampled in self._resampler.resample(frame):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+        return np.concatenate(chunks).astype(np.float32) if chunks else np.zeros(0, dtype=np.float32)
+
+
+def make_decoder(audio_format, sample_rate=None):
+    """Decoder for a stream format; raises ValueError for unsupported formats."""
+    if audio_format == 'pcm16':
+        return Pcm16Decoder(sample_rate or SAMPLING_RATE)
+    if audio_format == 'opus':
+        return OpusDecoder(sample_rate or 48000)
+    raise ValueError(f"Unsupported stream format '{audio_format}', use one of {', '.join(SUPPORTED_FORMATS)}")
+
+
+class RecordingWriter:
+    """Writes the decoded stream to a 16 kHz mono WAV file while it arrives."""
+
+    def __init__(self):
+        from .resumable import SESSION_DIR
+
+        self.path = default_storage.path(os.path.join(SESSION_DIR, f"stream-{uuid.uuid4()}.wav"))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._wav = wave.open(self.path, 'wb')
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(SAMPLING_RATE)
+        self.samples = 0
+
+    @property
+    def duration(self):
+        return self.samples / SAMPLING_RATE
+
+    def write(self, samples):
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+        self._wav.writeframes(pcm.tobytes())
+        self.samples += len(samples)
+
+    def close(self):
+        self._wav.close()
+
+    def sha256(self):
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as recording:
+            for block in iter(lambda: recording.read(64 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class StreamingTranscriber:
+    """
+    Rolling buffer of not yet committed audio and the segments committed so far.
+
+    snapshot() and commit() run on the event loop; the Whisper call between
+    them runs in decode_executor(), while add() may keep appending samples.
+    """
+
+    def __init__(self):
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_start = 0.0  # Stream time of buffer[0], in seconds
+        self.segments = []  # Committed (start, end, text), in stream time
+        self.undecoded = 0  # Samples added since the last snapshot
+        self.stable_margin = _setting('AUDIO_STREAM_STABLE_MARGIN', DEFAULT_STABLE_MARGIN)
+        self.max_buffer = _setting('AUDIO_STREAM_MAX_BUFFER', DEFAULT_MAX_BUFFER)
+
+    def add(self, samples):
+        if len(samples):
+            self.buffer = np.concatenate([self.buffer, samples])
+            self.undecoded += len(samples)
+
+    @property
+    def undecoded_seconds(self):
+        return self.undecoded / SAMPLING_RATE
+
+    @property
+    def text(self):
+        return " ".join(text for _, _, text in self.segments).strip()
+
+    def snapshot(self):
+        """Samples to decode and the prompt (recent committed text) to decode them with."""
+        self.undecoded = 0
+        prompt = " ".join(text for _, _, text in self.segments[-3:]) or None
+        return self.buffer, prompt
+
+    def commit(self, segments, decoded_samples, final=False):
+        """
+        Commit the stable segments of a decode of the first `decoded_samples` samples.
+
+        Args:
+            segments: (start, end, text) relative to the buffer start
+            decoded_samples: Length of the snapshot that was decoded
+            final: End of stream, commit everything
+
+        Returns:
+            (committed, partial_text) where committed are the newly final
+            segments in stream time
+        """
+        decoded_seconds = decoded_samples / SAMPLING_RATE
+        segments = [segment for segment in segments if segment[2]]
+
+        if final:
+            stable = len(segments)
+        else:
+            stable = sum(1 for segment in segments if segment[1] <= decoded_seconds - self.stable_margin)
+            # Always leave the last segment open, unless the buffer grew too long
+            stable = min(stable, len(segments) - 1)
+            if decoded_seconds > self.max_buffer:
+                stable = max(stable, len(segments) - 1)
+        stable = max(stable, 0)
+
+        committed = [
+            (self.buffer_start + start, self.buffer_start + end, text)
+            for start, end, text in segments[:stable]
+        ]
+        self.segments.extend(committed)
+
+        if final:
+            cut = len(self.buffer)
+        elif committed:
+            cut = int(segments[stable - 1][1] * SAMPLING_RATE)
+        elif decoded_seconds > self.max_buffer and not segments:
+            cut = decoded_samples  # Nothing but silence, don't keep decoding it
+        else:
+            cut = 0
+        if cut:
+            self.buffer = self.buffer[cut:]
+            self.buffer_start += cut / SAMPLING_RATE
+
+        partial = " ".join(text for _, _, text in segments[stable:])
+        return committed, partial
+
+
+def save_stream_recording(user, recording, transcriber):
+    """
+    Store a finished stream as an AudioMemory whose transcription is already
+    complete, and queue it for the text analysis.
+
+    Returns:
+        The AudioMemory
+    """
+    from .jobs import job_queue
+    from .models import AudioMemory, TranscriptSegment
+    from .resumable import move_into_storage
+
+    recording.close()
+    text = transcriber.text or "[No speech detected]"
+    audio_memory = AudioMemory(
+        user=user,
+        transcription=text,
+        transcription_complete=True,
+        processing_complete=False,
+        content_sha256=recording.sha256()
+    )
+    move_into_storage(recording.path, os.path.basename(recording.path), audio_memory)
+    audio_memory.save()
+    TranscriptSegment.objects.bulk_create([
+        TranscriptSegment(audio_memory=audio_memory, index=index, start=start, end=end, text=text)
+        for index, (start, end, text) in enumerate(transcriber.segments)
+    ])
+    job_queue.enqueue(audio_memory)
+    return audio_memory
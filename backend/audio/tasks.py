@@ -0,0 +1,440 @@
+from .audio_processing import transcribe_audio, analyze_text_comprehensive, analyze_sentiment_series
+from .chunked import should_use_chunked, transcribe_chunked
+from .vad import detect_speech
+from .whisper_policy import choose_tier, get_tier, max_tier
+from .events import (
+    publish_status, transcription_progress, STAGE_TRANSCRIBING, STAGE_ANALYZING, STAGE_DONE
+)
+from .metrics import STAGE_SECONDS, TRANSCRIPTIONS
+from backend.structured_log import get_logger
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import os
+import time
+
+log = get_logger('audio.tasks')
+
+
+# AudioMemory fields filled by the text analysis, with their analyze_text_comprehensive keys
+ANALYSIS_FIELDS = [
+    ('score', 'sentiment_score'),
+    ('sentiment_label', 'sentiment_label'),
+    ('memory_references', 'memory_references'),
+    ('routine_references', 'routine_references'),
+    ('time_indicators', 'time_indicators'),
+    ('location_indicators', 'location_indicators'),
+    ('severity_indicators', 'severity_indicators'),
+    ('potential_concerns', 'potential_concerns'),
+]
+
+# AudioMemory fields filled by analyze_sentiment_series (see apply_sentiment_series)
+SERIES_FIELDS = ['sentiment_series', 'sentiment_summary']
+
+
+def apply_analysis(audio_memory, analysis_results):
+    """Copy an analyze_text_comprehensive result onto an AudioMemory, without saving it."""
+    for field, key in ANALYSIS_FIELDS:
+        setattr(audio_memory, field, analysis_results[key])
+    audio_memory.score = round(audio_memory.score, 4)
+
+
+def apply_sentiment_series(audio_memory, text):
+    """Set the sentence-level sentiment of an AudioMemory, without saving it; never fails the job."""
+    try:
+        series = analyze_sentiment_series(text)
+    except Exception as e:
+        log.warning('sentiment_series_failed', audio_id=audio_memory.id, error=str(e))
+        return
+    audio_memory.sentiment_series = series['series']
+    audio_memory.sentiment_summary = series['summary']
+
+
+def estimated_decode_rate():
+    """Whisper seconds per second of audio, from the VAD stats of recent jobs."""
+    from .models import ProcessingJob
+
+    recent = ProcessingJob.objects.filter(
+        time_saved__isnull=False,
+        speech_seconds__gt=0
+    ).order_by('-id').values_list('audio_duration', 'speech_seconds', 'time_saved')[:20]
+    rates = [saved / (duration - speech) for duration, speech, saved in recent if duration > speech]
+    return sum(rates) / len(rates) if rates else None
+
+
+def record_speech_stats(job_id, speech, time_saved):
+    from .models import ProcessingJob
+
+    if job_id is None:
+        return
+    ProcessingJob.objects.filter(id=job_id).update(
+        audio_duration=round(speech.duration, 2),
+        speech_seconds=round(speech.speech_seconds, 2),
+        speech_ratio=round(speech.speech_ratio, 4),
+        time_saved=round(time_saved, 2) if time_saved is not None else None
+    )
+
+
+def transcribe_with_checkpoints(audio_memory, job_id=None):
+    """
+    Transcribe an AudioMemory, saving every segment as it is decoded.
+
+    Segments already stored by an interrupted attempt are kept and decoding
+    resumes at the end of the last one. The partial transcript is written to
+    `transcription` after each segment so clients can show progress.
+
+    A VAD pre-pass runs first: recordings without speech skip Whisper and
+    otherwise only the voiced spans are decoded, in parallel windows for
+    long recordings (see audio.chunked). The speech ratio and the estimated
+    time saved are stored on the job `job_id`.
+
+    The Whisper tier is chosen from the job backlog and the voiced duration
+    (see audio.whisper_policy) and stored on the AudioMemory; a resumed
+    transcription keeps the tier of its saved segments.
+
+    Returns:
+        The full transcript text
+    """
+    from .models import AudioMemory, TranscriptSegment
+    from .jobs import job_queue
+
+    saved = list(audio_memory.segments.values_list('index', 'end', 'text'))
+    parts = [segment_text for _, _, segment_text in saved]
+    resume_from = saved[-1][1] if saved else 0.0
+    start_index = saved[-1][0] + 1 if saved else 0
+    progress = {'duration': None, 'reported': None}
+
+    def save_segment(index, start, end, segment_text):
+        TranscriptSegment.objects.create(
+            audio_memory=audio_memory, index=index, start=start, end=end, text=segment_text
+        )
+        parts.append(segment_text)
+        AudioMemory.objects.filter(id=audio_memory.id).update(
+            transcription=" ".join(parts).strip(), updated_at=timezone.now()
+        )
+
+        # Only publish when the rounded percentage moves
+        if progress['duration']:
+            percent = transcription_progress(end, progress['duration'])
+            if percent != progress['reported']:
+                progress['reported'] = percent
+                publish_status(
+                    audio_memory.user_id, audio_memory.id, STAGE_TRANSCRIBING,
+                    progress=percent, segment=index, text=segment_text
+                )
+
+    try:
+        speech = detect_speech(audio_memory.audio_file.path)
+    except Exception as e:
+        # Not fatal: Whisper can still transcribe the whole file
+        log.warning('vad_failed', audio_id=audio_memory.id, error=str(e))
+        speech = None
+
+    if speech is not None:
+        progress['duration'] = speech.duration
+        voiced = speech.speech_seconds_after(resume_from)
+        skipped = max(0.0, speech.duration - resume_from - voiced)
+        log.info(
+            'speech_detected',
+            audio_id=audio_memory.id,
+            speech_seconds=round(speech.speech_seconds, 1),
+            duration=round(speech.duration, 1),
+            speech_ratio=round(speech.speech_ratio, 4),
+            skipped_seconds=round(skipped, 1)
+        )
+
+        if not voiced:
+            log.info('whisper_skipped', audio_id=audio_memory.id, reason='no speech')
+            rate = estimated_decode_rate()
+            record_speech_stats(job_id, speech, skipped * rate if rate is not None else None)
+            return " ".join(parts).strip()
+
+    if saved and audio_memory.transcription_tier:
+        tier = get_tier(audio_memory.transcription_tier)
+    else:
+        tier = choose_tier(job_queue.backlog(), speech.speech_seconds if speech is not None else None)
+        audio_memory.transcription_tier = tier.name
+        AudioMemory.objects.filter(id=audio_memory.id).update(transcription_tier=tier.name, updated_at=timezone.now())
+    TRANSCRIPTIONS.inc(tier=tier.name)
+    log.info('whisper_tier', audio_id=audio_memory.id, tier=tier.name, model=tier.model_size, beam_size=tier.beam_size)
+
+    start_time = time.time()
+    with STAGE_SECONDS.time(stage='transcribe'):
+        if should_use_chunked(speech, resume_from):
+            # Long recording: decode windows in parallel across processes
+            transcribe_chunked(
+                speech, on_segment=save_segment, resume_from=resume_from, start_index=start_index, tier=tier
+            )
+        else:
+            transcribe_audio(
+                audio_memory.audio_file.path,
+                on_segment=save_segment,
+                resume_from=resume_from,
+                start_index=start_index,
+                speech=speech,
+                tier=tier
+            )
+
+    if speech is not None:
+        # Assume silence would have decoded at the rate measured on the speech
+        rate = (time.time() - start_time) / voiced
+        record_speech_stats(job_id, speech, skipped * rate)
+        log.info('silence_skipped', audio_id=audio_memory.id, seconds_saved=round(skipped * rate, 1))
+    return " ".join(parts).strip()
+
+
+def transcribe_batch(jobs):
+    """
+    Transcribe the short recordings of several claimed jobs in one batched
+    Whisper call (see audio.batched).
+
+    Recordings that are long, silent, partly transcribed or fail the VAD are
+    left alone; long ones are recognized from their file (batched.may_batch)
+    and never decoded here. The others get their segments, transcript and tier saved and
+    are marked transcribed, so process_audio_in_background only analyzes
+    them. Nothing is saved if the batched call fails.
+
+    Returns:
+        Ids of the AudioMemory rows transcribed
+    """
+    from .models import AudioMemory, TranscriptSegment
+    from .batched import is_batchable, may_batch, transcribe_clips
+    from .jobs import job_queue
+
+    job_ids = {job.audio_memory_id: job.id for job in jobs}
+    pending = AudioMemory.objects.filter(
+        id__in=job_ids, transcription_complete=False, segments__isnull=True
+    ).order_by('id')
+
+    members = []
+    for audio_memory in pending:
+        try:
+            if not may_batch(audio_memory.audio_file.path):
+                continue
+            speech = detect_speech(audio_memory.audio_file.path)
+        except Exception as e:
+            log.warning('vad_failed', audio_id=audio_memory.id, error=str(e))
+            continue
+        if is_batchable(speech):
+            members.append((audio_memory, speech))
+    if len(members) < 2:
+        return []
+
+    speeches = [speech for _, speech in members]
+    tier = choose_tier(job_queue.backlog(), max(speech.speech_seconds for speech in speeches))
+    log.info('batch_started', clips=len(members), tier=tier.name,
+             voiced_seconds=round(sum(speech.speech_seconds for speech in speeches), 1))
+    start_time = time.time()
+    with STAGE_SECONDS.time(stage='transcribe'):
+        results = transcribe_clips(speeches, tier)
+    TRANSCRIPTIONS.inc(len(members), tier=tier.name)
+
+    for (audio_memory, speech), segments in zip(members, results):
+        text = " ".join(segment_text for _, _, segment_text in segments).strip() or "[No speech detected]"
+        with transaction.atomic():
+            TranscriptSegment.objects.bulk_create([
+                TranscriptSegment(audio_memory=audio_memory, index=index, start=start, end=end, text=segment_text)
+                for index, (start, end, segment_text) in enumerate(segments)
+            ])
+            AudioMemory.objects.filter(id=audio_memory.id).update(
+                transcription=text, transcription_complete=True, transcription_tier=tier.name,
+                updated_at=timezone.now()
+            )
+        record_speech_stats(job_ids[audio_memory.id], speech, None)
+    log.info('batch_finished', clips=len(members), seconds=round(time.time() - start_time, 2))
+    return [audio_memory.id for audio_memory, _ in members]
+
+
+def process_audio_in_background(audio_memory_id, job_id=None):
+    """
+    Transcribe and analyze a single AudioMemory.
+
+    Runs on a worker thread of the job queue (see audio.jobs). Errors that
+    prevent processing are recorded on the row and re-raised so the queue
+    can decide whether to retry the job or give up. `job_id` is the
+    ProcessingJob that receives the VAD statistics.
+    """
+    from .models import AudioMemory  # Import here to avoid circular imports
+    
+    try:
+        # Get the audio memory object
+        audio_memory = AudioMemory.objects.get(id=audio_memory_id)
+        audio_memory.processing_error = None  # Clear errors left by a previous attempt
+        
+        # File path info
+        audio_path = audio_memory.audio_file.path
+        
+        # Verify file exists and is readable
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file does not exist at {audio_path}")
+            
+        if not os.access(audio_path, os.R_OK):
+            raise PermissionError(f"Cannot read audio file at {audio_path}")
+            
+        # Check file size
+        file_size = os.path.getsize(audio_path)
+        log.info('processing_started', audio_id=audio_memory_id, job_id=job_id, path=audio_path, size_bytes=file_size)
+        
+        if file_size == 0:
+            raise ValueError("Audio file is empty (0 bytes)")
+            
+        # Transcription begins
+        publish_status(audio_memory.user_id, audio_memory.id, STAGE_TRANSCRIBING)
+        start_time = time.time()
+        text = ""
+        
+        try:
+            if audio_memory.transcription_complete:
+                # Transcribed by an earlier attempt, only the analysis is left
+                text = audio_memory.transcription
+                log.info('whisper_skipped', audio_id=audio_memory_id, reason='already transcribed')
+            else:
+                text = transcribe_with_checkpoints(audio_memory, job_id=job_id)
+            
+            if not text or text.strip() == "":
+                log.warning('empty_transcription', audio_id=audio_memory_id)
+                text = "[No speech detected]"
+            
+            # Store the transcription
+            audio_memory.transcription = text
+            audio_memory.transcription_complete = True
+            audio_memory.save(update_fields=['transcription', 'transcription_complete', 'updated_at'])
+            log.info(
+                'transcription_saved',
+                audio_id=audio_memory_id,
+                seconds=round(time.time() - start_time, 2),
+                characters=len(text)
+            )
+            
+        except Exception as e:
+            error_msg = f"Transcription failed: {str(e)}"
+            log.exception('transcription_failed', audio_id=audio_memory_id, error=str(e))
+            
+            # Save error but continue with analysis if we can; only this field
+            # is written so the partial transcript saved per segment survives
+            audio_memory.processing_error = error_msg
+            audio_memory.save(update_fields=['processing_error', 'updated_at'])
+            
+            # If we can't continue, re-raise
+            if not text:
+                raise
+        
+        # Comprehensive analysis begins
+        publish_status(audio_memory.user_id, audio_memory.id, STAGE_ANALYZING)
+        start_time = time.time()
+        
+        try:
+            # Get comprehensive analysis
+            analysis_results = analyze_text_comprehensive(text)
+            
+            # Store all analysis results
+            apply_analysis(audio_memory, analysis_results)
+            if getattr(settings, 'AUDIO_SENTIMENT_SERIES', True):
+                apply_sentiment_series(audio_memory, text)
+            log.info('analysis_finished', audio_id=audio_memory_id, seconds=round(time.time() - start_time, 2))
+            
+        except Exception as e:
+            error_msg = f"Analysis failed: {str(e)}"
+            log.exception('analysis_failed', audio_id=audio_memory_id, error=str(e))
+            
+            # If there's already an error, append to it
+            if audio_memory.processing_error:
+                audio_memory.processing_error += f"; {error_msg}"
+            else:
+                audio_memory.processing_error = error_msg
+        
+        # Update processing status - mark as complete even if we had partial errors
+        audio_memory.processing_complete = True
+        
+        # Save changes
+        with STAGE_SECONDS.time(stage='db_save'):
+            audio_memory.save()
+        publish_status(
+            audio_memory.user_id, audio_memory.id, STAGE_DONE,
+            sentiment_label=audio_memory.sentiment_label,
+            error=audio_memory.processing_error
+        )
+        
+        log.info('processing_finished', audio_id=audio_memory_id, error=audio_memory.processing_error)
+        
+    except Exception as e:
+        log.exception('processing_failed', audio_id=audio_memory_id, error_type=type(e).__name__, error=str(e))
+        
+        # Try to record the error in the database; the job queue decides
+        # whether this attempt is retried or the row is marked complete
+        try:
+            AudioMemory.objects.filter(id=audio_memory_id).update(
+                processing_error=f"{type(e).__name__}: {str(e)}",
+                updated_at=timezone.now()
+            )
+        except Exception as db_error:
+            log.error('error_status_not_saved', audio_id=audio_memory_id, error=str(db_error))
+
+        raise
+
+
+def upgrade_transcription(audio_memory_id, job_id=None):
+    """
+    Transcribe a finished AudioMemory again at the maximum Whisper tier.
+
+    Run by the job queue while it is idle, for memories transcribed at a
+    cheaper tier under load. The new segments are collected in memory and
+    replace the old transcript and its analysis in one transaction, so
+    clients never see a partial transcript. Memories already at the maximum
+    tier are left alone.
+    """
+    from .models import AudioMemory, TranscriptSegment
+
+    audio_memory = AudioMemory.objects.get(id=audio_memory_id)
+    tier = max_tier()
+    if audio_memory.transcription_tier and get_tier(audio_memory.transcription_tier).rank >= tier.rank:
+        log.info('upgrade_skipped', audio_id=audio_memory_id, tier=audio_memory.transcription_tier)
+        return
+
+    audio_path = audio_memory.audio_file.path
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"Audio file does not exist at {audio_path}")
+
+    try:
+        speech = detect_speech(audio_path)
+    except Exception as e:
+        log.warning('vad_failed', audio_id=audio_memory_id, error=str(e))
+        speech = None
+
+    segments = []
+
+    def collect_segment(index, start, end, segment_text):
+        segments.append(TranscriptSegment(
+            audio_memory=audio_memory, index=index, start=start, end=end, text=segment_text
+        ))
+
+    log.info('upgrade_started', audio_id=audio_memory_id, job_id=job_id,
+             from_tier=audio_memory.transcription_tier, tier=tier.name)
+    start_time = time.time()
+    if speech is None or speech.speech_seconds:
+        TRANSCRIPTIONS.inc(tier=tier.name)
+        with STAGE_SECONDS.time(stage='transcribe'):
+            if should_use_chunked(speech):
+                transcribe_chunked(speech, on_segment=collect_segment, tier=tier)
+            else:
+                transcribe_audio(audio_path, on_segment=collect_segment, speech=speech, tier=tier)
+
+    text = " ".join(segment.text for segment in segments).strip() or "[No speech detected]"
+    apply_analysis(audio_memory, analyze_text_comprehensive(text))
+    if getattr(settings, 'AUDIO_SENTIMENT_SERIES', True):
+        apply_sentiment_series(audio_memory, text)
+    audio_memory.transcription = text
+    audio_memory.transcription_tier = tier.name
+
+    with STAGE_SECONDS.time(stage='db_save'), transaction.atomic():
+        TranscriptSegment.objects.filter(audio_memory=audio_memory).delete()
+        TranscriptSegment.objects.bulk_create(segments)
+        audio_memory.save(update_fields=[
+            'transcription', 'transcription_tier', 'updated_at', *SERIES_FIELDS,
+            *(field for field, _ in ANALYSIS_FIELDS)
+        ])
+    publish_status(
+        audio_memory.user_id, audio_memory.id, STAGE_DONE,
+        sentiment_label=audio_memory.sentiment_label, tier=tier.name
+    )
+    log.info('upgrade_finished', audio_id=audio_memory_id, tier=tier.name, seconds=round(time.time() - start_time, 2))
@@ -1,3 +1,741 @@
-from django.test import TestCase
+import copy
+import datetime
+import functools
+import hashlib
+import json
+import random
+import re
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+import wave
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from django.utils import timezone
+from users.models import UserProfile
+from .models import AnalysisCacheEntry, AudioMemory, ProcessingJob, UploadIdempotencyKey, UploadSession
+from .jobs import JobQueue, QueueFull
+from .uploads import IdempotencyConflict, claim_idempotency_key, find_duplicate, release_idempotency_key
+from . import chunked, listing, resumable
+from .batched import SAMPLING_RATE, may_batch, pack_clips, plan_chunks, split_segments
+from .model_backends import DISTILBERT_MODEL
+from .vad import SpeechRegions
+from .whisper_policy import TIERS, TIER_ACCURATE, TIER_FAST, TIER_STANDARD, choose_tier, get_tier, upgradable_tiers
+from .management.commands.bench_inference import SAMPLE_TEXTS, parity, run_backend
+from .management.commands.reanalyze import Command
+from .tasks import ANALYSIS_FIELDS
+from .management.commands.bench_lexicon import CATEGORIES, FILLER_WORDS, legacy_scan, lexicon_scan
+from .audio_processing import CONCERN_KEYWORDS, scan_keywords
+from .lexicon import Lexicon
+from .analysis_cache import AnalysisCache, analysis_cache, cached_analysis, text_hash
 
-# Create your tests here.
+
+def make_user():
+    return UserProfile.objects.create(firebase_uid='uid', email='user@example.com', name='User', age=70, gender='f')
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+
+    def test_in_flight_key_conflicts(self):
+        claim_idempotency_key(self.user, 'key')
+        with self.assertRaises(IdempotencyConflict):
+            claim_idempotency_key(self.user, 'key')
+
+    def test_released_key_can_be_claimed_again(self):
+        record = claim_idempotency_key(self.user, 'key')
+        release_idempotency_key(record)
+        self.assertIsNone(claim_idempotency_key(self.user, 'key').response_status)
+
+    @override_settings(IDEMPOTENCY_IN_FLIGHT_TIMEOUT=60)
+    def test_abandoned_in_flight_key_is_reclaimed(self):
+        record = claim_idempotency_key(self.user, 'key')
+        UploadIdempotencyKey.objects.filter(id=record.id).update(
+            created_at=timezone.now() - datetime.timedelta(seconds=120)
+        )
+        self.assertNotEqual(claim_idempotency_key(self.user, 'key').id, record.id)
+
+    @override_settings(IDEMPOTENCY_IN_FLIGHT_TIMEOUT=60)
+    def test_finished_key_is_replayed_after_in_flight_timeout(self):
+        record = claim_idempotency_key(self.user, 'key')
+        UploadIdempotencyKey.objects.filter(id=record.id).update(
+            response_status=202,
+            response_body={'id': None},
+            created_at=timezone.now() - datetime.timedelta(seconds=120)
+        )
+        self.assertEqual(claim_idempotency_key(self.user, 'key').response_status, 202)
+
+
+class AnalysisCacheTests(TestCase):
+    RESULT = {'label': 'NEGATIVE', 'concerns': ['fell'], 'scores': {'compound': -0.4}}
+
+    def test_result_is_shared_through_the_database(self):
+        AnalysisCache().set('comprehensive', 'abc', self.RESULT)
+
+        other_process = AnalysisCache()
+        self.assertEqual(other_process.get('comprehensive', 'abc'), self.RESULT)
+        self.assertIsNone(other_process.get('detailed', 'abc'))
+        self.assertEqual(AnalysisCacheEntry.objects.get().hits, 1)
+
+        # Now served from its LRU
+        other_process.get('comprehensive', 'abc')
+        self.assertEqual(AnalysisCacheEntry.objects.get().hits, 1)
+        self.assertEqual((other_process.hits, other_process.misses), (2, 1))
+
+    @override_settings(AUDIO_ANALYSIS_CACHE_SIZE=2, AUDIO_ANALYSIS_CACHE_PERSIST=False)
+    def test_lru_keeps_the_most_recently_used(self):
+        cache = AnalysisCache()
+        for digest in ('a', 'b'):
+            cache.set('comprehensive', digest, {'digest': digest})
+        cache.get('comprehensive', 'a')
+        cache.set('comprehensive', 'c', {'digest': 'c'})
+
+        self.assertIsNone(cache.get('comprehensive', 'b'))
+        self.assertEqual(cache.get('comprehensive', 'a'), {'digest': 'a'})
+        self.assertFalse(AnalysisCacheEntry.objects.exists())
+
+    def test_new_version_ignores_and_purges_old_entries(self):
+        AnalysisCache(version=1).set('comprehensive', 'abc', self.RESULT)
+
+        current = AnalysisCache(version=2)
+        self.assertIsNone(current.get('comprehensive', 'abc'))
+        current.set('comprehensive', 'def', self.RESULT)
+        self.assertEqual(list(AnalysisCacheEntry.objects.values_list('analyzer_version', 'text_hash')), [(2, 'def')])
+
+    def test_returned_results_are_independent_copies(self):
+        cache = AnalysisCache()
+        stored = copy.deepcopy(self.RESULT)
+        cache.set('comprehensive', 'abc', stored)
+        stored['concerns'].append('changed after set')
+
+        first = cache.get('comprehensive', 'abc')
+        first['concerns'].append('wandering')
+        first['scores']['compound'] = 1.0
+        self.assertEqual(cache.get('comprehensive', 'abc'), self.RESULT)
+
+        cache.clear()
+        from_database = cache.get('comprehensive', 'abc')
+        from_database['concerns'].clear()
+        self.assertEqual(cache.get('comprehensive', 'abc'), self.RESULT)
+
+    def test_decorator_analyzes_normalized_text_once(self):
+        analysis_cache.clear()
+        self.addCleanup(analysis_cache.clear)
+        calls = []
+
+        @cached_analysis('test')
+        def analyze(text):
+            calls.append(text)
+            return {'length': len(text)}
+
+        self.assertEqual(analyze("I took  my pills"), {'length': 16})
+        self.assertEqual(analyze("I took my pills\n"), {'length': 16})
+        self.assertEqual(calls, ["I took  my pills"])
+        self.assertEqual(text_hash("I took  my pills"), text_hash(" I took my pills"))
+
+
+class JobQueueTests(TestCase):
+    """A JobQueue without worker threads; jobs are claimed and failed by hand."""
+
+    def setUp(self):
+        self.user = make_user()
+        self.queue = JobQueue()
+        patcher = mock.patch('audio.jobs.publish_status')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def job(self, delay=0, kind=ProcessingJob.KIND_PROCESS, **fields):
+        memory = AudioMemory.objects.create(user=self.user, audio_file='a.wav')
+        return ProcessingJob.objects.create(
+            audio_memory=memory, kind=kind, available_at=timezone.now() + datetime.timedelta(seconds=delay), **fields
+        )
+
+    def test_claim_oldest_due_job_once(self):
+        first, second = self.job(), self.job()
+        self.job(delay=60)
+
+        [claimed] = self.queue._claim(1)
+        self.assertEqual(claimed.id, first.id)
+        self.assertEqual((claimed.status, claimed.attempts), (ProcessingJob.STATUS_RUNNING, 1))
+        self.assertEqual([job.id for job in self.queue._claim(5)], [second.id])
+        self.assertEqual(self.queue._claim(5), [])
+
+    def test_job_claimed_by_another_worker_is_skipped(self):
+        taken, free = self.job(), self.job()
+
+        def other_worker_claims_first(audio_file):
+            ProcessingJob.objects.filter(id=taken.id).update(status=ProcessingJob.STATUS_RUNNING)
+            return True
+
+        claimed = self.queue._claim(2, accept=other_worker_claims_first)
+        self.assertEqual([job.id for job in claimed], [free.id])
+
+    @override_settings(AUDIO_JOB_MAX_BACKLOG=2, AUDIO_JOB_WORKERS=1)
+    def test_admission_rejected_when_backlog_is_full(self):
+        self.job()
+        self.job(kind=ProcessingJob.KIND_UPGRADE)  # Idle-time work doesn't count
+        self.queue.check_admission()
+
+        running = self.job()
+        ProcessingJob.objects.filter(id=running.id).update(status=ProcessingJob.STATUS_RUNNING)
+        now = timezone.now()
+        self.job(status=ProcessingJob.STATUS_DONE, started_at=now - datetime.timedelta(seconds=20), finished_at=now)
+        with self.assertRaises(QueueFull) as raised:
+            self.queue.check_admission()
+        self.assertEqual(raised.exception.backlog, 2)
+        self.assertEqual(raised.exception.retry_after, 20)  # One job to drain at the recent job duration
+
+    @override_settings(AUDIO_JOB_MAX_ATTEMPTS=3, AUDIO_JOB_RETRY_BACKOFF=30)
+    def test_failures_back_off_exponentially_then_fail(self):
+        job = self.job()
+        for attempt, delay in ((1, 30), (2, 60)):
+            [job] = self.queue._claim(1)
+            self.assertEqual(job.attempts, attempt)
+            before = timezone.now()
+            self.queue._handle_failure(job, RuntimeError("decoder crashed"))
+            job.refresh_from_db()
+            self.assertEqual(job.status, ProcessingJob.STATUS_QUEUED)
+            self.assertAlmostEqual((job.available_at - before).total_seconds(), delay, delta=1)
+            self.assertEqual(job.last_error, "RuntimeError: decoder crashed")
+            ProcessingJob.objects.filter(id=job.id).update(available_at=timezone.now())
+
+        [job] = self.queue._claim(1)
+        self.queue._handle_failure(job, RuntimeError("decoder crashed"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
+        memory = job.audio_memory
+        self.assertTrue(memory.processing_complete)
+        self.assertEqual(memory.processing_error, "RuntimeError: decoder crashed")
+
+    def test_recover_requeues_interrupted_jobs(self):
+        interrupted = self.job(status=ProcessingJob.STATUS_RUNNING, attempts=1)
+        orphan = AudioMemory.objects.create(user=self.user, audio_file='b.wav')
+        AudioMemory.objects.create(user=self.user, audio_file='c.wav', processing_complete=True)
+
+        self.queue.recover()
+        interrupted.refresh_from_db()
+        self.assertEqual(interrupted.status, ProcessingJob.STATUS_QUEUED)
+        self.assertEqual(
+            list(ProcessingJob.objects.exclude(id=interrupted.id).values_list('audio_memory_id', 'status')),
+            [(orphan.id, ProcessingJob.STATUS_QUEUED)]
+        )
+
+
+class ReanalyzeCommandTests(TestCase):
+    """manage.py reanalyze in-process, with the analyzers replaced by a fixed result."""
+
+    def setUp(self):
+        self.user = make_user()
+        checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(checkpoint_dir.cleanup)
+        self.checkpoint = os.path.join(checkpoint_dir.name, 'checkpoint.json')
+
+        result = {key: 'updated' for _, key in ANALYSIS_FIELDS}
+        result['sentiment_score'] = 0.25
+        patcher = mock.patch(
+            'audio.management.commands.reanalyze.analyze_texts',
+            side_effect=lambda texts, with_series: [result for _ in texts]
+        )
+        self.analyze_texts = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def memory(self, job_status=None):
+        memory = AudioMemory.objects.create(
+            user=self.user, audio_file='a.wav', transcription="I took my pills", processing_complete=True
+        )
+        if job_status:
+            ProcessingJob.objects.create(audio_memory=memory, status=job_status, available_at=timezone.now())
+        return memory
+
+    def reanalyze(self, **options):
+        call_command('reanalyze', workers=0, skip_series=True, stdout=io.StringIO(), **options)
+
+    def test_memories_with_unfinished_jobs_are_skipped(self):
+        done = self.memory(job_status=ProcessingJob.STATUS_DONE)
+        queued = self.memory(job_status=ProcessingJob.STATUS_QUEUED)
+        running = self.memory(job_status=ProcessingJob.STATUS_RUNNING)
+        unprocessed = self.memory()
+
+        with self.settings(AUDIO_REANALYZE_CHECKPOINT=self.checkpoint):
+            self.reanalyze()
+
+        labels = dict(AudioMemory.objects.values_list('id', 'sentiment_label'))
+        self.assertEqual(labels, {done.id: 'updated', queued.id: None, running.id: None, unprocessed.id: 'updated'})
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_checkpoint_location_comes_from_the_setting(self):
+        self.memory()
+        written = []
+        write = Command._write_checkpoint
+
+        def record(command, options, last_id, processed):
+            write(command, options, last_id, processed)
+            written.append(options['checkpoint'])
+            self.assertTrue(os.path.exists(self.checkpoint))
+
+        with self.settings(AUDIO_REANALYZE_CHECKPOINT=self.checkpoint), \
+                mock.patch.object(Command, '_write_checkpoint', record):
+            self.reanalyze()
+        self.assertEqual(written, [self.checkpoint])
+
+    def test_resumes_after_the_checkpoint(self):
+        first, second = self.memory(), self.memory()
+        with open(self.checkpoint, 'w') as checkpoint_file:
+            json.dump({'last_id': first.id, 'processed': 1, 'user': None, 'retranscribe': False}, checkpoint_file)
+
+        self.reanalyze(checkpoint=self.checkpoint)
+
+        labels = dict(AudioMemory.objects.values_list('id', 'sentiment_label'))
+        self.assertEqual(labels, {first.id: None, second.id: 'updated'})
+
+    def test_retranscribe_skips_a_memory_queued_meanwhile(self):
+        memory = self.memory()
+        ProcessingJob.objects.create(audio_memory=memory, available_at=timezone.now())
+        command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+        with mock.patch('audio.management.commands.reanalyze.transcribe_with_checkpoints') as transcribe, \
+                mock.patch('os.path.exists', return_value=True):
+            self.assertFalse(command._retranscribe(memory))
+        transcribe.assert_not_called()
+
+
+class FindDuplicateTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+
+    def memory(self, **fields):
+        return AudioMemory.objects.create(user=self.user, audio_file='a.wav', content_sha256='abc', **fields)
+
+    def test_earliest_memory_with_the_same_content(self):
+        first = self.memory(processing_complete=True)
+        self.memory()
+        self.assertEqual(find_duplicate(self.user, 'abc'), first)
+        self.assertIsNone(find_duplicate(self.user, 'other'))
+        self.assertIsNone(find_duplicate(self.user, None))
+
+    def test_failed_memory_is_not_reused(self):
+        self.memory(processing_complete=True, processing_error="Transcription failed: boom")
+        self.assertIsNone(find_duplicate(self.user, 'abc'))
+        retry = self.memory(processing_error='')
+        self.assertEqual(find_duplicate(self.user, 'abc'), retry)
+
+
+class ApiTestCase(TestCase):
+    """Requests as a registered user; the Firebase lookup of firebase_auth_required is patched out."""
+
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient(HTTP_AUTHORIZATION=self.user.firebase_uid)
+        patcher = mock.patch('users.authentication.auth.get_user')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class UploadSessionViewTests(ApiTestCase):
+    def test_create_session(self):
+        response = self.client.post('/api/audio/memories/uploads/', {'filename': 'talk.wav', 'size': 100}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['offset'], 0)
+        session = UploadSession.objects.get(id=response.data['upload_id'])
+        self.assertEqual((session.user, session.filename, session.total_size), (self.user, 'talk.wav', 100))
+
+    def test_create_session_requires_filename(self):
+        response = self.client.post('/api/audio/memories/uploads/', {'size': 100}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+
+class ResumableUploadTests(ApiTestCase):
+    """Create → PUT ranges → finalize against a temporary MEDIA_ROOT; jobs are persisted but not run."""
+
+    WAV = b'RIFF\x24\x00\x00\x00WAVE' + bytes(range(20))
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = self.settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        for target in ('audio.jobs.publish_status', 'audio.jobs.JobQueue.start'):
+            patcher = mock.patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create(self, size=None):
+        data = {'filename': 'talk.wav'}
+        if size is not None:
+            data['size'] = size
+        response = self.client.post('/api/audio/memories/uploads/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['upload_id']
+
+    def put(self, upload_id, first, data, total='*'):
+        return self.client.put(
+            f'/api/audio/memories/uploads/{upload_id}/', data=data, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {first}-{first + len(data) - 1}/{total}'
+        )
+
+    def finalize(self, upload_id, **data):
+        return self.client.post(f'/api/audio/memories/uploads/{upload_id}/finalize/', data, format='json')
+
+    def test_upload_in_ranges(self):
+        upload_id = self.create(size=len(self.WAV))
+        response = self.put(upload_id, 0, self.WAV[:10], total=len(self.WAV))
+        self.assertEqual((response.status_code, response.data['offset'], response.data['complete']), (200, 10, False))
+        response = self.put(upload_id, 10, self.WAV[10:], total=len(self.WAV))
+        self.assertEqual((response.data['offset'], response.data['format'], response.data['complete']), (32, 'wav', True))
+
+        sha256 = hashlib.sha256(self.WAV).hexdigest()
+        response = self.finalize(upload_id, sha256=sha256)
+        self.assertEqual(response.status_code, 202)
+        memory = AudioMemory.objects.get(id=response.data['id'])
+        self.assertEqual(memory.content_sha256, sha256)
+        with memory.audio_file.open('rb') as audio_file:
+            self.assertEqual(audio_file.read(), self.WAV)
+        self.assertTrue(ProcessingJob.objects.filter(audio_memory=memory).exists())
+        self.assertFalse(os.path.exists(resumable.part_path(UploadSession.objects.get(id=upload_id))))
+
+        # Finalizing again returns the same memory
+        self.assertEqual(self.finalize(upload_id).data['id'], memory.id)
+
+    def test_range_must_continue_at_the_offset(self):
+        upload_id = self.create()
+        response = self.put(upload_id, 10, self.WAV[10:])
+        self.assertEqual((response.status_code, response.data['offset']), (416, 0))
+        self.assertEqual(UploadSession.objects.get(id=upload_id).received_bytes, 0)
+
+    def test_resent_range_is_rejected_without_corrupting_the_file(self):
+        upload_id = self.create()
+        self.put(upload_id, 0, self.WAV[:16])
+        response = self.put(upload_id, 0, self.WAV[:16])
+        self.assertEqual((response.status_code, response.data['offset']), (416, 16))
+
+        self.put(upload_id, 16, self.WAV[16:])
+        response = self.finalize(upload_id, sha256=hashlib.sha256(self.WAV).hexdigest())
+        self.assertEqual(response.status_code, 202)
+
+    def test_format_is_sniffed_across_short_ranges(self):
+        upload_id = self.create()
+        for first in range(0, 12, 4):
+            response = self.put(upload_id, first, self.WAV[first:first + 4])
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['format'], 'wav')
+
+    def test_unsupported_format_is_rejected_on_the_first_range(self):
+        upload_id = self.create()
+        response = self.put(upload_id, 0, b'%PDF-1.7 not audio')
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(UploadSession.objects.get(id=upload_id).received_bytes, 0)
+
+    def test_finalize_rejects_an_upload_too_short_to_sniff(self):
+        upload_id = self.create()
+        self.assertEqual(self.put(upload_id, 0, b'RIFF').status_code, 200)
+        self.assertEqual(self.finalize(upload_id).status_code, 415)
+        self.assertFalse(AudioMemory.objects.exists())
+
+    def test_finalize_rejects_incomplete_and_mismatched_uploads(self):
+        upload_id = self.create(size=len(self.WAV))
+        self.put(upload_id, 0, self.WAV[:16], total=len(self.WAV))
+        response = self.finalize(upload_id)
+        self.assertEqual((response.status_code, response.data['offset']), (409, 16))
+
+        self.put(upload_id, 16, self.WAV[16:], total=len(self.WAV))
+        self.assertEqual(self.finalize(upload_id, sha256='0' * 64).status_code, 400)
+        self.assertFalse(AudioMemory.objects.exists())
+
+
+class ContentRangeTests(SimpleTestCase):
+    def test_parse(self):
+        self.assertEqual(resumable.parse_content_range('bytes 0-1023/4096'), (0, 1023, 4096))
+        self.assertEqual(resumable.parse_content_range('bytes 1024-2047/*'), (1024, 2047, None))
+
+    def test_malformed(self):
+        for header in ('', 'bytes', 'bytes 0-1023', 'items 0-1/2', 'bytes 10-5/20', 'bytes 0-20/20', 'bytes -1-5/20'):
+            self.assertIsNone(resumable.parse_content_range(header), header)
+
+
+class AudioMemoryListTests(ApiTestCase):
+    def memory(self, **fields):
+        return AudioMemory.objects.create(user=self.user, audio_file='a.wav', processing_complete=True, **fields)
+
+    def test_sentiment_series_only_when_requested(self):
+        series = [{'text': "A long sentence of the transcript.", 'score': 0.4}]
+        memory = self.memory(transcription="A long sentence of the transcript.", sentiment_series=series,
+                             sentiment_summary={'mean': 0.4})
+
+        listed = self.client.get('/api/audio/memories/').data[0]
+        self.assertEqual(listed['id'], memory.id)
+        self.assertNotIn('sentiment_series', listed)
+        self.assertNotIn('sentiment_summary', listed)
+        self.assertEqual(listed['transcription'], memory.transcription)
+
+        requested = self.client.get('/api/audio/memories/', {'fields': 'sentiment_series'}).data[0]
+        self.assertEqual(requested, {'id': memory.id, 'sentiment_series': series})
+
+        detail = self.client.get(f'/api/audio/memories/{memory.id}/').data
+        self.assertEqual(detail['sentiment_summary'], {'mean': 0.4})
+
+    def test_keyset_pages_are_stable(self):
+        ids = [self.memory().id for _ in range(5)]
+        # Equal timestamps are ordered by id
+        AudioMemory.objects.filter(id__in=ids[:4]).update(timestamp=timezone.now() - datetime.timedelta(hours=1))
+
+        seen = []
+        params = {'limit': 2, 'fields': 'id'}
+        while True:
+            response = self.client.get('/api/audio/memories/', params).data
+            seen += [row['id'] for row in response['results']]
+            if len(seen) == 2:
+                self.memory()  # A new memory does not shift later pages
+            if not response['next_cursor']:
+                break
+            params['cursor'] = response['next_cursor']
+        self.assertEqual(seen, [ids[4], ids[3], ids[2], ids[1], ids[0]])
+
+    def test_invalid_parameters(self):
+        for params in ({'fields': 'id,secret'}, {'limit': 0}, {'limit': 201}, {'limit': 'ten'}, {'cursor': 'nope'}):
+            response = self.client.get('/api/audio/memories/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_parse_fields(self):
+        self.assertEqual(listing.parse_fields('timestamp, score'), ['id', 'timestamp', 'score'])
+        defaults = listing.parse_fields('')
+        self.assertIn('transcription', defaults)
+        self.assertFalse(set(defaults) & set(listing.OPT_IN_FIELDS))
+        with self.assertRaises(listing.InvalidListingParameter):
+            listing.parse_fields('id,password')
+
+    def test_etag_is_checked_before_rows_are_read(self):
+        self.memory()
+        etag = self.client.get('/api/audio/memories/')['ETag']
+
+        with mock.patch('audio.listing.represent') as represent:
+            response = self.client.get('/api/audio/memories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        represent.assert_not_called()
+
+        # Other parameters are another representation
+        self.assertNotEqual(self.client.get('/api/audio/memories/', {'fields': 'id'})['ETag'], etag)
+
+    def test_etag_changes_with_the_rows(self):
+        memory = self.memory()
+        etags = [self.client.get('/api/audio/memories/')['ETag']]
+
+        memory.sentiment_label = 'positive'
+        memory.save()
+        etags.append(self.client.get('/api/audio/memories/')['ETag'])
+
+        AudioMemory.objects.filter(id=memory.id).update(score=0.5, updated_at=timezone.now())
+        etags.append(self.client.get('/api/audio/memories/')['ETag'])
+
+        other = self.memory()
+        etags.append(self.client.get('/api/audio/memories/')['ETag'])
+        other.delete()
+        etags.append(self.client.get('/api/audio/memories/')['ETag'])
+
+        self.assertEqual(len(set(etags[:4])), 4)
+        self.assertEqual(etags[4], etags[2])
+
+
+class ExportViewTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient()
+
+    def export(self, since=None):
+        params = {'output': 'jsonl'}
+        if since is not None:
+            params['since'] = since
+        response = self.client.get('/api/audio/memories/export/', params)
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        return [row['id'] for row in rows], response['X-Export-Cursor']
+
+    def memory(self, complete=True):
+        return AudioMemory.objects.create(user=self.user, audio_file='a.wav', processing_complete=complete).id
+
+    def test_cursor_stops_before_unfinished_memories(self):
+        first = self.memory()
+        processing = self.memory(complete=False)
+        last = self.memory()
+        self.assertEqual(self.export(), ([first], str(first)))
+
+        # Nothing new is exported while the memory is still processing
+        self.assertEqual(self.export(since=first), ([], str(first)))
+
+        AudioMemory.objects.filter(id=processing).update(processing_complete=True, transcription="done")
+        self.assertEqual(self.export(since=first), ([processing, last], str(last)))
+        self.assertEqual(self.export(since=last), ([], str(last)))
+
+
+@override_settings(
+    AUDIO_WHISPER_FAST_BACKLOG=10, AUDIO_WHISPER_FAST_SECONDS=1800, AUDIO_WHISPER_ACCURATE_SECONDS=300,
+    AUDIO_WHISPER_MAX_TIER=TIER_ACCURATE
+)
+class WhisperPolicyTests(SimpleTestCase):
+    def test_long_backlog_is_fast(self):
+        self.assertEqual(choose_tier(10, 5).name, TIER_FAST)
+
+    def test_long_clip_with_others_waiting_is_fast(self):
+        self.assertEqual(choose_tier(2, 1800).name, TIER_FAST)
+        self.assertEqual(choose_tier(1, 1800).name, TIER_STANDARD)
+
+    def test_short_clip_on_idle_queue_is_accurate(self):
+        self.assertEqual(choose_tier(1, 300).name, TIER_ACCURATE)
+        self.assertEqual(choose_tier(1, None).name, TIER_ACCURATE)
+        self.assertEqual(choose_tier(2, 60).name, TIER_STANDARD)
+
+    def test_capped_at_max_tier(self):
+        with self.settings(AUDIO_WHISPER_MAX_TIER=TIER_STANDARD):
+            self.assertEqual(choose_tier(1, 60).name, TIER_STANDARD)
+            self.assertEqual(choose_tier(10, 60).name, TIER_FAST)
+            self.assertEqual(upgradable_tiers(), [TIER_FAST])
+        with self.settings(AUDIO_WHISPER_MAX_TIER='huge'):
+            with self.assertRaises(ValueError):
+                choose_tier(1, 60)
+
+    def test_unrecorded_tier_is_standard(self):
+        self.assertEqual(get_tier(None).name, TIER_STANDARD)
+
+
+class ChunkedTranscriptionTests(SimpleTestCase):
+    def test_windows_are_decoded_by_the_tier_model(self):
+        speech = SpeechRegions(np.zeros(SAMPLING_RATE * 10, np.float32), 10.0, [(1, 9)])
+        for tier in TIERS.values():
+            pool = mock.Mock()
+            pool.submit.return_value.result.return_value = [(1, 9, ' hello', [(1, 9, ' hello')])]
+            with mock.patch.object(chunked.registry, 'get', return_value=pool) as get:
+                self.assertEqual(chunked.transcribe_chunked(speech, tier=tier), 'hello')
+            self.assertEqual(pool.submit.call_args.args[-1], tier.decode_options())
+
+            # The registered loader starts worker processes holding the tier's model
+            loader = chunked.registry._entry(get.call_args.args[0]).loader
+            model_size = loader.args[0] if isinstance(loader, functools.partial) else chunked.WHISPER_MODEL_SIZE
+            self.assertEqual(model_size, tier.model_size)
+
+
+class BatchedTranscriptionTests(SimpleTestCase):
+    def test_plan_chunks_merges_and_splits_spans(self):
+        self.assertEqual(
+            plan_chunks([(0, 5), (6, 20), (25, 40), (41, 120)]),
+            [(0, 20), (25, 40), (41, 71), (71, 101), (101, 120)]
+        )
+        self.assertEqual(plan_chunks([]), [])
+
+    def test_pack_clips_and_split_segments(self):
+        first = SpeechRegions(np.zeros(SAMPLING_RATE * 12, np.float32), 12.0, [(1, 4), (6, 11)])
+        second = SpeechRegions(np.zeros(SAMPLING_RATE * 20, np.float32), 20.0, [(0.5, 19)])
+        audio, offsets, clip_timestamps = pack_clips([first, second])
+        self.assertEqual(len(audio), SAMPLING_RATE * 32)
+        self.assertEqual(offsets, [0.0, 12.0])
+        self.assertEqual(clip_timestamps, [
+            {'start': SAMPLING_RATE * 1, 'end': SAMPLING_RATE * 11},
+            {'start': SAMPLING_RATE * 12 + SAMPLING_RATE // 2, 'end': SAMPLING_RATE * 31},
+        ])
+
+        segments = split_segments([(1, 11, ' hi there'), (12.0, 12.5, ' '), (12.5, 31, ' second clip')], offsets)
+        self.assertEqual(segments, [[(1, 11, 'hi there')], [(0.5, 19, 'second clip')]])
+
+    @override_settings(AUDIO_WHISPER_BATCH_MAX_SECONDS=60)
+    def test_may_batch_reads_size_and_header(self):
+        with tempfile.TemporaryDirectory() as directory:
+            def wav_file(name, seconds, rate):
+                path = os.path.join(directory, name)
+                with wave.open(path, 'wb') as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(2)
+                    wav.setframerate(rate)
+                    wav.writeframes(b"\0\0" * int(seconds * rate))
+                return path
+
+            self.assertTrue(may_batch(wav_file('short.wav', 20, 16000)))
+            self.assertFalse(may_batch(wav_file('header.wav', 90, 8000)))  # Small file, long duration
+            self.assertFalse(may_batch(wav_file('large.wav', 400, 16000)))  # Over the size bound
+            self.assertFalse(may_batch(os.path.join(directory, 'missing.wav')))
+
+
+class LexiconParityTests(SimpleTestCase):
+    """The compiled lexicon against the per-keyword regexes it replaced."""
+
+    def transcripts(self, count, seed=0):
+        rng = random.Random(seed)
+        keywords = [keyword for keywords in CATEGORIES.values() for keyword in keywords]
+        # Keywords glued to word characters or punctuation test the word boundaries
+        tokens = keywords + FILLER_WORDS + [
+            keyword + suffix for keyword in keywords for suffix in ("s", "al", "_", "'s", "-", "2")
+        ] + ["un" + keyword for keyword in keywords]
+        for _ in range(count):
+            words = [rng.choice(tokens) for _ in range(rng.randint(0, 60))]
+            words = [word.upper() if rng.random() < 0.1 else word for word in words]
+            yield "".join(word + rng.choice([" ", " ", ", ", ". ", "!", "'", "\n"]) for word in words)
+
+    def test_categories_match_per_keyword_regexes(self):
+        for text in self.transcripts(500):
+            self.assertEqual(lexicon_scan(text), legacy_scan(text), text)
+
+    def test_concerns_match_alternation_regexes(self):
+        for text in self.transcripts(500, seed=1):
+            hits = scan_keywords(text)
+            for label, keywords in CONCERN_KEYWORDS.items():
+                expected = re.search(r'\b(' + '|'.join(keywords) + r')\b', text.lower()) is not None
+                self.assertEqual(hits.found(f"concern:{label}"), expected, (label, text))
+
+    def test_substring_mode_matches_in(self):
+        keywords = ["suicid", "kill", "kill myself", "end my life", "ill", "ache"]
+        lexicon = Lexicon({"all": keywords}, whole_words=False)
+        rng = random.Random(2)
+        for _ in range(500):
+            text = " ".join(rng.choice(keywords + ["suicidal", "skill", "headache", "my", "life"])
+                            for _ in range(rng.randint(0, 12)))
+            self.assertEqual(lexicon.scan(text).ordered("all"), [keyword for keyword in keywords if keyword in text])
+
+    def test_overlapping_keywords_are_all_reported(self):
+        hits = scan_keywords("I could not sleep last night.")
+        self.assertIn("last night", hits)
+        self.assertIn("night", hits)
+        self.assertEqual(hits.ordered("time"), ["night", "last night"])
+
+
+def installed(*modules):
+    return all(importlib.util.find_spec(module) is not None for module in modules)
+
+
+def weights_cached(model_name):
+    """Whether the model is in the Hugging Face cache, so tests never download it."""
+    if not installed('huggingface_hub'):
+        return False
+    from huggingface_hub import try_to_load_from_cache
+    return isinstance(try_to_load_from_cache(model_name, 'config.json'), str)
+
+
+@unittest.skipUnless(installed('transformers', 'torch'), "transformers and torch are not installed")
+@unittest.skipUnless(weights_cached(DISTILBERT_MODEL), f"{DISTILBERT_MODEL} is not in the Hugging Face cache")
+class InferenceBackendParityTests(SimpleTestCase):
+    """The quantized and ONNX DistilBERT backends against torch (see bench_inference)."""
+    reference = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reference = run_backend('distilbert', 'torch', SAMPLE_TEXTS, repeat=1, batch_size=len(SAMPLE_TEXTS))
+
+    def assert_parity(self, backend, min_agreement, max_delta):
+        result = run_backend('distilbert', backend, SAMPLE_TEXTS, repeat=1, batch_size=len(SAMPLE_TEXTS))
+        agreement, _, worst_delta = parity('distilbert', self.reference['outputs'], result['outputs'])
+        self.assertGreaterEqual(agreement, min_agreement)
+        self.assertLessEqual(worst_delta, max_delta)
+
+    def test_quantized_matches_torch(self):
+        # int8 weights: a borderline text may flip
+        self.assert_parity('quantized', min_agreement=1 - 1 / len(SAMPLE_TEXTS), max_delta=0.1)
+
+    @unittest.skipUnless(installed('optimum', 'onnxruntime'), "optimum[onnxruntime] is not installed")
+    def test_onnx_matches_torch(self):
+        self.assert_parity('onnx', min_agreement=1.0, max_delta=0.01)
@@ -0,0 +1,137 @@
+"""
+Upload deduplication and idempotent upload requests.
+
+Uploads are hashed with SHA-256 while Django streams them to disk, so a
+repeated upload of the same bytes by the same user can reuse the existing
+AudioMemory instead of running Whisper and the analysis again.
+
+Clients may also send an `Idempotency-Key` header; the first response for a
+key is stored and replayed for retries of the same request.
+"""
+import datetime
+import hashlib
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+DEFAULT_IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+DEFAULT_IDEMPOTENCY_IN_FLIGHT_TIMEOUT = 10 * 60
+
+
+class Sha256UploadHandler(FileUploadHandler):
+    """
+    Hashes every uploaded file chunk by chunk and passes the data on.
+
+    Must come before the handler that stores the file. The digests end up in
+    `request.upload_sha256`, keyed by form field name.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return raw_data  # Let the next handler write it to disk
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_sha256'):
+            self.request.upload_sha256 = {}
+        self.request.upload_sha256[self.field_name] = self.digest.hexdigest()
+        return None  # The next handler provides the file object
+
+
+def install_hashing_handler(request):
+    """Hash the files of this request; call before request.FILES or request.data is read."""
+    request.upload_handlers.insert(0, Sha256UploadHandler(request))
+
+
+def uploaded_sha256(request, field_name):
+    return getattr(request, 'upload_sha256', {}).get(field_name)
+
+
+def find_duplicate(user, content_sha256):
+    """
+    The user's earliest AudioMemory with the same content, or None.
+
+    Memories with a processing error are skipped, so uploading a recording
+    again after it failed processes it again instead of returning the failure.
+    """
+    from .models import AudioMemory
+
+    if not content_sha256:
+        return None
+    return (
+        AudioMemory.objects
+        .filter(user=user, content_sha256=content_sha256)
+        .filter(Q(processing_error__isnull=True) | Q(processing_error=''))
+        .order_by('id')
+        .first()
+    )
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a request with the same Idempotency-Key is still being processed."""
+
+
+def claim_idempotency_key(user, key):
+    """
+    Look up or reserve an Idempotency-Key.
+
+    Returns:
+        The stored UploadIdempotencyKey when the key has a finished response
+        to replay, or a new in-flight record to complete with
+        complete_idempotency_key() once the response is known
+
+    Raises:
+        IdempotencyConflict: If another request with this key is in flight
+    """
+    from .models import UploadIdempotencyKey
+
+    ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_IDEMPOTENCY_KEY_TTL)
+    in_flight_timeout = getattr(settings, 'IDEMPOTENCY_IN_FLIGHT_TIMEOUT', DEFAULT_IDEMPOTENCY_IN_FLIGHT_TIMEOUT)
+    now = timezone.now()
+    UploadIdempotencyKey.objects.filter(
+        user=user,
+        key=key,
+        created_at__lt=now - datetime.timedelta(seconds=ttl)
+    ).delete()
+    # In flight for longer than any upload takes: the process handling it died
+    UploadIdempotencyKey.objects.filter(
+        user=user,
+        key=key,
+        response_status__isnull=True,
+        created_at__lt=now - datetime.timedelta(seconds=in_flight_timeout)
+    ).delete()
+
+    try:
+        # Savepoint: a duplicate key must not break an enclosing transaction
+        with transaction.atomic():
+            return UploadIdempotencyKey.objects.create(user=user, key=key)
+    except IntegrityError:
+        record = UploadIdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None or record.response_status is None:
+            raise IdempotencyConflict(f"A request with Idempotency-Key '{key}' is already in progress")
+        return record
+
+
+def release_idempotency_key(record):
+    """Drop an in-flight key whose request failed, so the client can retry with it."""
+    if record is not None:
+        record.delete()
+
+
+def complete_idempotency_key(record, response):
+    """Store the response for replay, or release the key if the request failed."""
+    if record is None:
+        return
+    if response.status_code >= 400:
+        # Errors are not replayed, the client may retry with the same key
+        release_idempotency_key(record)
+        return
+    record.response_status = response.status_code
+    record.response_body = response.data
+    record.audio_memory_id = response.data.get('id')
+    record.save(update_fields=['response_status', 'response_body', 'audio_memory'])
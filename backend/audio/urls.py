@@ -1,8 +1,16 @@
 from django.urls import path
-from .views import AudioMemoryListCreateView, AudioMemoryDetailView, AudioMemoryExportView
+from .views import (
+    AudioMemoryListCreateView, AudioMemoryDetailView, AudioMemorySegmentsView, AudioMemoryExportView,
+    InferenceStatsView, UploadSessionCreateView, UploadSessionView, UploadSessionFinalizeView
+)
 
 urlpatterns =[
     path('memories/', AudioMemoryListCreateView.as_view(), name='audio_memory_list_create'),
     path('memories/<int:pk>/', AudioMemoryDetailView.as_view(), name='audio-memory-detail'),
+    path('memories/<int:pk>/segments/', AudioMemorySegmentsView.as_view(), name='audio-memory-segments'),
+    path('memories/uploads/', UploadSessionCreateView.as_view(), name='audio-upload-create'),
+    path('memories/uploads/<uuid:upload_id>/', UploadSessionView.as_view(), name='audio-upload-detail'),
+    path('memories/uploads/<uuid:upload_id>/finalize/', UploadSessionFinalizeView.as_view(), name='audio-upload-finalize'),
     path('memories/export/', AudioMemoryExportView.as_view(), name='audio-memory-export'),
+    path('inference/stats/', InferenceStatsView.as_view(), name='audio-inference-stats'),
 ]
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Voice activity detection pre-pass for transcription.
+
+Recordings from the mobile app are often mostly silence or background noise.
+Before Whisper runs, the file is decoded once and Silero VAD (bundled with
+faster-whisper) finds the regions that contain speech. Files without speech
+skip Whisper entirely; otherwise only the voiced spans are decoded.
+
+Settings (all optional):
+    AUDIO_VAD_ENABLED          run the pre-pass at all
+    AUDIO_VAD_THRESHOLD        speech probability above which a frame is voiced
+    AUDIO_VAD_MIN_SPEECH_MS    voiced regions shorter than this are dropped
+    AUDIO_VAD_MIN_SILENCE_MS   silences shorter than this do not split a region
+    AUDIO_VAD_SPEECH_PAD_MS    padding added around every voiced region
+"""
+from django.conf import settings
+from backend.structured_log import get_logger
+from .metrics import STAGE_SECONDS
+
+log = get_logger('audio.vad')
+
+SAMPLING_RATE = 16000
+
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_MIN_SPEECH_MS = 250
+DEFAULT_MIN_SILENCE_MS = 2000
+DEFAULT_SPEECH_PAD_MS = 400
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class SpeechRegions:
+    """
+    Voiced spans of a recording, in seconds from its start.
+
+    Attributes:
+        audio: Decoded 16 kHz mono samples, so Whisper does not decode the file again
+        duration: Length of the recording in seconds
+        spans: List of (start, end) tuples
+    """
+
+    def __init__(self, audio, duration, spans):
+        self.audio = audio
+        self.duration = duration
+        self.spans = spans
+
+    @property
+    def speech_seconds(self):
+        return sum(end - start for start, end in self.spans)
+
+    @property
+    def speech_ratio(self):
+        return self.speech_seconds / self.duration if self.duration else 0.0
+
+    @property
+    def has_speech(self):
+        return bool(self.spans)
+
+    def after(self, offset):
+        """Spans from `offset` seconds on, the first one trimmed to start there."""
+        return [(max(start, offset), end) for start, end in self.spans if end > offset]
+
+    def speech_seconds_after(self, offset):
+        return sum(end - start for start, end in self.after(offset))
+
+    def clip_timestamps(self, offset=0.0):
+        """Flattened [start, end, start, end, ...] list understood by Whisper's clip_timestamps."""
+        return [round(value, 2) for span in self.after(offset) for value in span]
+
+
+def detect_speech(file_path):
+    """
+    Decode a recording and find its voiced regions.
+
+    Returns:
+        SpeechRegions, or None when the pre-pass is disabled or faster-whisper
+        (which provides the decoder and the VAD model) is not installed
+    """
+    if not _setting('AUDIO_VAD_ENABLED', True):
+        return None
+
+    try:
+        from faster_whisper.audio import decode_audio
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+    except ImportError:
+        log.warning('vad_unavailable', reason='faster-whisper is not installed')
+        return None
+
+    with STAGE_SECONDS.time(stage='decode'):
+        audio = decode_audio(file_path, sampling_rate=SAMPLING_RATE)
+    options = VadOptions(
+        threshold=_setting('AUDIO_VAD_THRESHOLD', DEFAULT_THRESHOLD),
+        min_speech_duration_ms=_setting('AUDIO_VAD_MIN_SPEECH_MS', DEFAULT_MIN_SPEECH_MS),
+        min_silence_duration_ms=_setting('AUDIO_VAD_MIN_SILENCE_MS', DEFAULT_MIN_SILENCE_MS),
+        speech_pad_ms=_setting('AUDIO_VAD_SPEECH_PAD_MS', DEFAULT_SPEECH_PAD_MS)
+    )
+    with STAGE_SECONDS.time(stage='vad'):
+        timestamps = get_speech_timestamps(audio, options)
+
+    spans = [
+        (timestamp['start'] / SAMPLING_RATE, timestamp['end'] / SAMPLING_RATE)
+        for timestamp in timestamps
+    ]
+    return SpeechRegions(audio, len(audio) / SAMPLING_RATE, spans)
@@ -1,158 +1,51 @@
 from django.shortcuts import get_object_or_404
-from .models import AudioMemory
+from django.db.models import Max, Min
+from django.http import StreamingHttpResponse
+from django.utils.http import parse_etags
+from .models import AudioMemory, TranscriptSegment, UploadSession
 from users.models import UserProfile
-from .serializers import AudioMemorySerializer
+from .serializers import AudioMemorySerializer, TranscriptSegmentSerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
 from users.authentication import firebase_auth_required
-from .audio_processing import transcribe_audio, analyze_text_comprehensive
+from .jobs import job_queue, QueueFull
+from .inference import get_distilbert_broker
+from . import export, listing, resumable
+from .metrics import STAGE_SECONDS, UPLOADS, upload_result
+from .uploads import (
+    install_hashing_handler, uploaded_sha256, find_duplicate,
+    claim_idempotency_key, complete_idempotency_key, release_idempotency_key, IdempotencyConflict
+)
+from backend.structured_log import get_logger
 import os
 import logging
-import time
-import threading
 import datetime
-import traceback
 
 # Set up logging
 logger = logging.getLogger(__name__)
+log = get_logger('audio.uploads')
+export_log = get_logger('audio.export')
+
+
+def queue_full_response(error):
+    log.warning('upload_rejected', backlog=error.backlog, retry_after=error.retry_after)
+    return Response({
+        "error": "Audio processing queue is full, please retry later",
+        "retry_after": error.retry_after
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(error.retry_after)})
 
-def process_audio_in_background(audio_memory_id):
-    """
-    Process audio file in background thread
-    """
-    from .models import AudioMemory  # Import here to avoid circular imports
-    
-    try:
-        # Get the audio memory object
-        audio_memory = AudioMemory.objects.get(id=audio_memory_id)
-        
-        print("\n" + "="*50)
-        print(f"🎵 STARTING BACKGROUND PROCESSING FOR AUDIO #{audio_memory_id} 🎵")
-        print("="*50)
-        
-        # File path info
-        audio_path = audio_memory.audio_file.path
-        print(f"📁 Audio file path: {audio_path}")
-        
-        # Verify file exists and is readable
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Audio file does not exist at {audio_path}")
-            
-        if not os.access(audio_path, os.R_OK):
-            raise PermissionError(f"Cannot read audio file at {audio_path}")
-            
-        # Check file size
-        file_size = os.path.getsize(audio_path)
-        print(f"📊 File size: {file_size / 1024 / 1024:.2f} MB")
-        
-        if file_size == 0:
-            raise ValueError("Audio file is empty (0 bytes)")
-            
-        # Transcription begins
-        print("\n" + "-"*40)
-        print("🎤 STARTING TRANSCRIPTION PROCESS...")
-        print("-"*40)
-        start_time = time.time()
-        
-        try:
-            text = transcribe_audio(audio_path)
-            
-            if not text or text.strip() == "":
-                print("⚠️ Warning: Transcription returned empty text")
-                text = "[No speech detected]"
-                
-            transcription_time = time.time() - start_time
-            print(f"⏱️ Transcription completed in {transcription_time:.2f} seconds")
-            print(f"📝 Transcription result:\n{text}")
-            
-            # Store the transcription
-            audio_memory.transcription = text
-            print("💾 Transcription saved to model")
-            
-        except Exception as e:
-            error_msg = f"Transcription failed: {str(e)}"
-            print(f"❌ {error_msg}")
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            
-            # Save error but continue with analysis if we can
-            audio_memory.processing_error = error_msg
-            audio_memory.save()
-            
-            # If we can't continue, re-raise
-            if not text:
-                raise
-        
-        # Comprehensive analysis begins
-        print("\n" + "-"*40)
-        print("🔍 STARTING COMPREHENSIVE TEXT ANALYSIS...")
-        print("-"*40)
-        start_time = time.time()
-        
-        try:
-            # Get comprehensive analysis
-            analysis_results = analyze_text_comprehensive(text)
-            
-            analysis_time = time.time() - start_time
-            print(f"⏱️ Analysis completed in {analysis_time:.2f} seconds")
-            
-            # Store all analysis results
-            audio_memory.score = round(analysis_results['sentiment_score'], 4)
-            audio_memory.sentiment_label = analysis_results['sentiment_label']
-            audio_memory.memory_references = analysis_results['memory_references']
-            audio_memory.routine_references = analysis_results['routine_references']
-            audio_memory.time_indicators = analysis_results['time_indicators']
-            audio_memory.location_indicators = analysis_results['location_indicators']
-            audio_memory.severity_indicators = analysis_results['severity_indicators']
-            audio_memory.potential_concerns = analysis_results['potential_concerns']
-            
-            # Print analysis results
-            print(f"📊 Sentiment score: {audio_memory.score}")
-            print(f"🏷️ Sentiment label: {audio_memory.sentiment_label}")
-            print(f"🧠 Memory references: {audio_memory.memory_references}")
-            print(f"⏰ Routine references: {audio_memory.routine_references}")
-            print(f"📅 Time indicators: {audio_memory.time_indicators}")
-            print(f"📍 Location indicators: {audio_memory.location_indicators}")
-            print(f"⚠️ Severity indicators: {audio_memory.severity_indicators}")
-            print(f"🚨 Potential concerns: {audio_memory.potential_concerns}")
-            
-        except Exception as e:
-            error_msg = f"Analysis failed: {str(e)}"
-            print(f"❌ {error_msg}")
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            
-            # If there's already an error, append to it
-            if audio_memory.processing_error:
-                audio_memory.processing_error += f"; {error_msg}"
-            else:
-                audio_memory.processing_error = error_msg
-        
-        # Update processing status - mark as complete even if we had partial errors
-        audio_memory.processing_complete = True
-        
-        # Save changes
-        print("💾 Saving final data to database...")
-        audio_memory.save()
-        
-        print("\n" + "="*50)
-        print(f"✅ AUDIO #{audio_memory_id} PROCESSED SUCCESSFULLY ✅")
-        print("="*50 + "\n")
-        
-    except Exception as e:
-        print(f"❌ ERROR PROCESSING AUDIO #{audio_memory_id}: {str(e)}")
-        print(f"❌ Error type: {type(e).__name__}")
-        print(f"❌ Traceback: {traceback.format_exc()}")
-        
-        # Try to update the status in the database
-        try:
-            audio_memory = AudioMemory.objects.get(id=audio_memory_id)
-            audio_memory.processing_error = f"{type(e).__name__}: {str(e)}"
-            audio_memory.processing_complete = True  # Mark as complete even with error
-            audio_memory.save()
-            print("💾 Error status saved to database")
-        except Exception as db_error:
-            print(f"❌ Could not update error status in database: {str(db_error)}")
+
+def duplicate_response(duplicate):
+    log.info('upload_duplicate', audio_id=duplicate.id)
+    return Response({
+        "id": duplicate.id,
+        "message": "Audio file already uploaded, returning the existing memory",
+        "status": "complete" if duplicate.processing_complete else "processing",
+        "duplicate": True
+    }, status=status.HTTP_200_OK if duplicate.processing_complete else status.HTTP_202_ACCEPTED)
 
 
 class AudioMemoryListCreateView(APIView):
@@ -160,15 +53,6 @@ class AudioMemoryListCreateView(APIView):
 
     # @firebase_auth_required  # Uncomment when ready for production
     def post(self, request, *args, **kwargs):
-        # Clear visual separators in console for easy tracking
-        print("\n" + "="*50)
-        print("🎵 RECEIVING AUDIO MEMORY REQUEST 🎵")
-        print("="*50)
-        
-        # Debug information
-        print(f"📝 Request received at: {time.strftime('%H:%M:%S')}")
-        print(f"📝 Content-Type: {request.headers.get('Content-Type')}")
-        
         # For testing only - remove in production
         user = UserProfile.objects.first()  # For testing; user will be the profile object
         request.user = user
@@ -177,10 +61,48 @@ class AudioMemoryListCreateView(APIView):
         
         # Real implementation
         # user = request.user
-        print(f"👤 Processing for user: {user}")
+        log.info('upload_received', user_id=user.id if user else None, content_type=request.headers.get('Content-Type'))
+        
+        # Retried requests with the same Idempotency-Key get the original response
+        idempotency = None
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            try:
+                idempotency = claim_idempotency_key(user, idempotency_key)
+            except IdempotencyConflict as e:
+                return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+            if idempotency.response_status is not None:
+                log.info('upload_replayed', idempotency_key=idempotency_key)
+                return Response(
+                    idempotency.response_body,
+                    status=idempotency.response_status,
+                    headers={"Idempotent-Replayed": "true"}
+                )
+        
+        try:
+            with STAGE_SECONDS.time(stage='upload'):
+                response = self.accept_upload(request, user)
+        except Exception:
+            # E.g. a truncated body or a storage error: the key must not stay in flight
+            release_idempotency_key(idempotency)
+            raise
+        UPLOADS.inc(result=upload_result(response))
+        complete_idempotency_key(idempotency, response)
+        return response
+
+    def accept_upload(self, request, user):
+        # Admission control: refuse new work while the processing backlog is full,
+        # before request.FILES is touched so the upload is never parsed
+        try:
+            job_queue.check_admission()
+        except QueueFull as e:
+            return queue_full_response(e)
+        
+        # Hash the upload while it streams to disk
+        install_hashing_handler(request)
         
         if 'audio_file' not in request.FILES:
-            print("❌ ERROR: No audio_file in request")
+            log.warning('upload_invalid', reason='no audio_file')
             return Response({"error": "No audio file provided"}, status=status.HTTP_400_BAD_REQUEST)
             
         # Basic validation of audio file
@@ -196,29 +118,25 @@ class AudioMemoryListCreateView(APIView):
                        'audio/webm', 'audio/ogg', 'audio/flac', 'audio/x-flac']
                        
         if content_type not in valid_types:
-            print(f"⚠️ Warning: Unexpected content type: {content_type}")
+            log.warning('unexpected_content_type', content_type=content_type)
+        
+        # Same bytes uploaded before by this user: reuse that transcription and analysis
+        content_sha256 = uploaded_sha256(request, 'audio_file')
+        duplicate = find_duplicate(user, content_sha256)
+        if duplicate is not None:
+            return duplicate_response(duplicate)
         
-        print("🔍 Validating request data...")
         serializer = AudioMemorySerializer(data=request.data)
         if serializer.is_valid():
-            print("✅ Serializer is valid")
-            print("💾 Saving audio file to database...")
-            
             try:
                 # Set initial processing status
-                audio_memory = serializer.save(user=user, processing_complete=False)
+                audio_memory = serializer.save(user=user, processing_complete=False, content_sha256=content_sha256)
                 
-                # Start background processing
-                print(f"🚀 Starting background processing for audio #{audio_memory.id}")
-                processing_thread = threading.Thread(
-                    target=process_audio_in_background,
-                    args=(audio_memory.id,)
-                )
-                processing_thread.daemon = True
-                processing_thread.start()
+                # Queue background processing on the worker pool
+                job = job_queue.enqueue(audio_memory)
+                log.info('upload_accepted', audio_id=audio_memory.id, job_id=job.id, size_bytes=audio_file.size)
                 
                 # Return immediately with the created object
-                print(f"✅ Audio file accepted, processing in background")
                 return Response({
                     "id": audio_memory.id,
                     "message": "Audio file accepted and processing has started",
@@ -226,22 +144,236 @@ class AudioMemoryListCreateView(APIView):
                 }, status=status.HTTP_202_ACCEPTED)
                 
             except Exception as e:
-                print(f"❌ Error initiating processing: {str(e)}")
+                log.exception('upload_failed', error=str(e))
                 return Response({
                     "error": "Failed to process audio file",
                     "details": str(e)
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
         else:
-            print(f"❌ Serializer errors: {serializer.errors}")
+            log.warning('upload_invalid', reason='serializer', errors=serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @firebase_auth_required
     def get(self, request, *args, **kwargs):
+        """
+        List the user's audio memories.
+
+        Query parameters:
+            fields: comma-separated fields to return, e.g. id,timestamp,sentiment_label;
+                sentiment_series and sentiment_summary are only returned when named here
+            limit: page size; with limit or cursor the response is
+                {"results": [...], "next_cursor": ...}, newest first, instead of a plain list
+            cursor: next_cursor of the previous page
+
+        Responses carry an ETag; an unchanged page with If-None-Match gets 304.
+        """
         user = request.user
         queryset = AudioMemory.objects.filter(user=user)
-        serializer = AudioMemorySerializer(queryset, many=True)
-        return Response(serializer.data)
+        params = request.query_params
+        
+        paged = 'limit' in params or 'cursor' in params
+        cursor = params.get('cursor')
+        try:
+            fields = listing.parse_fields(params.get('fields'))
+            limit = listing.parse_limit(params.get('limit')) if paged else None
+            if cursor:
+                listing.decode_cursor(cursor)
+        except listing.InvalidListingParameter as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Checked before any row is read
+        etag = listing.etag(queryset, fields, limit, cursor)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        if paged:
+            rows, next_cursor = listing.page(queryset, fields, limit, cursor)
+            data = {
+                "results": listing.represent(rows, fields),
+                "next_cursor": next_cursor
+            }
+        else:
+            data = listing.represent(queryset.values(*fields), fields)
+        return Response(data, headers={"ETag": etag})
+
+
+class UploadSessionCreateView(APIView):
+    @firebase_auth_required
+    def post(self, request, *args, **kwargs):
+        """
+        Start a resumable upload. Body: filename and, if known, size in bytes.
+        The file is then sent with PUT requests carrying a Content-Range header.
+        """
+        user = request.user
+        try:
+            job_queue.check_admission()
+        except QueueFull as e:
+            return queue_full_response(e)
+
+        filename = os.path.basename(request.data.get('filename') or '')
+        if not filename:
+            return Response({"error": "filename is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        total_size = request.data.get('size')
+        max_bytes = getattr(settings, 'AUDIO_UPLOAD_MAX_BYTES', resumable.DEFAULT_MAX_BYTES)
+        if total_size is not None:
+            try:
+                total_size = int(total_size)
+            except (TypeError, ValueError):
+                return Response({"error": "size must be a number of bytes"}, status=status.HTTP_400_BAD_REQUEST)
+            if total_size <= 0 or total_size > max_bytes:
+                return Response({"error": f"size must be between 1 and {max_bytes} bytes"}, status=status.HTTP_400_BAD_REQUEST)
+
+        resumable.purge_expired_sessions()
+        session = UploadSession.objects.create(user=user, filename=filename, total_size=total_size)
+        log.info('upload_session_started', upload_id=str(session.id), upload_filename=filename, total_size=total_size)
+        return Response({
+            "upload_id": str(session.id),
+            "offset": 0,
+            "chunk_size": getattr(settings, 'AUDIO_UPLOAD_CHUNK_BYTES', resumable.DEFAULT_CHUNK_BYTES),
+            "max_size": max_bytes
+        }, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    @firebase_auth_required
+    def get(self, request, upload_id, *args, **kwargs):
+        """Progress of an upload; a client resumes by sending bytes from `offset` on."""
+        session = get_object_or_404(UploadSession, id=upload_id, user=request.user)
+        return Response({
+            "upload_id": str(session.id),
+            "offset": session.received_bytes,
+            "size": session.total_size,
+            "format": session.detected_format,
+            "status": session.status,
+            "id": session.audio_memory_id
+        })
+
+    @firebase_auth_required
+    def put(self, request, upload_id, *args, **kwargs):
+        """
+        Append a byte range, sent as the raw request body with a header like
+        "Content-Range: bytes 0-5242879/73400320". The body is streamed to
+        disk, never parsed or held in memory.
+        """
+        session = get_object_or_404(UploadSession, id=upload_id, user=request.user)
+        if session.status != UploadSession.STATUS_UPLOADING:
+            return Response({"error": "Upload is already finalized"}, status=status.HTTP_409_CONFLICT)
+
+        content_range = resumable.parse_content_range(request.headers.get('Content-Range', ''))
+        if content_range is None:
+            return Response({
+                "error": "A Content-Range header like 'bytes 0-1023/4096' is required"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        first, last, total = content_range
+        if total is not None and session.total_size is not None and total != session.total_size:
+            return Response({
+                "error": f"Content-Range total {total} does not match the announced size {session.total_size}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        lock = resumable.session_lock(session)
+        if not lock.acquire(blocking=False):
+            return Response({"error": "Another range of this upload is being received"}, status=status.HTTP_409_CONFLICT)
+        try:
+            session.refresh_from_db()
+            offset = resumable.append_range(session, request.stream, first, last - first + 1)
+        except resumable.UploadRangeError as e:
+            return Response({"error": str(e), "offset": e.offset}, status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        except resumable.UnsupportedAudioFormat as e:
+            return Response({"error": str(e)}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        finally:
+            lock.release()
+
+        return Response({
+            "upload_id": str(session.id),
+            "offset": offset,
+            "format": session.detected_format,
+            "complete": session.total_size is not None and offset == session.total_size
+        })
+
+    @firebase_auth_required
+    def delete(self, request, upload_id, *args, **kwargs):
+        """Abandon an unfinished upload."""
+        session = get_object_or_404(UploadSession, id=upload_id, user=request.user)
+        if session.status == UploadSession.STATUS_UPLOADING:
+            resumable.discard(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionFinalizeView(APIView):
+    @firebase_auth_required
+    def post(self, request, upload_id, *args, **kwargs):
+        """
+        Turn a fully received upload into an AudioMemory and queue it for
+        processing. An optional `sha256` in the body is checked against the
+        received bytes. Finalizing again returns the same memory.
+        """
+        with STAGE_SECONDS.time(stage='upload'):
+            response = self.finalize(request, request.user, upload_id)
+        UPLOADS.inc(result=upload_result(response))
+        return response
+
+    def finalize(self, request, user, upload_id):
+        session = get_object_or_404(UploadSession, id=upload_id, user=user)
+
+        lock = resumable.session_lock(session)
+        with lock:
+            session.refresh_from_db()
+            if session.status == UploadSession.STATUS_COMPLETE:
+                return Response({
+                    "id": session.audio_memory_id,
+                    "message": "Upload already finalized",
+                    "status": "processing"
+                }, status=status.HTTP_202_ACCEPTED)
+
+            if session.received_bytes == 0:
+                return Response({"error": "No data uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+            if session.total_size is not None and session.received_bytes != session.total_size:
+                return Response({
+                    "error": f"Upload incomplete: {session.received_bytes} of {session.total_size} bytes received",
+                    "offset": session.received_bytes
+                }, status=status.HTTP_409_CONFLICT)
+            if session.detected_format is None:
+                return Response({"error": "File is not a supported audio format"}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+            content_sha256 = resumable.upload_digest(session)
+            expected = request.data.get('sha256')
+            if expected and expected.lower() != content_sha256:
+                return Response({
+                    "error": "Checksum mismatch, upload the file again",
+                    "sha256": content_sha256
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            duplicate = find_duplicate(user, content_sha256)
+            if duplicate is not None:
+                resumable.discard(session)
+                UploadSession.objects.filter(id=session.id).update(
+                    status=UploadSession.STATUS_COMPLETE, audio_memory=duplicate
+                )
+                return duplicate_response(duplicate)
+
+            try:
+                job_queue.check_admission()
+            except QueueFull as e:
+                # The received file is kept, finalizing can be retried later
+                return queue_full_response(e)
+
+            audio_memory = AudioMemory(user=user, processing_complete=False, content_sha256=content_sha256)
+            resumable.finish_session(session, audio_memory)
+            audio_memory.save()
+            UploadSession.objects.filter(id=session.id).update(
+                status=UploadSession.STATUS_COMPLETE, audio_memory=audio_memory
+            )
+
+        job = job_queue.enqueue(audio_memory)
+        log.info('upload_accepted', audio_id=audio_memory.id, job_id=job.id, upload_id=str(session.id))
+        return Response({
+            "id": audio_memory.id,
+            "message": "Audio file accepted and processing has started",
+            "status": "processing"
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class AudioMemoryDetailView(APIView):
@@ -263,60 +395,103 @@ class AudioMemoryDetailView(APIView):
                 try:
                     os.remove(audio_memory.audio_file.path)
                 except Exception as e:
-                    print(f"⚠️ Warning: Could not delete file: {str(e)}")
+                    log.warning('audio_file_not_deleted', audio_id=audio_memory.id, error=str(e))
         
         # Delete the record
         audio_memory.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class AudioMemorySegmentsView(APIView):
+    @firebase_auth_required
+    def get(self, request, pk, *args, **kwargs):
+        """
+        Return transcript segments saved so far. Pass ?after=<index> to get
+        only the segments decoded since the last poll.
+        """
+        user = request.user
+        audio_memory = get_object_or_404(AudioMemory, id=pk, user=user)
+
+        segments = TranscriptSegment.objects.filter(audio_memory=audio_memory)
+        after = request.query_params.get('after')
+        if after is not None:
+            try:
+                segments = segments.filter(index__gt=int(after))
+            except ValueError:
+                return Response({"error": "'after' must be a segment index"}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = TranscriptSegmentSerializer(segments, many=True)
+        return Response({
+            "id": audio_memory.id,
+            "transcription_complete": audio_memory.transcription_complete,
+            "segments": serializer.data
+        })
+
+
 class AudioMemoryExportView(APIView):
     # Option 1: For testing, temporarily remove the authentication decorator
     # @firebase_auth_required
     def get(self, request, *args, **kwargs):
-        """Export audio memory data as CSV"""
-        import csv
-        from django.http import HttpResponse
-        
+        """
+        Export audio memory data, streamed row by row.
+
+        Query parameters:
+            output: csv (default), jsonl, parquet or arrow
+            since: only export memories with a larger id, from the
+                X-Export-Cursor header of a previous export
+
+        Only processed memories are exported, and the export stops before the
+        first one still processing, so a later export with the cursor picks it
+        up once it is finished.
+        """
         # Option 2: For testing, use the first user like in the post method
         user = UserProfile.objects.first()  # Temporarily use first user for testing
         # Real implementation would use: user = request.user
         
-        print(f"🔍 Exporting data for user: {user}")
-        queryset = AudioMemory.objects.filter(user=user)
-        print(f"📊 Found {queryset.count()} audio memories to export")
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in export.FORMATS:
+            return Response({
+                "error": f"output must be one of {', '.join(export.FORMATS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if export_format in export.COLUMNAR_FORMATS and not export.columnar_available():
+            return Response({
+                "error": f"{export_format} export needs pyarrow installed on the server"
+            }, status=status.HTTP_501_NOT_IMPLEMENTED)
         
-        # Create the HttpResponse object with CSV header
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="audio_memories_{datetime.date.today()}.csv"'
+        queryset = AudioMemory.objects.filter(user=user)
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                queryset = queryset.filter(id__gt=int(since))
+            except ValueError:
+                return Response({"error": "'since' must be a memory id"}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create CSV writer
-        writer = csv.writer(response)
+        # Fix the end of the export up front, so the cursor matches what is sent
+        first_unfinished = queryset.filter(processing_complete=False).aggregate(first_id=Min('id'))['first_id']
+        if first_unfinished is not None:
+            queryset = queryset.filter(id__lt=first_unfinished)
+        cursor = queryset.aggregate(last_id=Max('id'))['last_id']
+        if cursor is not None:
+            queryset = queryset.filter(id__lte=cursor)
+        else:
+            cursor = since or 0
         
-        # Write header
-        writer.writerow([
-            'timestamp', 'input_text', 'sentiment_score', 'sentiment_label',
-            'memory_references', 'routine_references', 'time_indicators',
-            'location_indicators', 'severity_indicators', 'potential_concerns'
-        ])
+        export_log.info('export_started', user_id=getattr(user, 'id', None), output=export_format, since=since, cursor=cursor)
+        stats = {'rows': 0}
         
-        # Write data rows with better error handling
-        for memory in queryset:
-            try:
-                writer.writerow([
-                    memory.timestamp.strftime("%Y-%m-%d %H:%M:%S") if memory.timestamp else '',
-                    memory.transcription or '',
-                    memory.score if memory.score is not None else '',
-                    memory.sentiment_label or '',
-                    memory.memory_references or '',
-                    memory.routine_references or '',
-                    memory.time_indicators or '',
-                    memory.location_indicators or '',
-                    memory.severity_indicators or '',
-                    memory.potential_concerns or ''
-                ])
-            except Exception as e:
-                print(f"❌ Error exporting memory {memory.id}: {str(e)}")
+        def stream():
+            yield from export.stream_export(queryset, export_format, stats)
+            export_log.info('export_finished', output=export_format, rows=stats['rows'])
         
-        print(f"✅ CSV export completed with {queryset.count()} records")
-        return response
\ No newline at end of file
+        content_type, extension = export.FORMATS[export_format]
+        response = StreamingHttpResponse(stream(), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="audio_memories_{datetime.date.today()}.{extension}"'
+        response['X-Export-Cursor'] = str(cursor)
+        return response
+
+
+class InferenceStatsView(APIView):
+    # Operational metrics only, no user data is exposed
+    def get(self, request, *args, **kwargs):
+        """Batch-size and queue-wait metrics of the DistilBERT broker"""
+        return Response(get_distilbert_broker().stats())
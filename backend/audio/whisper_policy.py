@@ -0,0 +1,109 @@
+"""
+Whisper model and decoding policy.
+
+Each transcription is decoded at one of three tiers, cheapest first:
+
+    fast      base model, greedy decoding, no temperature fallback
+    standard  small model, beam search of 5 with temperature fallback
+    accurate  medium model, beam search of 5 with temperature fallback
+
+The tier is picked from the processing backlog (queued and running jobs,
+including the one asking) and the voiced duration of the clip:
+
+    backlog >= AUDIO_WHISPER_FAST_BACKLOG                       fast
+    voiced >= AUDIO_WHISPER_FAST_SECONDS and other jobs waiting  fast
+    no other jobs and voiced <= AUDIO_WHISPER_ACCURATE_SECONDS   accurate
+    otherwise                                                    standard
+
+and is never above AUDIO_WHISPER_MAX_TIER (standard by default, so the
+medium model is only loaded when a deployment opts in).
+
+The tier is stored on the AudioMemory. When the queue is idle, the job queue
+re-transcribes memories decoded below the maximum tier, one at a time (see
+JobQueue._schedule_upgrade and tasks.upgrade_transcription).
+"""
+from django.conf import settings
+
+TIER_FAST = 'fast'
+TIER_STANDARD = 'standard'
+TIER_ACCURATE = 'accurate'
+TIER_ORDER = [TIER_FAST, TIER_STANDARD, TIER_ACCURATE]
+
+# Whisper's default fallback: retry at higher temperatures when a decode
+# looks degenerate (too repetitive or too unlikely)
+TEMPERATURE_FALLBACK = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+DEFAULT_FAST_BACKLOG = 10
+DEFAULT_FAST_SECONDS = 1800
+DEFAULT_ACCURATE_SECONDS = 300
+DEFAULT_MAX_TIER = TIER_STANDARD
+
+
+class Tier:
+    def __init__(self, name, model_size, beam_size, best_of, temperature):
+        self.name = name
+        self.model_size = model_size
+        self.beam_size = beam_size
+        self.best_of = best_of
+        self.temperature = temperature
+
+    @property
+    def rank(self):
+        return TIER_ORDER.index(self.name)
+
+    def decode_options(self):
+        """Keyword arguments for WhisperModel.transcribe."""
+        return {'beam_size': self.beam_size, 'best_of': self.best_of, 'temperature': self.temperature}
+
+    def __repr__(self):
+        return f"Tier({self.name}: {self.model_size}, beam {self.beam_size})"
+
+
+TIERS = {
+    TIER_FAST: Tier(TIER_FAST, 'base', beam_size=1, best_of=1, temperature=0.0),
+    TIER_STANDARD: Tier(TIER_STANDARD, 'small', beam_size=5, best_of=5, temperature=TEMPERATURE_FALLBACK),
+    TIER_ACCURATE: Tier(TIER_ACCURATE, 'medium', beam_size=5, best_of=5, temperature=TEMPERATURE_FALLBACK),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def max_tier():
+    name = _setting('AUDIO_WHISPER_MAX_TIER', DEFAULT_MAX_TIER)
+    if name not in TIERS:
+        raise ValueError(f"Unknown Whisper tier '{name}', use one of {', '.join(TIER_ORDER)}")
+    return TIERS[name]
+
+
+def choose_tier(backlog, voiced_seconds=None):
+    """
+    Tier for a transcription.
+
+    Args:
+        backlog: Queued and running processing jobs, including this one
+        voiced_seconds: Speech in the clip, None if unknown
+    """
+    voiced_seconds = voiced_seconds or 0.0
+    if backlog >= _setting('AUDIO_WHISPER_FAST_BACKLOG', DEFAULT_FAST_BACKLOG):
+        name = TIER_FAST
+    elif voiced_seconds >= _setting('AUDIO_WHISPER_FAST_SECONDS', DEFAULT_FAST_SECONDS) and backlog > 1:
+        name = TIER_FAST
+    elif backlog <= 1 and voiced_seconds <= _setting('AUDIO_WHISPER_ACCURATE_SECONDS', DEFAULT_ACCURATE_SECONDS):
+        name = TIER_ACCURATE
+    else:
+        name = TIER_STANDARD
+
+    ceiling = max_tier()
+    return TIERS[name] if TIERS[name].rank <= ceiling.rank else ceiling
+
+
+def get_tier(name):
+    """Tier by name; the standard tier for transcriptions made before tiers were recorded."""
+    return TIERS.get(name or TIER_STANDARD, TIERS[TIER_STANDARD])
+
+
+def upgradable_tiers():
+    """Names of the tiers below the maximum, whose transcripts the idle pass upgrades."""
+    return TIER_ORDER[:max_tier().rank]
@@ -17,12 +17,25 @@ django_asgi_app = get_asgi_application()
 
 # 🔥 Import middleware AFTER Django has been set up
 from .middleware import FirebaseAuthMiddleware
+from audio import routing as audio_routing
+from django.conf import settings
+from audio.jobs import start_workers
+from .model_registry import registry
+
+# Start the audio processing worker pool (requeues unfinished uploads)
+start_workers()
+
+# Load the configured models now instead of on the first request
+if settings.MODEL_PRELOAD:
+    import audio.audio_processing  # noqa: F401 - registers the audio models
+    import memory.FT  # noqa: F401 - registers the face_recognition models
+    registry.preload(settings.MODEL_PRELOAD)
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": FirebaseAuthMiddleware(
         URLRouter(
-            routing.websocket_urlpatterns
+            routing.websocket_urlpatterns + audio_routing.websocket_urlpatterns
         )
     ),
 })
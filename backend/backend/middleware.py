@@ -2,6 +2,9 @@ from channels.middleware import BaseMiddleware
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from firebase_admin import auth
+from .structured_log import get_logger
+
+log = get_logger('backend.middleware')
 
 class FirebaseAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
@@ -13,10 +16,10 @@ class FirebaseAuthMiddleware(BaseMiddleware):
             firebase_uid = authorization_header.decode().split(' ')[-1]
         
         if firebase_uid:
-            print(f"UID extracted: {firebase_uid}")
+            log.debug('socket_uid_found')
             scope['user'] = await self.get_user_from_uid(firebase_uid)
         else:
-            print("No UID found in Authorization header")
+            log.debug('socket_uid_missing')
             scope['user'] = AnonymousUser()
 
         return await super().__call__(scope, receive, send)
@@ -0,0 +1,236 @@
+"""
+Central registry for the ML models used by the backend.
+
+Modules register a loader per model name (Whisper, DistilBERT, VADER, the
+face_recognition models) and call `registry.get(name)` instead of keeping
+their own globals. The registry provides:
+
+- single-flight loading: concurrent callers of an unloaded model wait for one
+  load instead of each loading their own copy; loads are also serialized so
+  two different models never load at the same time (which also keeps the
+  RSS measurement per model meaningful)
+- eager preload of the names in MODEL_PRELOAD at ASGI startup
+- eviction of models idle for longer than their idle timeout, and of the
+  least recently used models while the total exceeds MODEL_MEMORY_BUDGET_MB
+- a snapshot of every model (load time, RSS cost, invocation count) for the
+  /api/models/ introspection endpoint (behind METRICS_TOKEN)
+
+Evicting a model only drops the registry's reference; a caller still using
+it keeps it alive until it is done.
+"""
+import os
+import threading
+import time
+from django.conf import settings
+from .metrics import metrics
+from .structured_log import get_logger
+
+DEFAULT_IDLE_TIMEOUT = 900  # 15 minutes
+DEFAULT_REAPER_INTERVAL = 60
+
+log = get_logger('backend.models')
+
+MODEL_LOAD_SECONDS = metrics.histogram('model_load_seconds', 'Time to load a model', ['model'])
+MODEL_LOADED = metrics.gauge('model_loaded', 'Whether a model is currently loaded', ['model'])
+MODEL_RSS_BYTES = metrics.gauge('model_rss_bytes', 'Resident memory added by loading a model', ['model'])
+MODEL_INVOCATIONS = metrics.gauge('model_invocations', 'Times a model was requested', ['model'])
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if unavailable."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ModelEntry:
+    def __init__(self, name, loader, unloader=None, idle_timeout=None):
+        self.name = name
+        self.loader = loader
+        self.unloader = unloader
+        self.idle_timeout = idle_timeout  # None means MODEL_IDLE_TIMEOUT, 0 disables idle eviction
+        self.lock = threading.Lock()
+        self.model = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.rss_bytes = None
+        self.invocations = 0
+        self.last_used = None
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries = {}
+        self._registry_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._reaper = None
+
+    def register(self, name, loader, unloader=None, idle_timeout=None):
+        """
+        Register a model loader under a name (re-registering replaces the loader).
+
+        Args:
+            name: Model name used with get()
+            loader: Callable returning the loaded model
+            unloader: Optional callable(model) releasing resources on eviction
+            idle_timeout: Seconds of inactivity before eviction; None uses
+                MODEL_IDLE_TIMEOUT and 0 keeps the model loaded
+        """
+        with self._registry_lock:
+            existing = self._entries.get(name)
+            if existing is not None:
+                existing.loader = loader
+                existing.unloader = unloader
+                existing.idle_timeout = idle_timeout
+            else:
+                self._entries[name] = ModelEntry(name, loader, unloader, idle_timeout)
+
+    def get(self, name):
+        """Return the model, loading it first if needed (one load for concurrent callers)."""
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.model is None:
+                self._load(entry)
+            entry.invocations += 1
+            entry.last_used = time.time()
+            model = entry.model
+        self._ensure_reaper()
+        return model
+
+    def preload(self, names):
+        """Load the given models now, e.g. at server startup."""
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                log.exception('model_preload_failed', model=name, error=str(e))
+
+    def unload(self, name):
+        """Evict a model; the next get() loads it again."""
+        entry = self._entry(name)
+        with entry.lock:
+            self._unload(entry)
+
+    def evict_idle(self):
+        """Evict models idle past their timeout, then enforce the memory budget."""
+        default_timeout = getattr(settings, 'MODEL_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT)
+        now = time.time()
+        for entry in list(self._entries.values()):
+            timeout = default_timeout if entry.idle_timeout is None else entry.idle_timeout
+            if not timeout or not entry.loaded:
+                continue
+            if now - entry.last_used > timeout and entry.lock.acquire(blocking=False):
+                try:
+                    if entry.loaded and now - entry.last_used > timeout:
+                        log.info('model_idle', model=entry.name, idle_seconds=round(now - entry.last_used))
+                        self._unload(entry)
+                finally:
+                    entry.lock.release()
+        self._enforce_budget()
+
+    def snapshot(self):
+        """State of every registered model, for introspection."""
+        now = time.time()
+        models = []
+        for entry in list(self._entries.values()):
+            models.append({
+                'name': entry.name,
+                'loaded': entry.loaded,
+                'loaded_at': entry.loaded_at,
+                'load_seconds': round(entry.load_seconds, 2) if entry.load_seconds is not None else None,
+                'rss_mb': round(entry.rss_bytes / 1024 / 1024, 1) if entry.rss_bytes is not None else None,
+                'invocations': entry.invocations,
+                'idle_seconds': round(now - entry.last_used, 1) if entry.last_used else None,
+            })
+        return models
+
+    def _entry(self, name):
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"No model registered under '{name}'")
+
+    def _load(self, entry):
+        # Serialize loads: keeps peak memory down and the RSS delta attributable
+        with self._load_lock:
+            log.info('model_loading', model=entry.name)
+            rss_before = current_rss()
+            start_time = time.time()
+            model = entry.loader()
+            entry.load_seconds = time.time() - start_time
+            rss_after = current_rss()
+        MODEL_LOAD_SECONDS.observe(entry.load_seconds, model=entry.name)
+
+        entry.model = model
+        entry.loaded_at = time.time()
+        entry.last_used = entry.loaded_at
+        if rss_before is not None and rss_after is not None:
+            entry.rss_bytes = max(0, rss_after - rss_before)
+        log.info('model_loaded', model=entry.name, seconds=round(entry.load_seconds, 2), rss_bytes=entry.rss_bytes)
+        self._enforce_budget(keep=entry)
+
+    def _unload(self, entry):
+        if entry.model is None:
+            return
+        model, entry.model = entry.model, None
+        if entry.unloader is not None:
+            try:
+                entry.unloader(model)
+            except Exception as e:
+                log.exception('model_unloader_failed', model=entry.name, error=str(e))
+        log.info('model_unloaded', model=entry.name)
+
+    def _enforce_budget(self, keep=None):
+        budget_mb = getattr(settings, 'MODEL_MEMORY_BUDGET_MB', None)
+        if not budget_mb:
+            return
+        budget = budget_mb * 1024 * 1024
+
+        loaded = [entry for entry in self._entries.values() if entry.loaded and entry is not keep]
+        total = sum(entry.rss_bytes or 0 for entry in loaded) + ((keep.rss_bytes or 0) if keep else 0)
+        # Evict least recently used first
+        for entry in sorted(loaded, key=lambda e: e.last_used or 0):
+            if total <= budget:
+                break
+            if entry.lock.acquire(blocking=False):
+                try:
+                    if entry.loaded:
+                        log.info('model_over_budget', model=entry.name, budget_mb=budget_mb)
+                        total -= entry.rss_bytes or 0
+                        self._unload(entry)
+                finally:
+                    entry.lock.release()
+
+    def _ensure_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._registry_lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reaper_loop, name="model-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reaper_loop(self):
+        while True:
+            time.sleep(getattr(settings, 'MODEL_REAPER_INTERVAL', DEFAULT_REAPER_INTERVAL))
+            try:
+                self.evict_idle()
+            except Exception as e:
+                log.exception('model_eviction_failed', error=str(e))
+
+
+registry = ModelRegistry()
+
+
+@metrics.collector
+def collect_model_state():
+    for model in registry.snapshot():
+        MODEL_LOADED.set(int(model['loaded']), model=model['name'])
+        MODEL_INVOCATIONS.set(model['invocations'], model=model['name'])
+        if model['rss_mb'] is not None:
+            MODEL_RSS_BYTES.set(int(model['rss_mb'] * 1024 * 1024), model=model['name'])
@@ -109,6 +109,98 @@ CHANNEL_LAYERS = {
     },
 }
 
+# CPU inference backend of the Hugging Face models (see audio/model_backends.py):
+# 'torch', 'quantized' (int8 dynamic quantization) or 'onnx' (ONNX Runtime).
+# Compare them with `manage.py bench_inference` before switching.
+INFERENCE_BACKEND = 'torch'
+INFERENCE_BACKENDS = {}  # Per-model overrides, e.g. {"distilbert/distilbert-base-uncased-finetuned-sst-2-english": "onnx"}
+
+# Metrics and structured logging (see backend/metrics.py and backend/structured_log.py)
+METRICS_TOKEN = None  # When set, /metrics requires "Authorization: Bearer <token>"; /api/models/ always does
+PIPELINE_LOG_LEVEL = 'INFO'
+PIPELINE_LOG_FORMAT = 'json'  # 'json' lines, or 'text' for key=value lines
+
+# Audio processing job queue (see audio/jobs.py)
+AUDIO_JOB_WORKERS = 2  # Concurrent transcription/analysis jobs
+AUDIO_JOB_MAX_ATTEMPTS = 3
+AUDIO_JOB_RETRY_BACKOFF = 30  # Seconds before the first retry, doubled on each further attempt
+AUDIO_JOB_MAX_BACKLOG = 50  # Queued + running jobs before uploads are rejected with HTTP 429
+AUDIO_JOB_POLL_INTERVAL = 5  # Seconds an idle worker sleeps between queue polls
+
+# Upload deduplication (see audio/uploads.py)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # Seconds an Idempotency-Key response is replayed
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = 10 * 60  # Seconds after which an unfinished request no longer holds its key
+
+# Resumable uploads (see audio/resumable.py)
+AUDIO_UPLOAD_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+AUDIO_UPLOAD_CHUNK_BYTES = 5 * 1024 * 1024  # Range size suggested to clients
+AUDIO_UPLOAD_SESSION_TTL = 24 * 60 * 60  # Unfinished uploads are removed after a day without data
+
+# Audio memory listing (see audio/listing.py)
+AUDIO_LIST_PAGE_SIZE = 50  # Default page size when the client paginates
+
+# Audio memory export (see audio/export.py)
+AUDIO_EXPORT_CHUNK_SIZE = 500  # Rows fetched and encoded at a time
+
+# Sentence-level sentiment of transcripts (see analyze_sentiment_series in audio/audio_processing.py)
+AUDIO_SENTIMENT_SERIES = True  # Store a per-sentence sentiment series and its summary for every recording
+AUDIO_SENTIMENT_WINDOW_WORDS = 200  # Longer sentences are split into windows of this many words
+
+# Text analysis result cache (see audio/analysis_cache.py)
+AUDIO_ANALYSIS_CACHE_SIZE = 1024  # Results kept in memory per process, 0 disables the in-process tier
+AUDIO_ANALYSIS_CACHE_PERSIST = True  # Also store results in the database for other processes and restarts
+
+# manage.py reanalyze (see audio/management/commands/reanalyze.py)
+AUDIO_REANALYZE_CHECKPOINT = None  # Checkpoint file, None uses reanalyze-checkpoint.json in the system temp directory
+
+# Voice activity detection before Whisper (see audio/vad.py)
+AUDIO_VAD_ENABLED = True
+AUDIO_VAD_THRESHOLD = 0.5  # Speech probability above which a frame counts as voiced
+AUDIO_VAD_MIN_SPEECH_MS = 250  # Shorter blips (clicks, bumps) are ignored
+AUDIO_VAD_MIN_SILENCE_MS = 2000  # Shorter pauses stay inside one voiced span
+AUDIO_VAD_SPEECH_PAD_MS = 400  # Context kept around every voiced span
+
+# Parallel transcription of long recordings (see audio/chunked.py)
+AUDIO_CHUNKED_MIN_SECONDS = 600  # Voiced seconds from which windows are decoded in parallel, 0 disables
+AUDIO_CHUNK_SECONDS = 120  # Target window length
+AUDIO_CHUNK_OVERLAP = 5  # Overlap of windows that split one long voiced span
+AUDIO_CHUNK_PROCESSES = None  # Worker processes, None uses half the CPU cores
+
+# Whisper model and decoding tiers (see audio/whisper_policy.py)
+AUDIO_WHISPER_MAX_TIER = 'standard'  # 'fast', 'standard' or 'accurate' (medium model)
+AUDIO_WHISPER_FAST_BACKLOG = 10  # Queued + running jobs from which transcriptions use the fast tier
+AUDIO_WHISPER_FAST_SECONDS = 1800  # Voiced seconds from which a clip uses the fast tier when other jobs wait
+AUDIO_WHISPER_ACCURATE_SECONDS = 300  # Longest voiced clip given the accurate tier on an idle queue
+AUDIO_WHISPER_UPGRADE = True  # Re-transcribe cheaper-tier transcripts at the maximum tier while the queue is idle
+AUDIO_WHISPER_UPGRADE_INTERVAL = 60  # Seconds between two checks for a transcript to upgrade
+AUDIO_WHISPER_BATCH_SIZE = 8  # Short queued clips transcribed in one batched Whisper call, 1 disables batching
+AUDIO_WHISPER_BATCH_MAX_SECONDS = 60  # Longest recording that shares a batch (see audio/batched.py)
+
+# Live transcription over WebSocket (see audio/streaming.py)
+AUDIO_STREAM_DECODE_INTERVAL = 1.0  # Seconds of new audio between two decodes of the rolling buffer
+AUDIO_STREAM_STABLE_MARGIN = 1.0  # Segments ending closer than this to the buffer end stay partial
+AUDIO_STREAM_MAX_BUFFER = 30.0  # Seconds of undecided audio before segments are committed anyway
+AUDIO_STREAM_DECODE_WORKERS = 2  # Concurrent live decodes across all streams
+
+# DistilBERT micro-batching (see audio/inference.py)
+DISTILBERT_BATCH_WINDOW_MS = 10  # How long the broker waits to fill a batch
+DISTILBERT_MAX_BATCH = 16
+
+# Registered face encodings (see memory/encoding_store.py, memory/encoding_format.py and the indexes in memory/FT.py)
+MEMORY_GALLERY_CACHE_USERS = 256  # Users whose encoding matrix is cached per process, 0 disables caching
+MEMORY_GALLERY_MAX_AGE = 300  # Seconds before a cached gallery is reloaded even if its database fingerprint is unchanged
+MEMORY_ENCODING_DTYPE = 'float32'  # Stored type of new face encodings: 'float32' or 'float16' (half the size)
+MEMORY_FACE_INDEX = 'brute'  # Face search: 'brute' (exact numpy), 'balltree' (scikit-learn) or 'hnsw' (hnswlib, approximate)
+MEMORY_FACE_INDEX_DIR = None  # Directory where built balltree/hnsw indexes are saved and reloaded, None keeps them in memory only
+MEMORY_FACE_REFINE_TOP_K = 5  # People whose photo galleries are compared after the centroid pass
+MEMORY_DETECT_MAX_EDGE = 1024  # Longest side of the thumbnail faces are detected on (see memory/face_detection.py), 0 detects on the full photo
+
+# Model registry (see backend/model_registry.py)
+MODEL_PRELOAD = []  # e.g. ['whisper', 'distilbert', 'vader'] to load at ASGI startup
+MODEL_IDLE_TIMEOUT = 900  # Seconds a model may sit unused before it is evicted
+MODEL_MEMORY_BUDGET_MB = None  # Evict least recently used models above this total RSS
+MODEL_REAPER_INTERVAL = 60  # Seconds between idle eviction passes
+
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
@@ -0,0 +1,136 @@
+"""
+Structured logging for the processing hot path.
+
+    log = get_logger('audio.pipeline')
+    log.info('transcription_done', audio_id=12, seconds=3.2)
+
+Each record is one event name plus key/value fields, written as a JSON line
+(or `key=value` pairs with PIPELINE_LOG_FORMAT = 'text'). Records go through
+a queue to a listener thread that does the actual writing, so worker threads
+never block on stdout the way they did with print().
+
+Settings (all optional):
+    PIPELINE_LOG_LEVEL   minimum level, e.g. 'INFO' or 'DEBUG'
+    PIPELINE_LOG_FORMAT  'json' or 'text'
+
+A field named like a LogRecord attribute (filename, name, module, ...) is
+written with a `field_` prefix instead of crashing the call.
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from django.conf import settings
+
+ROOT_LOGGER = 'pipeline'
+
+# Attributes every LogRecord has; anything else was passed as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Prepended to a field named like a LogRecord attribute, which logging refuses to overwrite
+RESERVED_FIELD_PREFIX = 'field_'
+
+
+def _fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, tz=datetime.timezone.utc).isoformat(),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(f"{key}={value!r}" for key, value in _fields(record).items())
+        line = f"{self.formatTime(record)} {record.levelname.lower()} {record.name} {record.getMessage()} {fields}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line.rstrip()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Keep the fields and render the traceback now, while exc_info is still valid
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def _configure():
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+
+        handler = logging.StreamHandler()
+        log_format = getattr(settings, 'PIPELINE_LOG_FORMAT', 'json')
+        handler.setFormatter(KeyValueFormatter() if log_format == 'text' else JsonFormatter())
+
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)  # Flush what is still queued
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.addHandler(_QueueHandler(records))
+        root.setLevel(getattr(settings, 'PIPELINE_LOG_LEVEL', 'INFO'))
+        root.propagate = False
+
+
+class StructuredLogger:
+    """Thin wrapper turning keyword arguments into record fields."""
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level, event, exc_info=False, **fields):
+        if self._logger.isEnabledFor(level):
+            extra = {
+                RESERVED_FIELD_PREFIX + key if key in _RECORD_ATTRIBUTES else key: value
+                for key, value in fields.items()
+            }
+            self._logger.log(level, event, exc_info=exc_info, extra=extra)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, **fields)
+
+    def exception(self, event, **fields):
+        """Error with the traceback of the exception being handled."""
+        self._log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name):
+    _configure()
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
@@ -0,0 +1,224 @@
+import json
+import logging
+import threading
+import time
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from .metrics import MetricsRegistry
+from .model_registry import ModelRegistry
+from .structured_log import JsonFormatter, KeyValueFormatter, StructuredLogger, _QueueHandler
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class StructuredLogTests(SimpleTestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        logger = logging.getLogger('tests.structured_log')
+        logger.addHandler(self.handler)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        self.addCleanup(logger.removeHandler, self.handler)
+        self.log = StructuredLogger(logger)
+
+    def entry(self):
+        return json.loads(JsonFormatter().format(self.handler.records[-1]))
+
+    def test_fields_become_json_keys(self):
+        self.log.info('job_done', job_id=3, seconds=1.5)
+        entry = self.entry()
+        self.assertEqual((entry['event'], entry['level'], entry['job_id'], entry['seconds']), ('job_done', 'info', 3, 1.5))
+
+    def test_reserved_field_names_are_prefixed(self):
+        self.log.info('upload', filename='talk.wav', name='n', message='m')
+        entry = self.entry()
+        self.assertEqual(entry['event'], 'upload')
+        self.assertEqual((entry['field_filename'], entry['field_name'], entry['field_message']), ('talk.wav', 'n', 'm'))
+        self.assertEqual(entry['logger'], 'tests.structured_log')
+
+    def test_text_format(self):
+        self.log.warning('queue_full', backlog=12, reason='busy')
+        line = KeyValueFormatter().format(self.handler.records[-1])
+        self.assertTrue(line.endswith("warning tests.structured_log queue_full backlog=12 reason='busy'"))
+
+    def test_queued_record_keeps_the_traceback(self):
+        try:
+            raise ValueError("bad audio")
+        except ValueError:
+            self.log.exception('decode_failed', audio_id=7)
+        record = _QueueHandler(None).prepare(self.handler.records[-1])
+        self.assertIsNone(record.exc_info)
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual((entry['level'], entry['audio_id']), ('error', 7))
+        self.assertIn("ValueError: bad audio", entry['exc_info'])
+
+    def test_disabled_level_is_skipped(self):
+        self.handler.records.clear()
+        self.log._logger.setLevel(logging.INFO)
+        self.log.debug('noisy', value=1)
+        self.assertEqual(self.handler.records, [])
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+
+    def test_counter_and_gauge(self):
+        uploads = self.metrics.counter('uploads_total', 'Uploads', ['result'])
+        uploads.inc(result='accepted')
+        uploads.inc(2, result='accepted')
+        uploads.inc(result='bad "name"\n')
+        depth = self.metrics.gauge('queue_depth', 'Jobs')
+        depth.set(1.5)
+
+        self.assertEqual(self.metrics.render().splitlines(), [
+            '# HELP uploads_total Uploads',
+            '# TYPE uploads_total counter',
+            'uploads_total{result="accepted"} 3',
+            'uploads_total{result="bad \\"name\\"\\n"} 1',
+            '# HELP queue_depth Jobs',
+            '# TYPE queue_depth gauge',
+            'queue_depth 1.5',
+        ])
+
+    def test_labels_must_match(self):
+        uploads = self.metrics.counter('uploads_total', 'Uploads', ['result'])
+        with self.assertRaises(ValueError):
+            uploads.inc(status='accepted')
+
+    def test_histogram_buckets_are_cumulative(self):
+        seconds = self.metrics.histogram('stage_seconds', 'Stages', ['stage'], buckets=(1, 0.1))
+        for value in (0.05, 0.5, 0.5, 5):
+            seconds.observe(value, stage='decode')
+
+        self.assertEqual(self.metrics.render().splitlines()[2:], [
+            'stage_seconds_bucket{stage="decode",le="0.1"} 1',
+            'stage_seconds_bucket{stage="decode",le="1"} 3',
+            'stage_seconds_bucket{stage="decode",le="+Inf"} 4',
+            'stage_seconds_sum{stage="decode"} 6.05',
+            'stage_seconds_count{stage="decode"} 4',
+        ])
+
+    def test_same_name_returns_the_registered_metric(self):
+        first = self.metrics.counter('uploads_total', 'Uploads')
+        self.assertIs(self.metrics.counter('uploads_total', 'Uploads'), first)
+
+    def test_failing_collector_does_not_break_the_scrape(self):
+        depth = self.metrics.gauge('queue_depth', 'Jobs')
+
+        @self.metrics.collector
+        def broken():
+            raise RuntimeError("database is down")
+
+        @self.metrics.collector
+        def collect_depth():
+            depth.set(4)
+
+        self.assertIn('queue_depth 4', self.metrics.render().splitlines())
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_requires_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+@mock.patch.object(ModelRegistry, '_ensure_reaper')
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = ModelRegistry()
+        self.unloaded = []
+
+    def register(self, name, **kwargs):
+        self.registry.register(name, lambda: {'name': name}, self.unloaded.append, **kwargs)
+
+    def test_concurrent_gets_share_one_load(self, _reaper):
+        calls = []
+        started = threading.Event()
+
+        def slow_loader():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return object()
+
+        self.registry.register('whisper', slow_loader)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get('whisper'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(self.registry.snapshot()[0]['invocations'], 8)
+
+    def test_unknown_model(self, _reaper):
+        with self.assertRaises(KeyError):
+            self.registry.get('missing')
+
+    @override_settings(MODEL_IDLE_TIMEOUT=60, MODEL_MEMORY_BUDGET_MB=None)
+    def test_idle_models_are_evicted(self, _reaper):
+        self.register('idle')
+        self.register('pinned', idle_timeout=0)
+        self.register('busy')
+        for name in ('idle', 'pinned', 'busy'):
+            self.registry.get(name)
+        self.registry._entry('idle').last_used -= 120
+        self.registry._entry('pinned').last_used -= 120
+
+        self.registry.evict_idle()
+
+        self.assertEqual(self.unloaded, [{'name': 'idle'}])
+        loaded = {model['name']: model['loaded'] for model in self.registry.snapshot()}
+        self.assertEqual(loaded, {'idle': False, 'pinned': True, 'busy': True})
+
+        # The next get() loads it again
+        self.assertEqual(self.registry.get('idle'), {'name': 'idle'})
+
+    @override_settings(MODEL_MEMORY_BUDGET_MB=250)
+    def test_budget_evicts_least_recently_used(self, _reaper):
+        for name in ('a', 'b', 'c'):
+            self.register(name)
+        # Each load adds 100 MB of resident memory
+        with mock.patch('backend.model_registry.current_rss', side_effect=[0, 100 << 20] * 3):
+            self.registry.get('a')
+            self.registry.get('b')
+            self.registry._entry('b').last_used -= 10  # b is now the least recently used
+            self.registry.get('c')
+
+        self.assertEqual(self.unloaded, [{'name': 'b'}])
+        loaded = {model['name']: model['loaded'] for model in self.registry.snapshot()}
+        self.assertEqual(loaded, {'a': True, 'b': False, 'c': True})
+        self.assertEqual(self.registry.snapshot()[2]['rss_mb'], 100.0)
+
+    def test_unloader_errors_are_contained(self, _reaper):
+        self.registry.register('broken', object, mock.Mock(side_effect=RuntimeError("busy")))
+        self.registry.get('broken')
+        self.registry.unload('broken')
+        self.assertFalse(self.registry.snapshot()[0]['loaded'])
+
+
+class ModelRegistryViewTests(SimpleTestCase):
+    @override_settings(METRICS_TOKEN=None)
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.client.get('/api/models/').status_code, 401)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_the_token(self):
+        self.assertEqual(self.client.get('/api/models/').status_code, 401)
+        response = self.client.get('/api/models/', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/api/models/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('models', response.json())
@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from .views import ModelRegistryView, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -23,4 +24,6 @@ urlpatterns = [
     path('api/audio/', include('audio.urls')),
     path('api/reminders/', include('reminders.urls')),
     path('api/memory/', include('memory.urls')),
+    path('api/models/', ModelRegistryView.as_view(), name='model-registry'),
+    path('metrics', metrics_view, name='metrics'),
 ]
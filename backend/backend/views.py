@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from .model_registry import registry
+from .metrics import metrics
+
+
+def has_metrics_token(request):
+    """Whether the request carries "Authorization: Bearer <METRICS_TOKEN>"; False while no token is set."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    return bool(token) and request.headers.get('Authorization') == f"Bearer {token}"
+
+
+class ModelRegistryView(APIView):
+    # Operational metrics only, no user data is exposed
+    def get(self, request, *args, **kwargs):
+        """Load state, load time, memory cost and usage of every registered model; requires METRICS_TOKEN"""
+        if not has_metrics_token(request):
+            return Response({"error": "A valid metrics token is required"}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({'models': registry.snapshot()})
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; requires "Authorization: Bearer <METRICS_TOKEN>" when that is set"""
+    if getattr(settings, 'METRICS_TOKEN', None) and not has_metrics_token(request):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
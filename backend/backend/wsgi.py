@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+from audio.jobs import start_workers
+
+# Start the audio processing worker pool (requeues unfinished uploads)
+start_workers()
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Memory
+from .models import Memory, FaceSample
 
 # Register your models here.
-admin.site.register(Memory)
\ No newline at end of file
+admin.site.register(Memory)
+admin.site.register(FaceSample)
\ No newline at end of file
@@ -4,7 +4,9 @@ from channels.db import database_sync_to_async
 from django.apps import apps
 from asgiref.sync import sync_to_async
 import pickle
-import face_recognition
+from backend.structured_log import get_logger
+
+log = get_logger('memory.consumers')
 
 class FaceRecognitionConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
@@ -17,7 +19,7 @@ class FaceRecognitionConsumer(AsyncWebsocketConsumer):
                 return user
             return None
         except Exception as e:
-            print(f"Error in get_user: {str(e)}")
+            log.exception('face_socket_user_lookup_failed', error=str(e))
             return None
 
     async def connect(self):
@@ -32,14 +34,14 @@ class FaceRecognitionConsumer(AsyncWebsocketConsumer):
                 break
 
         if not firebase_uid:
-            print("No valid Bearer token found in URL query string")
+            log.warning('face_socket_rejected', reason='no token')
             await self.close(code=4001)
             return
         
         # Retrieve user from the database
         user = await self.get_user(firebase_uid)
         if not user:
-            print(f"User not found for UID: {firebase_uid}")
+            log.warning('face_socket_rejected', reason='unknown user')
             await self.close(code=4002)
             return
 
@@ -48,7 +50,7 @@ class FaceRecognitionConsumer(AsyncWebsocketConsumer):
         
         # Accept the WebSocket connection
         await self.accept()
-        print(f"WebSocket connected successfully. UID: {firebase_uid}")
+        log.info('face_socket_connected', user_id=user.id)
         
         # Send a response confirming the connection
         await self.send(text_data=json.dumps({
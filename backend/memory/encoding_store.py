@@ -0,0 +1,247 @@
+"""
+Per-user store of registered face encodings.
+
+Identifying faces used to read every Memory row of the user and unpickle
+each encoding on every request. The store keeps a user's encodings as one
+contiguous float32 N x 128 matrix of per-person centroids, with the sample
+encodings of every person alongside (see FaceGallery for the matching).
+
+Galleries are built on first use and kept in an LRU of
+MEMORY_GALLERY_CACHE_USERS users; matching goes through the face index
+configured by MEMORY_FACE_INDEX (see FT.py). Saving or deleting a Memory
+updates the cached gallery in place, and `gallery_changed`, sent after a bulk
+operation that bypasses the model signals, drops it (see memory/signals.py).
+
+Other server processes make changes too, so every lookup first reads a
+fingerprint of the user's faces (one aggregate query: people, samples, their
+latest ids and the latest Memory.updated_at) and reloads the gallery when it
+differs from the one the gallery was built from. Bulk updates of Memory rows
+must set updated_at for this to notice them. A gallery is also reloaded once
+it is MEMORY_GALLERY_MAX_AGE seconds old, whatever its fingerprint.
+"""
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+from .encoding_format import decode_encodings
+
+DEFAULT_CACHE_USERS = 256
+DEFAULT_MAX_AGE = 300  # Seconds
+DEFAULT_MIN_CONFIDENCE = 60  # Percent, (1 - distance) * 100
+DEFAULT_REFINE_TOP_K = 5
+
+ENCODING_SIZE = 128
+
+
+class FaceGallery:
+    """
+    Registered people of one user.
+
+    Each person has a centroid (indexed, see FT.build_face_index), a spread
+    and the encodings of their sample photos. A face is matched in two
+    passes: the MEMORY_FACE_REFINE_TOP_K nearest centroids, then the samples
+    of those people only. A person whose centroid is further than the
+    threshold plus their spread cannot have a sample within the threshold,
+    so their samples are skipped.
+
+    Cached galleries are shared by request threads and changed in place by
+    registrations (EncodingStore.update), so matching and changes hold the
+    gallery's lock.
+    """
+
+    def __init__(self, ids, names, centroids, spreads, samples, key=None):
+        from .FT import build_face_index
+
+        ids = [int(face_id) for face_id in ids]
+        self._lock = threading.Lock()
+        self.names = dict(zip(ids, names))
+        self.spreads = {face_id: spread or 0.0 for face_id, spread in zip(ids, spreads)}
+        self.samples = {face_id: samples.get(face_id) for face_id in ids}
+        self.index = build_face_index(
+            np.asarray(ids, dtype=np.int64),
+            np.ascontiguousarray(centroids, dtype=np.float32).reshape(-1, ENCODING_SIZE),
+            key=key
+        )
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def top_k(self):
+        return max(1, getattr(settings, 'MEMORY_FACE_REFINE_TOP_K', DEFAULT_REFINE_TOP_K))
+
+    def add(self, face_id, name, centroid, spread, samples):
+        """Add or replace one registered person."""
+        with self._lock:
+            self.index.add([face_id], np.asarray(centroid, dtype=np.float32).reshape(1, ENCODING_SIZE))
+            self.names[face_id] = name
+            self.spreads[face_id] = spread or 0.0
+            self.samples[face_id] = samples
+
+    def remove(self, face_id):
+        with self._lock:
+            self.index.remove([face_id])
+            self.names.pop(face_id, None)
+            self.spreads.pop(face_id, None)
+            self.samples.pop(face_id, None)
+
+    def _refine(self, encoding, candidates, centroid_distances, max_distance):
+        """(person id, distance) of the nearest sample among the candidate people."""
+        best_id, best_distance = None, np.inf
+        for face_id, centroid_distance in zip(candidates, centroid_distances):
+            face_id = int(face_id)
+            if centroid_distance - self.spreads[face_id] > max_distance:
+                continue
+            samples = self.samples[face_id]
+            if samples is None or not len(samples):
+                distance = centroid_distance
+            else:
+                distance = np.sqrt(np.min(np.einsum('ij,ij->i', samples - encoding, samples - encoding)))
+            if distance < best_distance:
+                best_id, best_distance = face_id, distance
+        return best_id, best_distance
+
+    def match(self, unknown_encodings, min_confidence=DEFAULT_MIN_CONFIDENCE):
+        """
+        Best registered person for each unknown encoding.
+
+        Returns:
+            One {'person_name', 'confidence'} dict per face that matched with
+            at least `min_confidence` percent, in the order of the faces
+        """
+        if not len(self) or not len(unknown_encodings):
+            return []
+        unknown = np.asarray(unknown_encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        max_distance = 1.0 - min_confidence / 100
+
+        results = []
+        with self._lock:
+            candidates, centroid_distances = self.index.search(unknown, k=self.top_k)
+            for encoding, face_ids, distances in zip(unknown, candidates, centroid_distances):
+                face_id, distance = self._refine(encoding, face_ids, distances, max_distance)
+                confidence = (1.0 - distance) * 100
+                if face_id is not None and confidence >= min_confidence:
+                    results.append({'person_name': self.names[face_id], 'confidence': float(confidence)})
+        return results
+
+
+def load_samples(memory_ids):
+    """Sample encodings of the given people in one query, as {memory id: float32 matrix}."""
+    from .models import FaceSample
+
+    rows = list(FaceSample.objects.filter(
+        memory_id__in=memory_ids
+    ).order_by('memory_id', 'id').values_list('memory_id', 'face_encoding'))
+    if not rows:
+        return {}
+    owners = np.fromiter((memory_id for memory_id, _ in rows), dtype=np.int64, count=len(rows))
+    encodings = decode_encodings([face_encoding for _, face_encoding in rows], ENCODING_SIZE)
+    # Rows are sorted by person: split the matrix where the owner changes
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    return {int(owners[start]): block for start, block in zip(starts, np.split(encodings, starts[1:]))}
+
+
+def load_gallery(user_id):
+    """Build a user's gallery from the database in two queries (see encoding_format)."""
+    from .models import Memory
+
+    rows = list(Memory.objects.filter(
+        user_id=user_id, face_encoding__isnull=False
+    ).order_by('id').values_list('id', 'person_name', 'face_encoding', 'spread'))
+    ids = [face_id for face_id, _, _, _ in rows]
+    return FaceGallery(
+        ids,
+        [person_name for _, person_name, _, _ in rows],
+        decode_encodings([face_encoding for _, _, face_encoding, _ in rows], ENCODING_SIZE),
+        [spread for _, _, _, spread in rows],
+        load_samples(ids),
+        key=f"user-{user_id}"
+    )
+
+
+def gallery_fingerprint(user_id):
+    """Summary of a user's registered faces that changes whenever their gallery does, in one query."""
+    from .models import Memory
+
+    fingerprint = Memory.objects.filter(user_id=user_id).aggregate(
+        people=Count('id', distinct=True),
+        last_person=Max('id'),
+        last_change=Max('updated_at'),
+        sample_count=Count('samples'),
+        last_sample=Max('samples__id')
+    )
+    return tuple(fingerprint[key] for key in ('people', 'last_person', 'last_change', 'sample_count', 'last_sample'))
+
+
+class EncodingStore:
+    def __init__(self):
+        self._galleries = OrderedDict()  # user id -> (fingerprint, built at, FaceGallery)
+        self._lock = threading.Lock()
+
+    @property
+    def max_users(self):
+        return getattr(settings, 'MEMORY_GALLERY_CACHE_USERS', DEFAULT_CACHE_USERS)
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'MEMORY_GALLERY_MAX_AGE', DEFAULT_MAX_AGE)
+
+    def get(self, user_id):
+        """The user's FaceGallery, loaded from the database if it is not cached or out of date."""
+        fingerprint = gallery_fingerprint(user_id)
+        with self._lock:
+            cached = self._galleries.get(user_id)
+            if cached is not None and cached[0] == fingerprint and time.monotonic() - cached[1] < self.max_age:
+                self._galleries.move_to_end(user_id)
+                return cached[2]
+
+        built_at = time.monotonic()
+        gallery = load_gallery(user_id)
+        if self.max_users > 0:
+            with self._lock:
+                # Fingerprint read before loading: a change made meanwhile reloads it again
+                self._galleries[user_id] = (fingerprint, built_at, gallery)
+                self._galleries.move_to_end(user_id)
+                while len(self._galleries) > self.max_users:
+                    self._galleries.popitem(last=False)
+        return gallery
+
+    def invalidate(self, user_id):
+        """Drop a user's gallery, so the next lookup loads it again."""
+        with self._lock:
+            self._galleries.pop(user_id, None)
+
+    def update(self, user_id, face_id, name, encoding, spread=None, samples=None):
+        """
+        Add, replace (`encoding`, the centroid, given) or remove (`encoding`
+        None) one person of a cached gallery in place, so large indexes are
+        not rebuilt for every registration. Other processes see a new
+        fingerprint and reload the gallery.
+        """
+        if user_id not in self._galleries:
+            return
+        fingerprint = gallery_fingerprint(user_id)  # Read outside the lock; this change is already saved
+        with self._lock:
+            cached = self._galleries.get(user_id)
+            if cached is None:
+                return
+            _, built_at, gallery = cached
+            try:
+                # Under the gallery's own lock too, so no match sees a half-applied change
+                if encoding is None:
+                    gallery.remove(face_id)
+                else:
+                    gallery.add(face_id, name, encoding, spread, samples)
+            except Exception:
+                self._galleries.pop(user_id, None)
+                raise
+            self._galleries[user_id] = (fingerprint, built_at, gallery)
+
+    def clear(self):
+        with self._lock:
+            self._galleries.clear()
+
+
+encoding_store = EncodingStore()
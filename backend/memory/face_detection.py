@@ -0,0 +1,188 @@
+"""
+Face detection on a downscaled copy of the photo, encoding from full resolution.
+
+Phone photos are 12 MP or more, and running the HOG detector over every pixel
+dominated the time of a lookup. An image now goes through three stages:
+
+    decode  JPEGs are decoded at 1/2, 1/4 or 1/8 size (Pillow draft mode), just
+            large enough for a MEMORY_DETECT_MAX_EDGE thumbnail; other formats
+            are decoded in full and resized
+    detect  face locations on the thumbnail, mapped back to full resolution
+    encode  the encodings, from a full-resolution crop around each face
+
+The EXIF orientation is read once. The thumbnail and the crops are turned
+upright, and the boxes are mapped to the stored (raw) pixels, so the full
+image is never rotated. When no face is found, the full image is not decoded
+at all.
+
+Every stage is timed into a `timings` dict (milliseconds) and the
+face_stage_seconds histogram (see memory/metrics.py).
+"""
+import time
+from contextlib import contextmanager
+import numpy as np
+from django.conf import settings
+from PIL import Image
+from .metrics import FACE_STAGE_SECONDS
+
+DEFAULT_DETECT_MAX_EDGE = 1024  # Pixels, 0 or None detects on the full image
+CROP_MARGIN = 0.5  # Of the face size, kept around a face for the landmark model
+
+EXIF_ORIENTATION = 0x0112
+
+# EXIF orientation -> transpose that turns the stored pixels upright
+ORIENTATION_TRANSPOSES = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+@contextmanager
+def stage(timings, name):
+    """Time a stage into `timings` (milliseconds, added up) and the stage histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        FACE_STAGE_SECONDS.observe(elapsed, stage=name)
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0.0) + elapsed * 1000, 2)
+
+
+def detect_max_edge():
+    return getattr(settings, 'MEMORY_DETECT_MAX_EDGE', DEFAULT_DETECT_MAX_EDGE)
+
+
+def _upright(image, orientation):
+    transpose = ORIENTATION_TRANSPOSES.get(orientation)
+    return image.transpose(transpose) if transpose is not None else image
+
+
+def _to_raw(x, y, orientation, width, height):
+    """Point of the upright image -> point of the stored pixels (`width` x `height`)."""
+    return {
+        2: (width - x, y),
+        3: (width - x, height - y),
+        4: (x, height - y),
+        5: (y, x),
+        6: (y, height - x),
+        7: (width - y, height - x),
+        8: (width - y, x),
+    }.get(orientation, (x, y))
+
+
+class PreparedImage:
+    """
+    An uploaded photo, decoded for detection.
+
+    Attributes:
+        thumbnail: Upright RGB uint8 array, at most `max_edge` on its longest side
+        size: (width, height) of the upright full-resolution image
+        scale: Full-resolution pixels per thumbnail pixel, (horizontal, vertical)
+    """
+
+    def __init__(self, source, max_edge=None, timings=None):
+        self.source = source
+        self._full = None
+        if max_edge is None:
+            max_edge = detect_max_edge()
+
+        with stage(timings, 'decode'):
+            image = self._open()
+            self.raw_size = image.size
+            self.orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+            if max_edge:
+                # JPEG only: decode at the smallest 1/2^n scale still covering max_edge
+                image.draft('RGB', (max_edge, max_edge))
+            image = image.convert('RGB')
+            if image.size == self.raw_size:
+                # Nothing was saved by the draft: keep the decoded pixels for the crops
+                self._full = image
+            if max_edge and max(image.size) > max_edge:
+                image = image.copy() if self._full is image else image
+                image.thumbnail((max_edge, max_edge))
+            thumbnail = _upright(image, self.orientation)
+            self.thumbnail = np.asarray(thumbnail)
+
+        # Orientations 5 to 8 swap the width and the height
+        self.size = self.raw_size[::-1] if self.orientation in (5, 6, 7, 8) else self.raw_size
+        self.scale = (self.size[0] / thumbnail.size[0], self.size[1] / thumbnail.size[1])
+
+    def _open(self):
+        if hasattr(self.source, 'seek'):
+            self.source.seek(0)
+        return Image.open(self.source)
+
+    def full(self):
+        """Stored pixels at full resolution (not turned upright), decoded on first use."""
+        if self._full is None:
+            self._full = self._open().convert('RGB')
+        return self._full
+
+    def to_full(self, box):
+        """(top, right, bottom, left) box of the thumbnail -> box of the upright full image."""
+        top, right, bottom, left = box
+        width, height = self.size
+        scale_x, scale_y = self.scale
+        return (
+            max(0, int(round(top * scale_y))),
+            min(width, int(round(right * scale_x))),
+            min(height, int(round(bottom * scale_y))),
+            max(0, int(round(left * scale_x)))
+        )
+
+    def crop(self, box):
+        """
+        Upright full-resolution crop around a face box of the upright full image.
+
+        Returns:
+            (RGB uint8 array, the box in the crop's coordinates)
+        """
+        top, right, bottom, left = box
+        width, height = self.size
+        margin_x = int((right - left) * CROP_MARGIN)
+        margin_y = int((bottom - top) * CROP_MARGIN)
+        crop_left, crop_top = max(0, left - margin_x), max(0, top - margin_y)
+        crop_right, crop_bottom = min(width, right + margin_x), min(height, bottom + margin_y)
+
+        # Corners of the upright crop in the stored pixels
+        corners = [
+            _to_raw(x, y, self.orientation, *self.raw_size)
+            for x, y in ((crop_left, crop_top), (crop_right, crop_bottom))
+        ]
+        xs, ys = zip(*corners)
+        region = self.full().crop((min(xs), min(ys), max(xs), max(ys)))
+        face = np.asarray(_upright(region, self.orientation))
+        return face, (top - crop_top, right - crop_left, bottom - crop_top, left - crop_left)
+
+
+def face_encodings(face_recognition, source, max_edge=None, timings=None):
+    """
+    Encodings of every face in an image file or uploaded file.
+
+    Args:
+        face_recognition: The face_recognition module (see FT.load_face_recognition)
+        source: Path or file object of the image
+        max_edge: Longest side of the detection thumbnail, MEMORY_DETECT_MAX_EDGE by default
+        timings: Dict that receives the milliseconds of each stage
+
+    Returns:
+        List of 128-value encodings, in the order of face_recognition.face_locations
+    """
+    image = PreparedImage(source, max_edge=max_edge, timings=timings)
+
+    with stage(timings, 'detect'):
+        boxes = [image.to_full(box) for box in face_recognition.face_locations(image.thumbnail)]
+
+    encodings = []
+    with stage(timings, 'encode'):
+        for box in boxes:
+            face, face_box = image.crop(box)
+            encodings.extend(face_recognition.face_encodings(face, known_face_locations=[face_box]))
+    return encodings
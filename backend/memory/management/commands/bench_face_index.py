@@ -0,0 +1,76 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from memory.FT import ENCODING_SIZE, FACE_INDEXES, BruteForceIndex
+
+
+def synthetic_gallery(identities, queries, seed=0):
+    """
+    Random encodings shaped like dlib's: identities about 0.9 apart, and
+    query faces about 0.35 from the identity they show.
+
+    Returns:
+        (ids, encodings, query encodings)
+    """
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.9 / np.sqrt(2 * ENCODING_SIZE), (identities, ENCODING_SIZE)).astype(np.float32)
+    shown = rng.integers(0, identities, queries)
+    noise = rng.normal(0, 0.35 / np.sqrt(ENCODING_SIZE), (queries, ENCODING_SIZE)).astype(np.float32)
+    return np.arange(1, identities + 1, dtype=np.int64), encodings, encodings[shown] + noise
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the face index backends on synthetic galleries: build time, per-query latency "
+        "and recall@1 against exact brute-force search"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                            help='Registered identities per gallery')
+        parser.add_argument('--backends', nargs='+', choices=sorted(FACE_INDEXES), default=list(FACE_INDEXES))
+        parser.add_argument('--queries', type=int, default=200, help='Faces looked up per gallery')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'size':>7} {'backend':>9} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall@1':>9}"
+        )
+        benchmarked = 0
+        for size in options['sizes']:
+            ids, encodings, queries = synthetic_gallery(size, options['queries'])
+            exact = BruteForceIndex()
+            exact.add(ids, encodings)
+            expected, _ = exact.search(queries, k=1)
+
+            for backend in options['backends']:
+                try:
+                    start = time.perf_counter()
+                    index = FACE_INDEXES[backend]()
+                    index.add(ids, encodings)
+                    index.search(queries[:1], k=1)  # Lazy structures (the ball tree) are built here
+                    build_seconds = time.perf_counter() - start
+                except ImportError as e:
+                    self.stderr.write(f"⚠️ Skipping {backend}: {str(e)}")
+                    continue
+
+                latencies = []
+                found = []
+                for query in queries:
+                    start = time.perf_counter()
+                    result, _ = index.search(query[None, :], k=1)
+                    latencies.append(time.perf_counter() - start)
+                    found.append(result[0, 0])
+                recall = float(np.mean(np.asarray(found) == expected[:, 0]))
+                benchmarked += 1
+                self.stdout.write(
+                    f"{size:>7} {backend:>9} {build_seconds:>8.2f} {_percentile(latencies, 0.5) * 1000:>8.3f} "
+                    f"{_percentile(latencies, 0.95) * 1000:>8.3f} {recall:>9.1%}"
+                )
+
+        if not benchmarked:
+            raise CommandError("No face index backend could be benchmarked")
@@ -0,0 +1,15 @@
+"""
+Metrics of face identification (see backend/metrics.py for the /metrics endpoint).
+
+FACE_STAGE_SECONDS has one series per stage (see memory/face_detection.py):
+
+    decode  decoding the photo into the detection thumbnail
+    detect  finding the faces on the thumbnail
+    encode  encoding each face from a full-resolution crop
+    match   comparing the encodings with the user's gallery
+"""
+from backend.metrics import metrics
+
+FACE_STAGE_SECONDS = metrics.histogram(
+    'face_stage_seconds', 'Duration of face identification stages', ['stage']
+)
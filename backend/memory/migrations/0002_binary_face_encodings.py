@@ -0,0 +1,48 @@
+import pickle
+import struct
+import numpy as np
+from django.db import migrations
+
+# Frozen copy of memory/encoding_format.py version 1 (float32), so later
+# format changes don't alter this migration
+HEADER = struct.Struct('<2sBBHxx')
+MAGIC = b"FE"
+PICKLE_PROTOCOL_MARK = b"\x80"
+
+
+def to_binary(apps, schema_editor):
+    Memory = apps.get_model('memory', 'Memory')
+    converted = []
+    for memory in Memory.objects.filter(face_encoding__isnull=False).only('id', 'face_encoding').iterator():
+        data = bytes(memory.face_encoding)
+        if not data.startswith(PICKLE_PROTOCOL_MARK):
+            continue  # Already converted
+        values = np.ascontiguousarray(pickle.loads(data), dtype='<f4').ravel()
+        memory.face_encoding = HEADER.pack(MAGIC, 1, 0, len(values)) + values.tobytes()
+        converted.append(memory)
+    Memory.objects.bulk_update(converted, ['face_encoding'], batch_size=500)
+
+
+def to_pickle(apps, schema_editor):
+    Memory = apps.get_model('memory', 'Memory')
+    converted = []
+    for memory in Memory.objects.filter(face_encoding__isnull=False).only('id', 'face_encoding').iterator():
+        data = bytes(memory.face_encoding)
+        if not data.startswith(MAGIC):
+            continue
+        _, _, code, count = HEADER.unpack_from(data)
+        values = np.frombuffer(data, dtype='<f2' if code == 1 else '<f4', count=count, offset=HEADER.size)
+        memory.face_encoding = pickle.dumps(values.astype(np.float64))
+        converted.append(memory)
+    Memory.objects.bulk_update(converted, ['face_encoding'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_binary, to_pickle),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-17 22:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import memory.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory', '0002_binary_face_encodings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memory',
+            name='spread',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='FaceSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to=memory.models.face_sample_path)),
+                ('face_encoding', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('memory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='samples', to='memory.memory')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_samples(apps, schema_editor):
+    # Every registered face becomes the first sample of its person's gallery,
+    # so its encoding is also the centroid and the spread is zero
+    Memory = apps.get_model('memory', 'Memory')
+    FaceSample = apps.get_model('memory', 'FaceSample')
+    samples = []
+    for memory in Memory.objects.filter(face_encoding__isnull=False).exclude(samples__isnull=False).iterator():
+        samples.append(FaceSample(memory=memory, image=memory.image_path.name, face_encoding=memory.face_encoding))
+    FaceSample.objects.bulk_create(samples, batch_size=500)
+    Memory.objects.filter(face_encoding__isnull=False).update(spread=0.0)
+
+
+def remove_samples(apps, schema_editor):
+    apps.get_model('memory', 'FaceSample').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory', '0003_face_samples'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_samples, remove_samples),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory', '0004_face_samples_from_memories'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memory',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
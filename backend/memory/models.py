@@ -11,12 +11,28 @@ class Memory(models.Model):
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
     person_name = models.CharField(max_length=100) # Name of the person in the memory
     image_path = models.ImageField(upload_to=person_directory_path) # Path to the image
-    face_encoding = models.BinaryField(null=True, blank=True) # Face encoding data
+    face_encoding = models.BinaryField(null=True, blank=True) # Centroid of the FaceSample encodings (memory/encoding_format.py)
+    spread = models.FloatField(null=True, blank=True) # Largest distance of a sample encoding to the centroid
     onboarding = models.BooleanField(default=False) # Whether the memory is onboarding
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True) # Part of the gallery fingerprint (memory/encoding_store.py)
 
     class Meta:
         unique_together = ('user', 'person_name') # Ensure unique person name per user
     
     def __str__(self):
-        return f"Memory {self.id} - {self.person_name} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"Memory {self.id} - {self.person_name} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+def face_sample_path(instance, filename):
+    return f'memory_images/{instance.memory.user.id}/{filename}'
+
+class FaceSample(models.Model):
+    """One reference photo of a registered person and its face encoding."""
+    memory = models.ForeignKey(Memory, on_delete=models.CASCADE, related_name='samples')
+    image = models.ImageField(upload_to=face_sample_path)
+    face_encoding = models.BinaryField() # memory/encoding_format.py
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Face sample {self.id} of {self.memory.person_name}"
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from .encoding_format import decode_encoding
+from .encoding_store import encoding_store, load_samples
+from .models import Memory, FaceSample
+
+# Sent with user_id after bulk changes to a user's faces that skip the model
+# signals, e.g. QuerySet.update() or bulk_create()
+gallery_changed = Signal()
+
+
+@receiver(post_save, sender=Memory)
+def update_gallery_on_save(sender, instance, **kwargs):
+    if instance.face_encoding:
+        encoding_store.update(
+            instance.user_id, instance.id, instance.person_name,
+            decode_encoding(bytes(instance.face_encoding)), instance.spread,
+            load_samples([instance.id]).get(instance.id)
+        )
+    else:
+        encoding_store.update(instance.user_id, instance.id, instance.person_name, None)
+
+
+@receiver(post_delete, sender=FaceSample)
+def refresh_centroid_on_sample_delete(sender, instance, origin=None, **kwargs):
+    # Samples deleted along with their person (or user) need no new centroid
+    if origin is not None and not (isinstance(origin, FaceSample) or getattr(origin, 'model', None) is FaceSample):
+        return
+    from .FT import FaceRecognitionSystem
+
+    memory = Memory.objects.filter(id=instance.memory_id).first()
+    if memory is not None:
+        # Saving the new centroid and spread updates the cached gallery
+        FaceRecognitionSystem.refresh_centroid(memory)
+
+
+@receiver(post_delete, sender=Memory)
+def update_gallery_on_delete(sender, instance, **kwargs):
+    encoding_store.update(instance.user_id, instance.id, instance.person_name, None)
+
+
+@receiver(gallery_changed)
+def invalidate_gallery(sender, user_id, **kwargs):
+    encoding_store.invalidate(user_id)
@@ -1,3 +1,436 @@
-from django.test import TestCase
+import datetime
+import importlib
+import importlib.util
+import io
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+from django.apps import apps
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from users.models import UserProfile
+from .encoding_format import HEADER, decode_encoding, decode_encodings, encode_encoding
+from .encoding_store import FaceGallery, encoding_store
+from .FT import BallTreeIndex, BruteForceIndex, FaceRecognitionSystem, HNSWIndex, build_face_index
+from .face_detection import CROP_MARGIN, EXIF_ORIENTATION, ORIENTATION_TRANSPOSES, PreparedImage, _to_raw
+from .models import FaceSample, Memory
+from .signals import gallery_changed
 
-# Create your tests here.
+binary_face_encodings = importlib.import_module('memory.migrations.0002_binary_face_encodings')
+
+
+def random_encoding(seed=0):
+    return np.random.default_rng(seed).normal(0, 0.1, 128)
+
+
+class EncodingFormatTests(SimpleTestCase):
+    def test_float32_round_trip(self):
+        encoding = random_encoding()
+        data = encode_encoding(encoding, 'float32')
+        self.assertEqual(len(data), HEADER.size + 128 * 4)
+        np.testing.assert_array_equal(decode_encoding(data), encoding.astype(np.float32))
+
+    def test_float16_round_trip(self):
+        encoding = random_encoding()
+        data = encode_encoding(encoding, 'float16')
+        self.assertEqual(len(data), HEADER.size + 128 * 2)
+        np.testing.assert_allclose(decode_encoding(data), encoding, atol=1e-3)
+
+    def test_unknown_dtype(self):
+        with self.assertRaises(ValueError):
+            encode_encoding(random_encoding(), 'float64')
+
+    def test_decode_encodings_mixed_dtypes(self):
+        encodings = [random_encoding(seed) for seed in range(3)]
+        blobs = [
+            encode_encoding(encodings[0], 'float32'),
+            memoryview(encode_encoding(encodings[1], 'float16')),
+            encode_encoding(encodings[2], 'float32'),
+        ]
+        matrix = decode_encodings(blobs)
+        self.assertEqual(matrix.shape, (3, 128))
+        self.assertEqual(matrix.dtype, np.float32)
+        np.testing.assert_allclose(matrix, np.vstack(encodings), atol=1e-3)
+
+    def test_decode_encodings_float32_fast_path(self):
+        encodings = np.vstack([random_encoding(seed) for seed in range(4)]).astype(np.float32)
+        matrix = decode_encodings([encode_encoding(encoding) for encoding in encodings])
+        np.testing.assert_array_equal(matrix, encodings)
+        self.assertEqual(decode_encodings([]).shape, (0, 128))
+
+    def test_rejects_bad_magic(self):
+        data = b"XX" + encode_encoding(random_encoding())[2:]
+        with self.assertRaises(ValueError):
+            decode_encoding(data)
+
+    def test_rejects_wrong_length(self):
+        data = encode_encoding(random_encoding())
+        for broken in (data[:-4], data + b"\0\0\0\0", data[:HEADER.size - 1]):
+            with self.assertRaises(ValueError):
+                decode_encoding(broken)
+
+    def test_rejects_pickle(self):
+        with self.assertRaises(ValueError):
+            decode_encoding(pickle.dumps(random_encoding()))
+
+
+class BinaryFaceEncodingsMigrationTests(TestCase):
+    def setUp(self):
+        user = UserProfile.objects.create(firebase_uid='uid', email='user@example.com', name='User', age=70, gender='f')
+        self.encoding = random_encoding()
+        self.memory = Memory.objects.create(user=user, person_name='Ann', image_path='ann.jpg')
+        # As stored before the migration; update() skips the gallery signals, which expect the binary format
+        Memory.objects.filter(id=self.memory.id).update(face_encoding=pickle.dumps(self.encoding))
+        Memory.objects.create(user=user, person_name='Bob', image_path='bob.jpg')
+
+    def stored(self):
+        return bytes(Memory.objects.get(id=self.memory.id).face_encoding)
+
+    def test_pickle_to_binary_and_back(self):
+        binary_face_encodings.to_binary(apps, None)
+        np.testing.assert_array_equal(decode_encoding(self.stored()), self.encoding.astype(np.float32))
+
+        # Converting again leaves binary rows alone
+        binary_face_encodings.to_binary(apps, None)
+        np.testing.assert_array_equal(decode_encoding(self.stored()), self.encoding.astype(np.float32))
+
+        binary_face_encodings.to_pickle(apps, None)
+        restored = pickle.loads(self.stored())
+        self.assertEqual(restored.dtype, np.float64)
+        np.testing.assert_allclose(restored, self.encoding, atol=1e-6)
+
+    def test_float16_rows_convert_back_to_pickle(self):
+        Memory.objects.filter(id=self.memory.id).update(face_encoding=encode_encoding(self.encoding, 'float16'))
+        binary_face_encodings.to_pickle(apps, None)
+        np.testing.assert_allclose(pickle.loads(self.stored()), self.encoding, atol=1e-3)
+
+
+def installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+class FaceIndexTests(SimpleTestCase):
+    def assert_churn_matches_brute_force(self, index_class):
+        """Random adds, re-adds and removes of a few ids; every search must agree with brute force."""
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            index, reference = index_class(), BruteForceIndex()
+            for _ in range(30):
+                face_id = int(rng.integers(1, 5))
+                if rng.random() < 0.6:
+                    vector = rng.normal(0, 1, (1, 128)).astype(np.float32)
+                    index.add([face_id], vector)
+                    reference.add([face_id], vector)
+                else:
+                    index.remove([face_id])
+                    reference.remove([face_id])
+                self.assertEqual(len(index), len(reference))
+
+                queries = rng.normal(0, 1, (3, 128)).astype(np.float32)
+                ids, distances = index.search(queries, k=2)
+                expected_ids, expected_distances = reference.search(queries, k=2)
+                np.testing.assert_array_equal(ids, expected_ids)
+                np.testing.assert_allclose(distances, expected_distances, rtol=1e-4)
+
+    @unittest.skipUnless(installed('sklearn'), "scikit-learn is not installed")
+    def test_balltree_churn(self):
+        self.assert_churn_matches_brute_force(BallTreeIndex)
+
+    @unittest.skipUnless(installed('hnswlib'), "hnswlib is not installed")
+    def test_hnsw_churn(self):
+        self.assert_churn_matches_brute_force(HNSWIndex)
+
+    def assert_persisted(self, backend):
+        rng = np.random.default_rng(0)
+        ids = np.arange(1, 21)
+        vectors = rng.normal(0, 1, (20, 128)).astype(np.float32)
+        queries = vectors[[3, 11]] + 0.01
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(MEMORY_FACE_INDEX_DIR=directory):
+            def saved():
+                return [name for name in os.listdir(directory) if name.endswith('.idx')]
+
+            built = build_face_index(ids, vectors, backend=backend, key='user-1')
+            first = saved()
+            self.assertEqual(len(first), 1)
+
+            loaded = build_face_index(ids, vectors, backend=backend, key='user-1')
+            self.assertIsNot(loaded, built)
+            self.assertEqual(len(loaded), 20)
+            np.testing.assert_array_equal(loaded.search(queries)[0], [[4], [12]])
+
+            # A changed gallery replaces the stale save
+            build_face_index(ids[:-1], vectors[:-1], backend=backend, key='user-1')
+            self.assertEqual(len(saved()), 1)
+            self.assertNotEqual(saved(), first)
+
+    @unittest.skipUnless(installed('sklearn'), "scikit-learn is not installed")
+    def test_balltree_is_saved_and_loaded(self):
+        self.assert_persisted('balltree')
+
+    @unittest.skipUnless(installed('hnswlib'), "hnswlib is not installed")
+    def test_hnsw_is_saved_and_loaded(self):
+        self.assert_persisted('hnsw')
+
+    def test_brute_force_is_not_saved(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(MEMORY_FACE_INDEX_DIR=directory):
+            index = build_face_index([1], np.zeros((1, 128)), backend='brute', key='user-1')
+            self.assertEqual(len(index), 1)
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            build_face_index([], np.empty((0, 128)), backend='annoy')
+
+
+class EncodingStoreTests(TestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create(firebase_uid='uid', email='user@example.com', name='User', age=70, gender='f')
+        encoding_store.clear()
+        self.addCleanup(encoding_store.clear)
+        self.ann = random_encoding(1).astype(np.float32)
+        self.bob = random_encoding(2).astype(np.float32)
+        self.memory = self.person("Ann", self.ann)
+
+    def person(self, name, encoding):
+        return Memory.objects.create(
+            user=self.user, person_name=name, image_path=f"{name}.jpg", face_encoding=encode_encoding(encoding), spread=0.0
+        )
+
+    def names(self, encoding):
+        return [match['person_name'] for match in encoding_store.get(self.user.id).match([encoding])]
+
+    def test_registration_updates_the_cached_gallery_in_place(self):
+        gallery = encoding_store.get(self.user.id)
+        self.assertEqual(self.names(self.ann), ["Ann"])
+
+        self.person("Bob", self.bob)
+        self.assertIs(encoding_store.get(self.user.id), gallery)
+        self.assertEqual(self.names(self.bob), ["Bob"])
+
+    def test_deleted_person_is_no_longer_matched(self):
+        gallery = encoding_store.get(self.user.id)
+        self.memory.delete()
+        self.assertIs(encoding_store.get(self.user.id), gallery)
+        self.assertEqual(self.names(self.ann), [])
+
+    def test_bulk_update_with_gallery_changed_reloads(self):
+        gallery = encoding_store.get(self.user.id)
+        Memory.objects.filter(id=self.memory.id).update(face_encoding=encode_encoding(self.bob))
+        gallery_changed.send(sender=Memory, user_id=self.user.id)
+        self.assertIsNot(encoding_store.get(self.user.id), gallery)
+        self.assertEqual(self.names(self.bob), ["Ann"])
+        self.assertEqual(self.names(self.ann), [])
+
+    def test_change_by_another_process_reloads(self):
+        # No signal reaches this process; the fingerprint (updated_at) differs
+        gallery = encoding_store.get(self.user.id)
+        Memory.objects.filter(id=self.memory.id).update(
+            face_encoding=encode_encoding(self.bob), updated_at=timezone.now() + datetime.timedelta(seconds=1)
+        )
+        self.assertIsNot(encoding_store.get(self.user.id), gallery)
+        self.assertEqual(self.names(self.bob), ["Ann"])
+
+    def test_unchanged_gallery_is_reused_until_it_is_too_old(self):
+        gallery = encoding_store.get(self.user.id)
+        self.assertIs(encoding_store.get(self.user.id), gallery)
+        with self.settings(MEMORY_GALLERY_MAX_AGE=0):
+            self.assertIsNot(encoding_store.get(self.user.id), gallery)
+
+
+class FaceGalleryTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.centroids = rng.normal(0, 0.9 / np.sqrt(256), (50, 128)).astype(np.float32)
+        ids = list(range(1, 51))
+        self.gallery = FaceGallery(
+            ids, [f"person {face_id}" for face_id in ids], self.centroids, [0.0] * 50,
+            {face_id: self.centroids[face_id - 1:face_id] for face_id in ids}
+        )
+
+    def test_match(self):
+        self.assertEqual(
+            [match['person_name'] for match in self.gallery.match(self.centroids[[4, 9]])],
+            ["person 5", "person 10"]
+        )
+
+    def test_samples_refine_the_nearest_centroids(self):
+        axes = np.eye(128, dtype=np.float32)
+        near_centroid = axes[0] * 0.3  # One sample, 0.3 from the face
+        spread_out = np.vstack([axes[1] * 0.05, axes[1] * 0.65])  # Centroid 0.35 away, one sample 0.05 away
+        gallery = FaceGallery(
+            [1, 2], ["Ann", "Bob"], np.vstack([near_centroid, spread_out.mean(axis=0)]), [0.0, 0.3],
+            {1: near_centroid[None, :], 2: spread_out}
+        )
+        face = np.zeros((1, 128), dtype=np.float32)
+
+        [match] = gallery.match(face)
+        self.assertEqual(match['person_name'], "Bob")
+        self.assertAlmostEqual(match['confidence'], 95.0, places=4)
+
+        # Only the nearest centroid is refined
+        with self.settings(MEMORY_FACE_REFINE_TOP_K=1):
+            [match] = gallery.match(face)
+        self.assertEqual(match['person_name'], "Ann")
+        self.assertAlmostEqual(match['confidence'], 70.0, places=4)
+
+        # Too far for any sample of either person to be within the threshold
+        self.assertEqual(gallery.match(face, min_confidence=99), [])
+
+    def test_match_while_people_change(self):
+        """Registrations change a shared gallery in place while other threads match against it."""
+        errors = []
+        stop = threading.Event()
+
+        def churn():
+            rng = np.random.default_rng(1)
+            while not stop.is_set():
+                face_id = int(rng.integers(100, 200))
+                encoding = rng.normal(0, 1, 128).astype(np.float32)
+                self.gallery.add(face_id, "someone else", encoding, 0.0, encoding[None, :])
+                self.gallery.remove(face_id)
+
+        def identify():
+            try:
+                for _ in range(2000):
+                    matches = self.gallery.match(self.centroids[[7]])
+                    if [match['person_name'] for match in matches] != ["person 8"]:
+                        errors.append(matches)
+            except Exception as e:
+                errors.append(e)
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # Switch threads often, so a half-applied change would be seen
+        try:
+            writer = threading.Thread(target=churn)
+            readers = [threading.Thread(target=identify) for _ in range(4)]
+            writer.start()
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+            stop.set()
+            writer.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        self.assertEqual(errors, [])
+
+
+class OrientationTests(SimpleTestCase):
+    def setUp(self):
+        # Every pixel holds its own (x, y), so a wrong mapping shows up as a wrong value
+        self.width, self.height = 6, 4
+        ys, xs = np.mgrid[:self.height, :self.width]
+        self.raw = Image.fromarray(np.dstack([xs, ys, np.zeros_like(xs)]).astype(np.uint8))
+
+    def test_to_raw_maps_upright_pixels_to_stored_pixels(self):
+        for orientation, transpose in ORIENTATION_TRANSPOSES.items():
+            upright = np.asarray(self.raw.transpose(transpose))
+            for y in range(upright.shape[0]):
+                for x in range(upright.shape[1]):
+                    # A pixel spans from its corner (x, y) to (x + 1, y + 1)
+                    corners = [_to_raw(cx, cy, orientation, self.width, self.height) for cx, cy in ((x, y), (x + 1, y + 1))]
+                    xs, ys = zip(*corners)
+                    self.assertEqual(tuple(upright[y, x, :2]), (min(xs), min(ys)), f"orientation {orientation}")
+
+    def test_crop_is_upright(self):
+        for orientation, transpose in ORIENTATION_TRANSPOSES.items():
+            exif = Image.Exif()
+            exif[EXIF_ORIENTATION] = orientation
+            source = io.BytesIO()
+            self.raw.save(source, 'PNG', exif=exif)
+            upright = np.asarray(self.raw.transpose(transpose))
+
+            image = PreparedImage(source, max_edge=0)
+            self.assertEqual(image.size, (upright.shape[1], upright.shape[0]))
+            np.testing.assert_array_equal(image.thumbnail, upright)
+            # Off-centre, so a mirrored mapping picks other pixels; grown by the margin on every side
+            face, _ = image.crop((0, 3, 2, 1))  # (top, right, bottom, left)
+            margin = int(2 * CROP_MARGIN)
+            np.testing.assert_array_equal(
+                face, upright[0:2 + margin, 1 - margin:3 + margin],
+                f"orientation {orientation}"
+            )
+
+
+class FaceRegistrationTests(TestCase):
+    """register_face with face detection patched out; each photo gets the next of `faces`."""
+
+    def setUp(self):
+        self.user = UserProfile.objects.create(firebase_uid='uid', email='user@example.com', name='User', age=70, gender='f')
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(encoding_store.clear)
+
+        self.faces = []
+        patcher = mock.patch.object(
+            FaceRecognitionSystem, 'extract_face_encoding', side_effect=lambda image: self.faces.pop(0)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def register(self, name, face):
+        self.faces.append(face)
+        return FaceRecognitionSystem.register_face(self.user, name, SimpleUploadedFile(f"{name}.jpg", b"photo"))
+
+    def stored_files(self):
+        return sorted(name for _, _, names in os.walk(self.media_root) for name in names)
+
+    def test_photos_become_samples(self):
+        encodings = [random_encoding(seed).astype(np.float32) for seed in range(3)]
+        for encoding in encodings:
+            memory = self.register("Ann", encoding)
+            self.assertTrue(memory.face_detected)
+
+        memory.refresh_from_db()
+        self.assertEqual(memory.samples.count(), 3)
+        self.assertEqual(len(self.stored_files()), 3)
+        self.assertEqual(memory.image_path.name, memory.samples.order_by('id').first().image.name)
+        centroid = np.mean(encodings, axis=0)
+        np.testing.assert_allclose(decode_encoding(bytes(memory.face_encoding)), centroid, atol=1e-6)
+        self.assertAlmostEqual(memory.spread, max(np.linalg.norm(encodings - centroid, axis=1)), places=5)
+
+    def test_photo_without_face_is_only_kept_as_first_picture(self):
+        memory = self.register("Ann", None)
+        self.assertFalse(memory.face_detected)
+        self.assertEqual(len(self.stored_files()), 1)
+
+        self.register("Ann", random_encoding().astype(np.float32))
+        self.register("Ann", None)
+        self.assertEqual(len(self.stored_files()), 2)  # The first picture and the one sample
+        self.assertEqual(FaceSample.objects.count(), 1)
+
+    def test_deleting_samples_refreshes_the_centroid(self):
+        first, second = random_encoding(1).astype(np.float32), random_encoding(2).astype(np.float32)
+        memory = self.register("Ann", first)
+        self.register("Ann", second)
+        self.assertEqual(encoding_store.get(self.user.id).match([first])[0]['person_name'], "Ann")
+
+        memory.samples.order_by('id').first().delete()
+        memory.refresh_from_db()
+        np.testing.assert_array_equal(decode_encoding(bytes(memory.face_encoding)), second)
+        self.assertEqual(memory.spread, 0.0)
+
+        FaceSample.objects.filter(memory=memory).delete()
+        memory.refresh_from_db()
+        self.assertIsNone(memory.face_encoding)
+        self.assertIsNone(memory.spread)
+        self.assertEqual(encoding_store.get(self.user.id).match([second]), [])
+
+    def test_deleting_a_person_skips_the_refresh(self):
+        memory = self.register("Ann", random_encoding().astype(np.float32))
+        with mock.patch.object(FaceRecognitionSystem, 'refresh_centroid') as refresh_centroid:
+            memory.delete()
+        refresh_centroid.assert_not_called()
+        self.assertFalse(FaceSample.objects.exists())
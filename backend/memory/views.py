@@ -5,16 +5,21 @@ from .models import Memory
 from users.models import UserProfile
 from django.core.files.storage import default_storage
 from django.conf import settings
+from django.db.models import Count
 import os
 from .FT import FaceRecognitionSystem
+from .encoding_store import encoding_store
+from .face_detection import face_encodings, stage
+from backend.structured_log import get_logger
 from users.authentication import firebase_auth_required
 from django.core.files.base import ContentFile
-import face_recognition
 from PIL import Image
 from io import BytesIO
 import numpy as np
 import uuid 
 
+log = get_logger('memory.views')
+
 # Create your views here.
 
 class RegisterFace(APIView):
@@ -45,7 +50,7 @@ class RegisterFace(APIView):
             return Response({"message": "Failed to register face"}, status=500)
             
         # Check if face encoding was successful
-        if memory.face_encoding:
+        if memory.face_detected:
             return Response({
                 "message": f"Face for {person_name} registered successfully",
                 "person_name": person_name,
@@ -112,7 +117,13 @@ class RegisterFace(APIView):
 #                 os.remove(temp_path)
 
 class IdentifyFaces(APIView):
-    """API view to identify faces in an image, optimized for live/mobile use."""
+    """
+    API view to identify faces in an image, optimized for live/mobile use.
+
+    Faces are detected on a downscaled copy of the photo and encoded from
+    full-resolution crops (see face_detection). Every response carries the
+    milliseconds spent in each stage as `timings_ms`.
+    """
 
     @firebase_auth_required
     def post(self, request):
@@ -122,50 +133,42 @@ class IdentifyFaces(APIView):
         if not image:
             return Response({"message": "No image uploaded"}, status=400)
 
+        timings = {}
         try:
+            face_recognition = FaceRecognitionSystem._ensure_model_loaded()
+
             # Read the uploaded image from memory (no need to save to disk)
-            unknown_img = face_recognition.load_image_file(image)
-            unknown_encodings = face_recognition.face_encodings(unknown_img)
+            unknown_encodings = face_encodings(face_recognition, image, timings=timings)
 
             if not unknown_encodings:
-                return Response({"message": "No face detected"}, status=200)
-
-            # Get stored face encodings for this user
-            memories = Memory.objects.filter(user=user, face_encoding__isnull=False)
-            if not memories.exists():
-                return Response({"message": "No registered faces to compare"}, status=200)
+                return self._respond({"message": "No face detected"}, user, timings)
 
-            results = []
+            # Registered faces of this user, as one matrix (see encoding_store)
+            with stage(timings, 'match'):
+                gallery = encoding_store.get(user.id)
+                matches = gallery.match(unknown_encodings) if len(gallery) else None
+            if matches is None:
+                return self._respond({"message": "No registered faces to compare"}, user, timings)
 
-            for unknown_encoding in unknown_encodings:
-                best_match = None
-                highest_confidence = 0
-
-                for memory in memories:
-                    known_encoding = pickle.loads(memory.face_encoding)
-                    distance = face_recognition.face_distance([known_encoding], unknown_encoding)[0]
-                    confidence = (1 - distance) * 100
-
-                    if confidence >= 60 and confidence > highest_confidence:
-                        best_match = memory
-                        highest_confidence = confidence
-
-                if best_match:
-                    results.append({
-                        "person_name": best_match.person_name,
-                        "confidence": f"{highest_confidence:.2f}%"
-                    })
+            results = [
+                {"person_name": match["person_name"], "confidence": f"{match['confidence']:.2f}%"}
+                for match in matches
+            ]
 
             if not results:
-                return Response({"message": "No known faces identified"}, status=200)
+                return self._respond({"message": "No known faces identified"}, user, timings, faces=len(unknown_encodings))
 
-            return Response({
+            return self._respond({
                 "message": "Face identification completed",
                 "identified_people": results
-            }, status=200)
+            }, user, timings, faces=len(unknown_encodings))
 
         except Exception as e:
-            return Response({"message": f"Error processing image: {str(e)}"}, status=500)
+            return Response({"message": f"Error processing image: {str(e)}", "timings_ms": timings}, status=500)
+
+    def _respond(self, data, user, timings, faces=0):
+        log.info('faces_identified', user_id=user.id, faces=faces, **{f"{name}_ms": ms for name, ms in timings.items()})
+        return Response({**data, "timings_ms": timings}, status=200)
 
 
 class ListRegisteredFaces(APIView):
@@ -175,8 +178,8 @@ class ListRegisteredFaces(APIView):
     def get(self, request):
         user = request.user
         
-        # Get all memory objects for this user
-        memories = Memory.objects.filter(user=user)
+        # Get all memory objects for this user, with the size of their photo gallery
+        memories = Memory.objects.filter(user=user).annotate(photo_count=Count('samples'))
         
         if not memories:
             return Response({"message": "No faces registered yet"}, status=200)
@@ -187,6 +190,7 @@ class ListRegisteredFaces(APIView):
             registered_faces.append({
                 "person_name": memory.person_name,
                 "image_url": memory.image_path.url if memory.image_path else None,
+                "photo_count": memory.photo_count,
                 "created_at": memory.created_at.strftime('%Y-%m-%d %H:%M')
             })
             
@@ -206,13 +210,16 @@ class DeleteFace(APIView):
             # Get the memory object
             memory = Memory.objects.get(user=user, person_name=person_name)
             
-            # Delete the image file
+            # Delete the image files: the person's picture and every gallery photo
+            image_paths = {sample.image.path for sample in memory.samples.all() if sample.image}
             if memory.image_path:
-                if os.path.exists(memory.image_path.path):
-                    os.remove(memory.image_path.path)
+                image_paths.add(memory.image_path.path)
+            for image_path in image_paths:
+                if os.path.exists(image_path):
+                    os.remove(image_path)
                     
                 # Try to remove the directory if it's empty
-                dir_path = os.path.dirname(memory.image_path.path)
+                dir_path = os.path.dirname(image_path)
                 if os.path.exists(dir_path) and not os.listdir(dir_path):
                     os.rmdir(dir_path)
             
@@ -259,7 +266,7 @@ class BulkRegisterFaces(APIView):
             if memory:
                 result = {
                     "person_name": person_name,
-                    "status": "success" if memory.face_encoding else "no_face_detected",
+                    "status": "success" if memory.face_detected else "no_face_detected",
                     "image_url": memory.image_path.url if memory.image_path else None
                 }
             else:
@@ -1,9 +1,17 @@
 import nltk
+import os
+import sys
 import dateparser
 from dateparser.search import search_dates
 from datetime import datetime
 from nltk.sentiment import SentimentIntensityAnalyzer
-from transformers import pipeline, logging
+from transformers import logging
+
+# The shared keyword lexicon lives in the backend's audio app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from audio.lexicon import Lexicon
+# Set INFERENCE_BACKEND=quantized or onnx to run the models on a faster CPU backend
+from audio.model_backends import load_pipeline, DISTILBERT_MODEL, NER_MODEL
 
 # Suppress unimportant warnings from transformers
 logging.set_verbosity_error()
@@ -17,10 +25,7 @@ vader_analyzer = SentimentIntensityAnalyzer()
 # Initialize DistilBERT
 print("⚙️ Loading DistilBERT sentiment model...")
 try:
-    distilbert_analyzer = pipeline(
-        "sentiment-analysis",
-        model="distilbert/distilbert-base-uncased-finetuned-sst-2-english"
-    )
+    distilbert_analyzer = load_pipeline("sentiment-analysis", DISTILBERT_MODEL)
 except Exception as e:
     print(f"❌ Failed to load DistilBERT model: {e}")
     exit(1)
@@ -28,11 +33,7 @@ except Exception as e:
 # Initialize NER pipeline for location extraction
 print("⚙️ Loading NER model for location detection...")
 try:
-    ner_pipeline = pipeline(
-        "ner",
-        model="dbmdz/bert-large-cased-finetuned-conll03-english",
-        aggregation_strategy="simple"
-    )
+    ner_pipeline = load_pipeline("ner", NER_MODEL, aggregation_strategy="simple")
 except Exception as e:
     print(f"❌ Failed to load NER model: {e}")
     exit(1)
@@ -64,6 +65,38 @@ adl_keywords = {
     "social": ["visit", "friend", "family", "talk", "called", "phone", "conversation"]
 }
 
+# Time-of-day mentions
+time_of_day_keywords = {
+    "morning": ["morning", "breakfast", "wake", "dawn", "early", "am"],
+    "afternoon": ["afternoon", "lunch", "noon", "midday"],
+    "evening": ["evening", "dinner", "supper", "sunset", "dusk", "pm"],
+    "night": ["night", "bed", "sleep", "midnight", "late"]
+}
+
+# Tiers of importance with different weights
+importance_tiers = {
+    "high": ["urgent", "critical", "emergency", "help", "fell", "fall", "hurt", "pain"],
+    "medium": ["important", "must", "need", "required", "medication", "medicine", "doctor", "appointment"],
+    "low": ["wish", "plan", "eat", "food", "bath", "shower", "sleep", "walk"]
+}
+
+# Concerns that might need caregiver attention
+concern_keywords = {
+    "memory_issue": ["forgot", "can't remember", "don't remember", "confused", "where am i", "what day"],
+    "safety_risk": ["fell", "fall", "hurt", "injury", "lost", "wander", "fire", "stove", "burn"],
+    "emotional_distress": ["scared", "afraid", "anxious", "sad", "crying", "depressed", "upset"],
+    "medication_issue": ["missed", "forgot pill", "forgot medication", "extra pill", "double dose"]
+}
+
+# Every keyword group compiled into one matcher; substring mode keeps the
+# semantics of the original `keyword in text_lower` checks
+lexicon = Lexicon({
+    **{f"adl:{name}": keywords for name, keywords in adl_keywords.items()},
+    **{f"time:{name}": keywords for name, keywords in time_of_day_keywords.items()},
+    **{f"importance:{tier}": keywords for tier, keywords in importance_tiers.items()},
+    **{f"concern:{name}": keywords for name, keywords in concern_keywords.items()},
+}, whole_words=False)
+
 def map_distilbert_to_compound(label, score):
     """Convert DistilBERT's binary output to a compound-like score between -1 and 1"""
     if label == "POSITIVE":
@@ -71,31 +104,19 @@ def map_distilbert_to_compound(label, score):
     else:  # NEGATIVE
         return -score  # Convert to negative value between -1 and 0
 
-def detect_adls(text):
+def detect_adls(text, hits=None):
     """Detect activities of daily living in the text"""
-    text_lower = text.lower()
-    detected_adls = []
+    if hits is None:
+        hits = lexicon.scan(text)
     
-    for category, keywords in adl_keywords.items():
-        if any(keyword in text_lower for keyword in keywords):
-            detected_adls.append(category)
-    
-    return detected_adls
+    return [category for category in adl_keywords if hits.found(f"adl:{category}")]
 
-def detect_time_of_day(text):
+def detect_time_of_day(text, hits=None):
     """Detect time of day mentions"""
-    text_lower = text.lower()
-    times = {
-        "morning": ["morning", "breakfast", "wake", "dawn", "early", "am"],
-        "afternoon": ["afternoon", "lunch", "noon", "midday"],
-        "evening": ["evening", "dinner", "supper", "sunset", "dusk", "pm"],
-        "night": ["night", "bed", "sleep", "midnight", "late"]
-    }
-    
-    detected_times = []
-    for time_period, keywords in times.items():
-        if any(keyword in text_lower for keyword in keywords):
-            detected_times.append(time_period)
+    if hits is None:
+        hits = lexicon.scan(text)
+    
+    detected_times = [period for period in time_of_day_keywords if hits.found(f"time:{period}")]
     
     return detected_times if detected_times else ["no specific time detected"]
 
@@ -132,18 +153,14 @@ def get_event_location(text):
         return "🌍 No clear location detected"
     
     
-def get_importance_score(text):
-    text_lower = text.lower()
-    
-    # Define tiers of importance with different weights
-    high_importance = ["urgent", "critical", "emergency", "help", "fell", "fall", "hurt", "pain"]
-    medium_importance = ["important", "must", "need", "required", "medication", "medicine", "doctor", "appointment"]
-    low_importance = ["wish", "plan", "eat", "food", "bath", "shower", "sleep", "walk"]
+def get_importance_score(text, hits=None):
+    if hits is None:
+        hits = lexicon.scan(text)
     
     # Count weighted occurrences
-    high_count = sum(1 for keyword in high_importance if keyword in text_lower)
-    medium_count = sum(1 for keyword in medium_importance if keyword in text_lower)
-    low_count = sum(1 for keyword in low_importance if keyword in text_lower)
+    high_count = hits.count("importance:high")
+    medium_count = hits.count("importance:medium")
+    low_count = hits.count("importance:low")
     
     # Calculate weighted score (high=3x, medium=2x, low=1x)
     weighted_score = (high_count * 3 + medium_count * 2 + low_count) / 10
@@ -163,23 +180,12 @@ def get_importance_label(score):
         return "✅ Normal Routine"
     
 
-def detect_potential_concerns(text):
+def detect_potential_concerns(text, hits=None):
     """Detect potential concerns or issues that might need caregiver attention"""
-    text_lower = text.lower()
-    
-    concern_keywords = {
-        "memory_issue": ["forgot", "can't remember", "don't remember", "confused", "where am i", "what day"],
-        "safety_risk": ["fell", "fall", "hurt", "injury", "lost", "wander", "fire", "stove", "burn"],
-        "emotional_distress": ["scared", "afraid", "anxious", "sad", "crying", "depressed", "upset"],
-        "medication_issue": ["missed", "forgot pill", "forgot medication", "extra pill", "double dose"]
-    }
-    
-    concerns = []
-    for concern, keywords in concern_keywords.items():
-        if any(keyword in text_lower for keyword in keywords):
-            concerns.append(concern)
+    if hits is None:
+        hits = lexicon.scan(text)
     
-    return concerns
+    return [concern for concern in concern_keywords if hits.found(f"concern:{concern}")]
 
 def analyze_sentiment(text):
     # VADER analysis
@@ -207,13 +213,14 @@ def analyze_sentiment(text):
         "Neutral"
     )
 
-    # Other analyses
-    importance = get_importance_score(text)
+    # Other analyses, sharing a single lexicon scan
+    hits = lexicon.scan(text)
+    importance = get_importance_score(text, hits)
     event_age = get_event_age(text)
     event_location = get_event_location(text)
-    detected_adls = detect_adls(text)
-    time_of_day = detect_time_of_day(text)
-    potential_concerns = detect_potential_concerns(text)
+    detected_adls = detect_adls(text, hits)
+    time_of_day = detect_time_of_day(text, hits)
+    potential_concerns = detect_potential_concerns(text, hits)
 
     print(f"\n📝 Input Sentence: {text}")
     print("\n🔹 Sentiment Analysis:")
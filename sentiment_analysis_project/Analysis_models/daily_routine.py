@@ -1,11 +1,17 @@
 import nltk
+import os
 import re
+import sys
 import pandas as pd
 import datetime
 from nltk.sentiment import SentimentIntensityAnalyzer
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 
+# The shared keyword lexicon lives in the backend's audio app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from audio.lexicon import Lexicon
+
 # Download necessary NLTK resources - make these run every time to ensure they're available
 nltk.download('vader_lexicon')
 nltk.download('punkt')
@@ -45,6 +51,15 @@ class MemorySentimentAnalyzer:
             'hard', 'difficult', 'easy', 'simple', 'tough'
         ]
         
+        # All keyword lists compiled into one matcher, run once per sentence
+        self.lexicon = Lexicon({
+            'memory': self.memory_keywords,
+            'routine': self.routine_keywords,
+            'time': self.time_indicators,
+            'location': self.location_indicators,
+            'severity': self.severity_indicators
+        })
+        
         # Try to load existing log or create new one
         try:
             self.log_df = pd.read_csv(self.log_file)
@@ -75,12 +90,13 @@ class MemorySentimentAnalyzer:
         else:
             sentiment_label = "Neutral"
         
-        # Extract memory and routine references - fixed to avoid tokenization issues
-        memory_refs = self.extract_references(text, self.memory_keywords)
-        routine_refs = self.extract_references(text, self.routine_keywords)
-        time_refs = self.extract_references(text, self.time_indicators)
-        location_refs = self.extract_references(text, self.location_indicators)
-        severity_refs = self.extract_references(text, self.severity_indicators)
+        # Extract memory and routine references from a single scan per sentence
+        sentence_hits = self.scan_sentences(text)
+        memory_refs = self.extract_references(sentence_hits, 'memory')
+        routine_refs = self.extract_references(sentence_hits, 'routine')
+        time_refs = self.extract_references(sentence_hits, 'time')
+        location_refs = self.extract_references(sentence_hits, 'location')
+        severity_refs = self.extract_references(sentence_hits, 'severity')
         
         # Check for potential concerns
         potential_concerns = self.identify_concerns(text, compound_score, memory_refs, routine_refs)
@@ -104,36 +120,29 @@ class MemorySentimentAnalyzer:
         
         return self.format_analysis_results(new_entry)
     
-    def extract_references(self, text, keyword_list):
-        """Extract phrases containing keywords - fixed to avoid tokenization issues."""
+    def scan_sentences(self, text):
+        """Split text into sentences and run the lexicon over each one once."""
+        sentence_hits = []
+        for match in re.finditer(r'[^.!?]*[.!?]?', text):
+            sentence = match.group()
+            if sentence.strip():
+                sentence_hits.append((sentence, self.lexicon.scan(sentence)))
+        return sentence_hits
+    
+    def extract_references(self, sentence_hits, category):
+        """Extract keywords of a category and the sentences containing them."""
         references = []
         
-        # Simple word-based matching without tokenization
-        words = text.split()
-        
-        # First look for exact keywords
-        for keyword in keyword_list:
-            if ' ' in keyword:  # Multi-word keyword
-                if keyword in text:
-                    references.append(keyword)
-            else:  # Single word keyword
-                for word in words:
-                    # Strip punctuation for comparison
-                    clean_word = word.strip('.,!?;:"\'()[]{}')
-                    if clean_word == keyword:
-                        references.append(keyword)
-                        break
-        
-        # Then look for phrases containing keywords
-        for keyword in keyword_list:
-            if keyword in text:
-                # Find phrases containing this keyword (simple approach)
-                pattern = r'[^.!?]*\b' + re.escape(keyword) + r'\b[^.!?]*[.!?]?'
-                matches = re.findall(pattern, text)
-                for match in matches:
-                    clean_match = match.strip()
-                    if clean_match and len(clean_match) < 100:  # Avoid overly long matches
-                        references.append(clean_match)
+        for sentence, hits in sentence_hits:
+            found = hits.ordered(category)
+            if not found:
+                continue
+            
+            # The keywords themselves, then the phrase containing them
+            references.extend(found)
+            clean_match = sentence.strip()
+            if len(clean_match) < 100:  # Avoid overly long matches
+                references.append(clean_match)
         
         return list(set(references))  # Remove duplicates
     
@@ -1,9 +1,17 @@
 import nltk
+import os
+import sys
 import dateparser
 from dateparser.search import search_dates  # <-- add this
 from datetime import datetime
 from nltk.sentiment import SentimentIntensityAnalyzer
-from transformers import pipeline, logging
+from transformers import logging
+
+# The shared keyword lexicon lives in the backend's audio app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from audio.lexicon import Lexicon
+# Set INFERENCE_BACKEND=quantized or onnx to run the models on a faster CPU backend
+from audio.model_backends import load_pipeline, DISTILBERT_MODEL, NER_MODEL
 
 
 # Suppress unimportant warnings from transformers
@@ -18,10 +26,7 @@ vader_analyzer = SentimentIntensityAnalyzer()
 # Initialize DistilBERT
 print("⚙️ Loading DistilBERT sentiment model...")
 try:
-    distilbert_analyzer = pipeline(
-        "sentiment-analysis",
-        model="distilbert/distilbert-base-uncased-finetuned-sst-2-english"
-    )
+    distilbert_analyzer = load_pipeline("sentiment-analysis", DISTILBERT_MODEL)
 except Exception as e:
     print(f"❌ Failed to load DistilBERT model: {e}")
     exit(1)
@@ -29,11 +34,7 @@ except Exception as e:
 # Initialize NER pipeline for location extraction
 print("⚙️ Loading NER model for location detection...")
 try:
-    ner_pipeline = pipeline(
-        "ner",
-        model="dbmdz/bert-large-cased-finetuned-conll03-english",
-        aggregation_strategy="simple"
-    )
+    ner_pipeline = load_pipeline("ner", NER_MODEL, aggregation_strategy="simple")
 except Exception as e:
     print(f"❌ Failed to load NER model: {e}")
     exit(1)
@@ -46,6 +47,9 @@ important_keywords = [
     "non-negotiable", "top priority"
 ]
 
+# Keywords compiled once; substring mode matches `keyword in text_lower`
+lexicon = Lexicon({"important": important_keywords}, whole_words=False)
+
 def get_event_age(text):
     # Use dateparser search_dates to find any dates
     results = dateparser.search.search_dates(text, settings={'PREFER_DATES_FROM': 'past'})
@@ -79,8 +83,7 @@ def get_event_location(text):
         return "🌍 No clear location detected"
 
 def get_importance_score(text):
-    text_lower = text.lower()
-    importance_count = sum(1 for keyword in important_keywords if keyword in text_lower)
+    importance_count = lexicon.scan(text).count("important")
     normalized_score = min(importance_count / 5, 1.0)
     return round(normalized_score, 2)
 
@@ -1,9 +1,17 @@
 import nltk
+import os
+import sys
 import dateparser
 from dateparser.search import search_dates
 from datetime import datetime
 from nltk.sentiment import SentimentIntensityAnalyzer
-from transformers import pipeline, logging
+from transformers import logging
+
+# The shared keyword lexicon lives in the backend's audio app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from audio.lexicon import Lexicon
+# Set INFERENCE_BACKEND=quantized or onnx to run the models on a faster CPU backend
+from audio.model_backends import load_pipeline, DISTILBERT_MODEL, NER_MODEL
 
 # Suppress unimportant warnings from transformers
 logging.set_verbosity_error()
@@ -17,10 +25,7 @@ vader_analyzer = SentimentIntensityAnalyzer()
 # Initialize DistilBERT
 print("⚙️ Loading DistilBERT sentiment model...")
 try:
-    distilbert_analyzer = pipeline(
-        "sentiment-analysis",
-        model="distilbert/distilbert-base-uncased-finetuned-sst-2-english"
-    )
+    distilbert_analyzer = load_pipeline("sentiment-analysis", DISTILBERT_MODEL)
 except Exception as e:
     print(f"❌ Failed to load DistilBERT model: {e}")
     exit(1)
@@ -28,11 +33,7 @@ except Exception as e:
 # Initialize NER pipeline for location extraction
 print("⚙️ Loading NER model for location detection...")
 try:
-    ner_pipeline = pipeline(
-        "ner",
-        model="dbmdz/bert-large-cased-finetuned-conll03-english",
-        aggregation_strategy="simple"
-    )
+    ner_pipeline = load_pipeline("ner", NER_MODEL, aggregation_strategy="simple")
 except Exception as e:
     print(f"❌ Failed to load NER model: {e}")
     exit(1)
@@ -94,6 +95,56 @@ traumatic_events = [
     "hospital", "emergency", "ICU", "catastrophe", "tragedy"
 ]
 
+# Time-of-day mentions
+time_of_day_keywords = {
+    "morning": ["morning", "breakfast", "wake", "dawn", "early", "am"],
+    "afternoon": ["afternoon", "lunch", "noon", "midday"],
+    "evening": ["evening", "dinner", "supper", "sunset", "dusk", "pm"],
+    "night": ["night", "bed", "sleep", "midnight", "late"]
+}
+
+# Grief indicators raising emotional significance
+grief_keywords = ["miss", "lost", "died", "passed away", "cry", "tears", "sad"]
+
+# Concerns that might need caregiver attention
+concern_keywords = {
+    "memory_issue": ["forgot", "can't remember", "don't remember", "confused", "where am i", "what day"],
+    "safety_risk": ["fell", "fall", "hurt", "injury", "lost", "wander", "fire", "stove", "burn"],
+    "emotional_distress": ["scared", "afraid", "anxious", "sad", "crying", "depressed", "upset", "miss", "grief"],
+    "medication_issue": ["missed", "forgot pill", "forgot medication", "extra pill", "double dose"],
+    "trauma_trigger": ["war", "death", "lost", "tragedy", "accident", "memory", "flashback", "nightmare"]
+}
+
+# Indicators of grief or loss
+grief_indicator_keywords = {
+    "active_grief": ["cry", "crying", "tears", "sob", "weep", "miss", "hurt"],
+    "loss_mention": ["lost", "died", "passed away", "gone", "no more", "death"],
+    "memory_reflection": ["remember", "memories", "used to", "would always", "think about"]
+}
+
+# Indicators of trauma
+trauma_indicator_keywords = {
+    "war_related": ["war", "fight", "battle", "bomb", "attack", "soldier", "military"],
+    "disaster_related": ["fire", "flood", "earthquake", "hurricane", "tornado", "disaster"],
+    "accident_related": ["crash", "accident", "hit", "collision", "fell", "injury"],
+    "violence_related": ["attack", "assault", "hit", "beat", "shoot", "kill", "wound"]
+}
+
+# Every keyword group compiled into one matcher; substring mode keeps the
+# semantics of the original `keyword in text_lower` checks
+lexicon = Lexicon({
+    "emotional": emotional_keywords,
+    "importance": importance_keywords,
+    "family": family_terms,
+    "traumatic_events": traumatic_events,
+    "grief": grief_keywords,
+    **{f"adl:{name}": keywords for name, keywords in adl_keywords.items()},
+    **{f"time:{name}": keywords for name, keywords in time_of_day_keywords.items()},
+    **{f"concern:{name}": keywords for name, keywords in concern_keywords.items()},
+    **{f"grief_indicator:{name}": keywords for name, keywords in grief_indicator_keywords.items()},
+    **{f"trauma_indicator:{name}": keywords for name, keywords in trauma_indicator_keywords.items()},
+}, whole_words=False)
+
 def map_distilbert_to_compound(label, score):
     """Convert DistilBERT's binary output to a compound-like score between -1 and 1"""
     if label == "POSITIVE":
@@ -101,31 +152,19 @@ def map_distilbert_to_compound(label, score):
     else:  # NEGATIVE
         return -score  # Convert to negative value between -1 and 0
 
-def detect_adls(text):
+def detect_adls(text, hits=None):
     """Detect activities of daily living in the text"""
-    text_lower = text.lower()
-    detected_adls = []
+    if hits is None:
+        hits = lexicon.scan(text)
     
-    for category, keywords in adl_keywords.items():
-        if any(keyword in text_lower for keyword in keywords):
-            detected_adls.append(category)
-    
-    return detected_adls
+    return [category for category in adl_keywords if hits.found(f"adl:{category}")]
 
-def detect_time_of_day(text):
+def detect_time_of_day(text, hits=None):
     """Detect time of day mentions"""
-    text_lower = text.lower()
-    times = {
-        "morning": ["morning", "breakfast", "wake", "dawn", "early", "am"],
-        "afternoon": ["afternoon", "lunch", "noon", "midday"],
-        "evening": ["evening", "dinner", "supper", "sunset", "dusk", "pm"],
-        "night": ["night", "bed", "sleep", "midnight", "late"]
-    }
-    
-    detected_times = []
-    for time_period, keywords in times.items():
-        if any(keyword in text_lower for keyword in keywords):
-            detected_times.append(time_period)
+    if hits is None:
+        hits = lexicon.scan(text)
+    
+    detected_times = [period for period in time_of_day_keywords if hits.found(f"time:{period}")]
     
     return detected_times if detected_times else ["no specific time detected"]
 
@@ -161,22 +200,22 @@ def get_event_location(text):
     else:
         return "🌍 No clear location detected"
 
-def detect_emotional_significance(text):
+def detect_emotional_significance(text, hits=None):
     """Detect emotionally significant content"""
-    text_lower = text.lower()
+    if hits is None:
+        hits = lexicon.scan(text)
     
     # Check for emotional keywords
-    emotion_score = sum(1 for keyword in emotional_keywords if keyword in text_lower)
+    emotion_score = hits.count("emotional")
     
     # Increase importance if family members are mentioned
-    family_mentioned = any(term in text_lower for term in family_terms)
+    family_mentioned = hits.found("family")
     
     # Increase importance if traumatic events are mentioned
-    trauma_mentioned = any(event in text_lower for event in traumatic_events)
+    trauma_mentioned = hits.found("traumatic_events")
     
     # Check for grief indicators
-    grief_indicators = ["miss", "lost", "died", "passed away", "cry", "tears", "sad"]
-    grief_mentioned = any(indicator in text_lower for indicator in grief_indicators)
+    grief_mentioned = hits.found("grief")
     
     # Calculate emotional significance score
     emotional_score = emotion_score * 0.2  # Base score from emotional keywords
@@ -195,16 +234,17 @@ def detect_emotional_significance(text):
     
     return round(emotional_score, 2)
 
-def get_importance_score(text):
+def get_importance_score(text, hits=None):
     """Calculate importance score based on keywords and emotional significance"""
-    text_lower = text.lower()
+    if hits is None:
+        hits = lexicon.scan(text)
     
     # Standard importance from keywords
-    basic_importance = sum(1 for keyword in importance_keywords if keyword in text_lower)
+    basic_importance = hits.count("importance")
     basic_score = min(basic_importance / 5, 1.0)
     
     # Get emotional significance score
-    emotional_score = detect_emotional_significance(text)
+    emotional_score = detect_emotional_significance(text, hits)
     
     # Combined score with higher weight for emotional content
     combined_score = max(basic_score, emotional_score)
@@ -219,68 +259,43 @@ def get_importance_label(score):
     else:
         return "✅ Normal Routine"
 
-def detect_potential_concerns(text):
+def detect_potential_concerns(text, hits=None):
     """Detect potential concerns or issues that might need caregiver attention"""
-    text_lower = text.lower()
+    if hits is None:
+        hits = lexicon.scan(text)
     
-    concern_keywords = {
-        "memory_issue": ["forgot", "can't remember", "don't remember", "confused", "where am i", "what day"],
-        "safety_risk": ["fell", "fall", "hurt", "injury", "lost", "wander", "fire", "stove", "burn"],
-        "emotional_distress": ["scared", "afraid", "anxious", "sad", "crying", "depressed", "upset", "miss", "grief"],
-        "medication_issue": ["missed", "forgot pill", "forgot medication", "extra pill", "double dose"],
-        "trauma_trigger": ["war", "death", "lost", "tragedy", "accident", "memory", "flashback", "nightmare"]
-    }
-    
-    concerns = []
-    for concern, keywords in concern_keywords.items():
-        if any(keyword in text_lower for keyword in keywords):
-            concerns.append(concern)
-    
-    return concerns
+    return [concern for concern in concern_keywords if hits.found(f"concern:{concern}")]
 
-def analyze_family_relationships(text):
+def analyze_family_relationships(text, hits=None):
     """Analyze mentions of family relationships"""
-    text_lower = text.lower()
+    if hits is None:
+        hits = lexicon.scan(text)
     
-    relations = []
-    for term in family_terms:
-        if term in text_lower:
-            relations.append(term)
+    relations = hits.ordered("family")
     
     return relations if relations else None
 
-def analyze_grief_indicators(text):
+def analyze_grief_indicators(text, hits=None):
     """Analyze text for indicators of grief or loss"""
-    text_lower = text.lower()
+    if hits is None:
+        hits = lexicon.scan(text)
     
-    grief_indicators = {
-        "active_grief": ["cry", "crying", "tears", "sob", "weep", "miss", "hurt"],
-        "loss_mention": ["lost", "died", "passed away", "gone", "no more", "death"],
-        "memory_reflection": ["remember", "memories", "used to", "would always", "think about"]
-    }
-    
-    indicators = []
-    for category, keywords in grief_indicators.items():
-        if any(keyword in text_lower for keyword in keywords):
-            indicators.append(category)
+    indicators = [
+        category for category in grief_indicator_keywords
+        if hits.found(f"grief_indicator:{category}")
+    ]
     
     return indicators if indicators else None
 
-def analyze_trauma_indicators(text):
+def analyze_trauma_indicators(text, hits=None):
     """Analyze text for indicators of trauma"""
-    text_lower = text.lower()
-    
-    trauma_indicators = {
-        "war_related": ["war", "fight", "battle", "bomb", "attack", "soldier", "military"],
-        "disaster_related": ["fire", "flood", "earthquake", "hurricane", "tornado", "disaster"],
-        "accident_related": ["crash", "accident", "hit", "collision", "fell", "injury"],
-        "violence_related": ["attack", "assault", "hit", "beat", "shoot", "kill", "wound"]
-    }
+    if hits is None:
+        hits = lexicon.scan(text)
     
-    indicators = []
-    for category, keywords in trauma_indicators.items():
-        if any(keyword in text_lower for keyword in keywords):
-            indicators.append(category)
+    indicators = [
+        category for category in trauma_indicator_keywords
+        if hits.found(f"trauma_indicator:{category}")
+    ]
     
     return indicators if indicators else None
 
@@ -310,16 +325,17 @@ def analyze_sentiment(text):
         "Neutral"
     )
 
-    # Other analyses
-    importance = get_importance_score(text)
+    # Other analyses, sharing a single lexicon scan
+    hits = lexicon.scan(text)
+    importance = get_importance_score(text, hits)
     event_age = get_event_age(text)
     event_location = get_event_location(text)
-    detected_adls = detect_adls(text)
-    time_of_day = detect_time_of_day(text)
-    potential_concerns = detect_potential_concerns(text)
-    family_mentions = analyze_family_relationships(text)
-    grief_indicators = analyze_grief_indicators(text)
-    trauma_indicators = analyze_trauma_indicators(text)
+    detected_adls = detect_adls(text, hits)
+    time_of_day = detect_time_of_day(text, hits)
+    potential_concerns = detect_potential_concerns(text, hits)
+    family_mentions = analyze_family_relationships(text, hits)
+    grief_indicators = analyze_grief_indicators(text, hits)
+    trauma_indicators = analyze_trauma_indicators(text, hits)
 
     print(f"\n📝 Input Statement: {text}")
     